@@ -0,0 +1,74 @@
+"""
+Time the columnar analytics on synthetic data: rolling up one day of N SKUs,
+and the stock value trend and turnover over a year of daily snapshots.
+
+Nothing touches the database; the snapshots go to a temporary directory.
+Run from `inventory_api/`:
+
+    python benchmarks/analytics.py --skus 1000000 --suppliers 2000 --days 365
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, default=1_000_000)
+    parser.add_argument("--suppliers", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "inventory_api.settings")
+    import django
+    django.setup()
+    import numpy as np
+    from django.conf import settings
+    from inventory import analytics
+
+    rng = np.random.default_rng(0)
+    snapshot = np.zeros(args.skus, dtype=analytics.SNAPSHOT_DTYPE)
+    snapshot["product_id"] = np.arange(1, args.skus + 1)
+    snapshot["supplier_id"] = rng.integers(1, args.suppliers + 1, args.skus)
+    snapshot["price"] = rng.integers(100, 100_000, args.skus) / 100
+    quantity = rng.integers(0, 1000, args.skus)
+    end = date(2024, 12, 31)
+    days = [end - timedelta(days=offset) for offset in range(args.days - 1, -1, -1)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.ANALYTICS_SNAPSHOT_DIR = tmp
+
+        rollup_time = 0.0
+        write_time = 0.0
+        for index, day in enumerate(days):
+            outflow = rng.integers(0, 20, args.skus)
+            snapshot["outflow"] = outflow
+            snapshot["quantity"] = quantity = np.maximum(quantity - outflow + rng.integers(0, 20, args.skus), 0)
+            started = time.perf_counter()
+            if index == len(days) - 1:
+                # The per-SKU columns of the last day, as the nightly task writes them
+                analytics.write_snapshot(day, snapshot)
+                write_time = time.perf_counter() - started
+            else:
+                # Rollups only for the rest, to keep the benchmark's disk use small
+                os.makedirs(analytics.snapshot_dir(day))
+                np.save(os.path.join(analytics.snapshot_dir(day), analytics.ROLLUP_FILE), analytics.rollup(snapshot))
+                rollup_time += time.perf_counter() - started
+
+        print(f"skus={args.skus:,} suppliers={args.suppliers:,} days={args.days}")
+        print(f"{'rollup of one day:':<33}{rollup_time / max(1, args.days - 1) * 1000:8.1f} ms")
+        print(f"{'write one day with columns:':<33}{write_time * 1000:8.1f} ms")
+        for name, function in (("stock value trend", analytics.stock_value_trend), ("turnover", analytics.turnover)):
+            started = time.perf_counter()
+            result = function(days[0], days[-1])
+            elapsed = time.perf_counter() - started
+            print(f"{name + ' over the year:':<33}{elapsed * 1000:8.1f} ms ({len(result['suppliers']):,} suppliers)")
+
+
+if __name__ == "__main__":
+    main()
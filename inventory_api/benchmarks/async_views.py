@@ -0,0 +1,150 @@
+"""
+Compare concurrent-request throughput of the sync DRF read endpoints served
+by gunicorn against their async counterparts served by uvicorn.
+
+Both servers are started from this directory against whatever database the
+current settings point at, so seed it first. Run from `inventory_api/`:
+
+    python benchmarks/async_views.py --workers 3 --concurrency 64 --duration 15
+
+Pass `--sync-url`/`--async-url` instead to benchmark servers that are
+already running.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+# (label, sync path, async path); {product}, {inventory} and {supplier} are
+# filled in with ids discovered from the running server
+ENDPOINTS = [
+    ("product list", "/api/products/", "/api/async/products/"),
+    ("product detail", "/api/products/{product}/", "/api/async/products/{product}/"),
+    ("inventory detail", "/api/inventory/{inventory}/", "/api/async/inventory/{inventory}/"),
+    ("supplier products", "/api/suppliers/{supplier}/products/", "/api/async/suppliers/{supplier}/products/"),
+]
+
+
+def start_server(command, port):
+    process = subprocess.Popen(
+        command, cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"{base_url}/api/suppliers/", timeout=5).read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Server did not start: {' '.join(command)}")
+
+
+def discover_ids(base_url):
+    def first_id(path):
+        with urllib.request.urlopen(f"{base_url}{path}", timeout=5) as response:
+            data = json.load(response)
+        items = data["results"] if isinstance(data, dict) else data
+        if not items:
+            raise RuntimeError(f"No objects at {path}; seed the database first.")
+        return items[0]["id"]
+
+    return {
+        "product": first_id("/api/products/"),
+        "inventory": first_id("/api/inventory/"),
+        "supplier": first_id("/api/suppliers/"),
+    }
+
+
+def run_load(url, concurrency, duration):
+    """
+    Hit `url` from `concurrency` threads for `duration` seconds.
+    Returns (requests per second, latencies in ms, error count).
+    """
+    deadline = time.monotonic() + duration
+
+    def worker():
+        latencies, errors = [], 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    response.read()
+                latencies.append((time.perf_counter() - start) * 1000)
+            except OSError:
+                errors += 1
+        return latencies, errors
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: worker(), range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    latencies = [latency for result in results for latency in result[0]]
+    errors = sum(result[1] for result in results)
+    return len(latencies) / elapsed, latencies, errors
+
+
+def percentile(values, pct):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=3, help="Worker processes per server")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent client connections")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds of load per endpoint")
+    parser.add_argument("--sync-url", help="Use an already running gunicorn server")
+    parser.add_argument("--async-url", help="Use an already running uvicorn server")
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        sync_url, async_url = args.sync_url, args.async_url
+        if not sync_url:
+            process, sync_url = start_server([
+                sys.executable, "-m", "gunicorn", "inventory_api.wsgi:application",
+                "--bind", "127.0.0.1:8100", "--workers", str(args.workers),
+            ], 8100)
+            processes.append(process)
+        if not async_url:
+            process, async_url = start_server([
+                sys.executable, "-m", "uvicorn", "inventory_api.asgi:application",
+                "--port", "8101", "--workers", str(args.workers), "--no-access-log",
+            ], 8101)
+            processes.append(process)
+
+        ids = discover_ids(sync_url)
+        print(f"workers={args.workers} concurrency={args.concurrency} duration={args.duration}s")
+        print(f"{'endpoint':<20}{'server':<18}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        for label, sync_path, async_path in ENDPOINTS:
+            for server, url in (
+                ("gunicorn (sync)", sync_url + sync_path.format(**ids)),
+                ("uvicorn (async)", async_url + async_path.format(**ids)),
+            ):
+                rps, latencies, errors = run_load(url, args.concurrency, args.duration)
+                print(
+                    f"{label:<20}{server:<18}{rps:>10.1f}"
+                    f"{percentile(latencies, 50):>10.1f}{percentile(latencies, 99):>10.1f}{errors:>8}"
+                )
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "inventory_api.settings")
+    main()
@@ -0,0 +1,329 @@
+"""
+Load test the API over HTTP against a locally seeded database, and fail
+when latency or throughput regresses against a stored baseline.
+
+The database is created and seeded from scratch: a fresh SQLite file by
+default, or the (throwaway!) database in --database-url, e.g. a local
+Postgres. gunicorn is then started on it, and a weighted mix of product list
+filters, inventory reads, supplier product listings, stock adjustments and
+small CSV uploads is sent at a fixed concurrency. Throughput and p50/p95/p99
+latency are reported per route, and a CSV upload with any failed row counts
+as an error. Run from `inventory_api/`:
+
+    python benchmarks/load_test.py --concurrency 16 --duration 30
+
+To gate on regressions, store a baseline once and compare later runs to it:
+
+    python benchmarks/load_test.py --save-baseline benchmarks/load_baseline.json
+    python benchmarks/load_test.py --baseline benchmarks/load_baseline.json
+
+A run fails (exit status 1) when a route's p95 or p99 rises, or its
+throughput falls, by more than the budget in the baseline file: the
+route's own entry under "budgets" or else "default" (20% for latency and
+throughput), ignoring latency changes under --min-delta-ms.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from async_views import PROJECT_DIR, start_server, percentile
+
+
+DEFAULT_BUDGETS = {"p95": 0.2, "p99": 0.2, "rps": 0.2}
+
+# (route, weight); see build_request() for what each sends
+MIX = [
+    ("product list", 15),
+    ("product list filtered", 20),
+    ("inventory detail", 20),
+    ("inventory batch", 10),
+    ("supplier products", 10),
+    ("inventory adjust", 20),
+    ("csv upload", 5),
+]
+
+# Responses that are part of normal operation rather than errors
+EXPECTED_STATUSES = {200, 201, 409}
+
+
+def seed(suppliers, products):
+    """
+    Create the schema and the test data with bulk inserts. Returns the
+    ids and names the request mix picks from.
+    """
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import connections
+    from inventory.models import Location, Supplier, Product, Inventory
+
+    call_command("migrate", verbosity=0)
+    call_command("flush", interactive=False, verbosity=0)
+    # flush also removes the default location that migrate creates
+    code = settings.INVENTORY_LOCATION
+    Location.objects.create(code=code, name=code.replace("-", " ").title())
+
+    rng = random.Random(0)
+    supplier_objs = Supplier.objects.bulk_create(
+        [Supplier(name=f"Supplier {i}", contact_info=f"supplier{i}@example.com") for i in range(suppliers)]
+    )
+    product_objs = Product.objects.bulk_create([
+        Product(
+            name=f"Product {i}",
+            description=f"Seeded product {i}",
+            price=Decimal(rng.randint(100, 10000)) / 100,
+            supplier=supplier_objs[i % suppliers],
+        )
+        for i in range(products)
+    ], batch_size=1000)
+    inventory_objs = Inventory.objects.bulk_create(
+        [Inventory(product=product, quantity=rng.randint(1000, 100000)) for product in product_objs],
+        batch_size=1000,
+    )
+    connections.close_all()
+
+    return {
+        "suppliers": [(supplier.pk, supplier.name) for supplier in supplier_objs],
+        "products": [(product.pk, product.name) for product in product_objs],
+        "inventory": [inventory.pk for inventory in inventory_objs],
+    }
+
+
+def multipart(fields, files):
+    """
+    Encode form fields and `{name: (filename, bytes)}` files as multipart/form-data.
+    """
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        body.write(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: text/csv\r\n\r\n'.encode()
+        )
+        body.write(content + b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+def build_request(route, base_url, data, rng):
+    """
+    A urllib Request for one call of `route`, with randomly picked ids.
+    """
+    if route == "product list":
+        page = rng.randint(1, max(1, len(data["products"]) // 10))
+        return urllib.request.Request(f"{base_url}/api/products/?page={page}")
+    if route == "product list filtered":
+        if rng.random() < 0.5:
+            _, name = rng.choice(data["suppliers"])
+            query = urllib.parse.urlencode({"supplier__name": name})
+        else:
+            _, name = rng.choice(data["products"])
+            query = urllib.parse.urlencode({"name": name})
+        return urllib.request.Request(f"{base_url}/api/products/?{query}")
+    if route == "inventory detail":
+        return urllib.request.Request(f"{base_url}/api/inventory/{rng.choice(data['inventory'])}/")
+    if route == "inventory batch":
+        ids = ",".join(str(pk) for pk in rng.sample(data["inventory"], min(50, len(data["inventory"]))))
+        return urllib.request.Request(f"{base_url}/api/inventory/batch/?ids={ids}")
+    if route == "supplier products":
+        supplier_id, _ = rng.choice(data["suppliers"])
+        return urllib.request.Request(f"{base_url}/api/suppliers/{supplier_id}/products/")
+    if route == "inventory adjust":
+        body = json.dumps({"delta": rng.choice([-1, 1])}).encode()
+        return urllib.request.Request(
+            f"{base_url}/api/inventory/{rng.choice(data['inventory'])}/adjust/",
+            data=body, headers={"Content-Type": "application/json"}, method="POST",
+        )
+    if route == "csv upload":
+        rows = ["name,description,price,supplier_name,quantity"]
+        for _ in range(10):
+            _, product_name = rng.choice(data["products"])
+            _, supplier_name = rng.choice(data["suppliers"])
+            rows.append(f"{product_name},Imported,9.99,{supplier_name},{rng.randint(1, 50)}")
+        body, content_type = multipart({}, {"file": ("products.csv", "\n".join(rows).encode())})
+        return urllib.request.Request(
+            f"{base_url}/api/products/upload-csv/", data=body,
+            headers={"Content-Type": content_type}, method="POST",
+        )
+    raise ValueError(route)
+
+
+def succeeded(route, body):
+    """
+    Whether a successful response of `route` did what was asked. CSV uploads
+    report failed rows in a 200 response.
+    """
+    if route == "csv upload":
+        result = json.loads(body)
+        return result["success_count"] > 0 and not result["errors"]
+    return True
+
+
+def run_mix(base_url, data, concurrency, duration):
+    """
+    Send the weighted request mix from `concurrency` threads for `duration`
+    seconds. Returns (elapsed seconds, {route: (latencies in ms, error count)}).
+    """
+    routes = [route for route, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(index)
+        results = {route: ([], 0) for route in routes}
+        while time.monotonic() < deadline:
+            route = rng.choices(routes, weights)[0]
+            request = build_request(route, base_url, data, rng)
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    body = response.read()
+                    ok = response.status in EXPECTED_STATUSES and succeeded(route, body)
+            except urllib.error.HTTPError as error:
+                ok = error.code in EXPECTED_STATUSES
+            except OSError:
+                ok = False
+            latencies, errors = results[route]
+            if ok:
+                latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                results[route] = (latencies, errors + 1)
+        return results
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        per_worker = list(pool.map(worker, range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    merged = {}
+    for route in routes:
+        latencies = [latency for results in per_worker for latency in results[route][0]]
+        errors = sum(results[route][1] for results in per_worker)
+        merged[route] = (latencies, errors)
+    return elapsed, merged
+
+
+def summarize(elapsed, results):
+    return {
+        route: {
+            "requests": len(latencies),
+            "errors": errors,
+            "rps": round(len(latencies) / elapsed, 2),
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+        }
+        for route, (latencies, errors) in results.items()
+    }
+
+
+def find_regressions(summary, baseline, min_delta_ms):
+    """
+    Compare a run with a baseline file's routes and budgets. Returns a list
+    of human-readable regressions.
+    """
+    budgets = baseline.get("budgets", {})
+    regressions = []
+    for route, previous in baseline.get("routes", {}).items():
+        current = summary.get(route)
+        if current is None:
+            continue
+        budget = {**DEFAULT_BUDGETS, **budgets.get("default", {}), **budgets.get(route, {})}
+        for key in ("p95", "p99"):
+            limit = previous[key] * (1 + budget[key])
+            if current[key] > limit and current[key] - previous[key] >= min_delta_ms:
+                regressions.append(
+                    f"{route}: {key} {current[key]:.1f} ms > {limit:.1f} ms "
+                    f"(baseline {previous[key]:.1f} ms + {budget[key]:.0%})"
+                )
+        limit = previous["rps"] * (1 - budget["rps"])
+        if current["rps"] < limit:
+            regressions.append(
+                f"{route}: {current['rps']:.1f} req/s < {limit:.1f} req/s "
+                f"(baseline {previous['rps']:.1f} req/s - {budget['rps']:.0%})"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Throwaway database to seed (default: a temporary SQLite file)")
+    parser.add_argument("--suppliers", type=int, default=50, help="Suppliers to seed")
+    parser.add_argument("--products", type=int, default=5000, help="Products (with inventory) to seed")
+    parser.add_argument("--workers", type=int, default=3, help="gunicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client connections")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--port", type=int, default=8102)
+    parser.add_argument("--baseline", help="Baseline JSON file to compare with")
+    parser.add_argument("--save-baseline", help="Write this run's results to a baseline JSON file")
+    parser.add_argument("--min-delta-ms", type=float, default=5,
+                        help="Ignore latency regressions smaller than this many ms")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["LOAD_TEST_DATABASE_URL"] = args.database_url or f"sqlite:///{tmp}/load_test.sqlite3"
+        os.environ["DJANGO_SETTINGS_MODULE"] = "benchmarks.load_test_settings"
+        sys.path.insert(0, str(PROJECT_DIR))
+        os.environ.setdefault("DJANGO_ENV", "development")
+
+        print(f"Seeding {args.suppliers} suppliers and {args.products} products...")
+        data = seed(args.suppliers, args.products)
+
+        process, base_url = start_server([
+            sys.executable, "-m", "gunicorn", "inventory_api.wsgi:application",
+            "--bind", f"127.0.0.1:{args.port}", "--workers", str(args.workers),
+        ], args.port)
+        try:
+            elapsed, results = run_mix(base_url, data, args.concurrency, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+
+    summary = summarize(elapsed, results)
+    print(f"workers={args.workers} concurrency={args.concurrency} duration={args.duration}s")
+    print(f"{'route':<24}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for route, stats in summary.items():
+        print(
+            f"{route:<24}{stats['requests']:>10}{stats['rps']:>10.1f}{stats['p50']:>10.1f}"
+            f"{stats['p95']:>10.1f}{stats['p99']:>10.1f}{stats['errors']:>8}"
+        )
+
+    if args.save_baseline:
+        budgets = {"default": DEFAULT_BUDGETS}
+        if os.path.exists(args.save_baseline):
+            with open(args.save_baseline) as file:
+                budgets = json.load(file).get("budgets", budgets)
+        with open(args.save_baseline, "w") as file:
+            json.dump({
+                "workers": args.workers, "concurrency": args.concurrency, "products": args.products,
+                "budgets": budgets, "routes": summary,
+            }, file, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = find_regressions(summary, json.load(file), args.min_delta_ms)
+        if regressions:
+            print("Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+Settings used by benchmarks/load_test.py: the development settings, on the
+database in LOAD_TEST_DATABASE_URL.
+"""
+import os
+
+import dj_database_url
+
+from inventory_api.settings.development import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': dj_database_url.parse(os.environ['LOAD_TEST_DATABASE_URL'], conn_max_age=600),
+}
+
+# DEBUG keeps every query in memory, which skews long runs
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost']
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Concurrent writers wait for SQLite's write lock instead of failing with
+    # "database is locked"; IMMEDIATE takes it at BEGIN, so a transaction
+    # never has to upgrade a read lock held by another writer.
+    DATABASES['default']['OPTIONS'] = {'timeout': 30, 'transaction_mode': 'IMMEDIATE'}
@@ -0,0 +1,125 @@
+"""
+Measure gunicorn startup: time to the first served request, and the memory
+of the master and each worker once they have served some requests, with and
+without `--preload`. Linux only (reads /proc).
+
+RSS counts every page a process has mapped, shared or not. PSS splits shared
+pages between the processes sharing them, so summed over the master and its
+workers it is the memory they really take; that's what preloading lowers.
+Run from `inventory_api/` against whatever database the current settings
+point at:
+
+    python benchmarks/startup.py --workers 4 --requests 50
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from async_views import PROJECT_DIR
+
+
+# Requests sent to warm up the workers before measuring memory
+WARMUP_PATHS = ["/api/products/", "/api/inventory/", "/api/suppliers/", "/api/changes/"]
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as file:
+        return [int(child) for child in file.read().split()]
+
+
+def memory_kb(pid):
+    """
+    (RSS, PSS) of a process in kB.
+    """
+    with open(f"/proc/{pid}/status") as file:
+        rss = next(int(line.split()[1]) for line in file if line.startswith("VmRSS:"))
+    with open(f"/proc/{pid}/smaps_rollup") as file:
+        pss = next(int(line.split()[1]) for line in file if line.startswith("Pss:"))
+    return rss, pss
+
+
+def request(url):
+    """
+    GET `url`; any HTTP response counts, since a worker served it.
+    """
+    try:
+        urllib.request.urlopen(url, timeout=10).read()
+    except urllib.error.HTTPError:
+        pass
+
+
+def measure(workers, preload, port, requests):
+    command = [
+        sys.executable, "-m", "gunicorn", "inventory_api.wsgi:application",
+        "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+    ]
+    if preload:
+        command.append("--preload")
+
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                request(f"{base_url}{WARMUP_PATHS[0]}")
+                break
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError(f"Server did not start: {' '.join(command)}")
+                time.sleep(0.02)
+        first_request = time.perf_counter() - started
+
+        # Wait for every worker to boot, then spread requests over them
+        while len(children(process.pid)) < workers:
+            time.sleep(0.05)
+        for index in range(requests):
+            request(f"{base_url}{WARMUP_PATHS[index % len(WARMUP_PATHS)]}")
+
+        master = memory_kb(process.pid)
+        worker_memory = [memory_kb(pid) for pid in children(process.pid)]
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {
+        "first_request_s": first_request,
+        "master_rss_mb": master[0] / 1024,
+        "worker_rss_mb": sum(rss for rss, _ in worker_memory) / len(worker_memory) / 1024,
+        "worker_pss_mb": sum(pss for _, pss in worker_memory) / len(worker_memory) / 1024,
+        "total_pss_mb": (master[1] + sum(pss for _, pss in worker_memory)) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--requests", type=int, default=50, help="Warm-up requests before measuring memory")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode; the median time is reported")
+    parser.add_argument("--port", type=int, default=8103)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "inventory_api.settings")
+
+    print(f"workers={args.workers} warm-up requests={args.requests}")
+    print(f"{'mode':<12}{'first request':>15}{'master RSS':>12}{'worker RSS':>12}{'worker PSS':>12}{'total PSS':>12}")
+    for preload in (False, True):
+        runs = sorted(
+            (measure(args.workers, preload, args.port, args.requests) for _ in range(args.repeat)),
+            key=lambda run: run["first_request_s"],
+        )
+        run = runs[len(runs) // 2]
+        print(
+            f"{'preload' if preload else 'default':<12}{run['first_request_s'] * 1000:>12.0f} ms"
+            f"{run['master_rss_mb']:>9.1f} MB{run['worker_rss_mb']:>9.1f} MB"
+            f"{run['worker_pss_mb']:>9.1f} MB{run['total_pss_mb']:>9.1f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Gunicorn settings, read from the working directory when gunicorn starts.
+
+With `PROMETHEUS_MULTIPROC_DIR` set, workers write their metrics to files in
+that directory and `/metrics` adds them up (see inventory_api.metrics).
+
+With `--preload`, the app is loaded once in the master and the workers are
+forked from it, sharing its memory. The master then also imports the URLconf
+and views, and closes any database connection before forking.
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    # Start from an empty metrics directory, before any worker writes to it
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def when_ready(server):
+    # Runs in the master, just before the first workers are forked
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+    from django.urls import get_resolver
+
+    # Import every view now, so workers share the modules instead of each
+    # importing them on their first request
+    get_resolver().url_patterns
+
+    # Sockets must not be shared between processes
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+    for connection in connections.all():
+        if getattr(connection, 'pool', None) is not None:
+            connection.close_pool()
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of the exited worker
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
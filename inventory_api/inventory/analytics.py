@@ -0,0 +1,266 @@
+"""
+Columnar daily inventory snapshots and the analytics computed from them.
+
+Every night `snapshot_inventory_analytics` stores the closing stock of the
+previous day under ANALYTICS_SNAPSHOT_DIR/<YYYY-MM-DD>/ as NumPy arrays:
+
+- one `.npy` file per column of the per-SKU snapshot: `product_id`,
+  `supplier_id`, `quantity` (at midnight), `price` and `outflow` (units that
+  left stock that day);
+- `suppliers.npy`, the same day rolled up per supplier.
+
+The analytics endpoints only read the rollups, so a year of history costs
+365 small reads whatever the number of SKUs. The per-SKU files are kept for
+ANALYTICS_RAW_RETENTION_DAYS for SKU-level analysis (see `read_snapshot`).
+
+NumPy is imported by this module, which is only imported where it is used.
+"""
+import os
+import shutil
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Inventory, StockMovement
+
+
+SNAPSHOT_DTYPE = np.dtype([
+    ('product_id', np.int64),
+    ('supplier_id', np.int64),
+    ('quantity', np.int32),
+    ('price', np.float64),
+    ('outflow', np.int32),
+])
+ROLLUP_DTYPE = np.dtype([
+    ('supplier_id', np.int64),
+    ('units', np.int64),
+    ('stock_value', np.float64),
+    ('outflow_units', np.int64),
+    ('outflow_value', np.float64),
+])
+ROLLUP_FILE = 'suppliers.npy'
+
+# Ledger reasons that correct stock rather than move it out
+NOT_OUTFLOW = [StockMovement.Reason.MANUAL, StockMovement.Reason.IMPORT]
+
+
+def snapshot_dir(day):
+    return os.path.join(settings.ANALYTICS_SNAPSHOT_DIR, day.isoformat())
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _deltas(product_ids, movements):
+    """
+    Sum of the movement deltas per product, aligned with the sorted `product_ids`.
+    """
+    totals = np.zeros(len(product_ids), dtype=np.int64)
+    rows = np.array(list(movements.values_list('product_id').annotate(total=Sum('delta'))), dtype=np.int64)
+    if len(rows):
+        positions = np.searchsorted(product_ids, rows[:, 0])
+        found = positions < len(product_ids)
+        found[found] = product_ids[positions[found]] == rows[found, 0]
+        totals[positions[found]] = rows[found, 1]
+    return totals
+
+
+def take_snapshot(day):
+    """
+    The closing stock of every SKU on `day`, as a structured array sorted by
+    product id: the current quantities, summed over locations, minus what
+    moved since that midnight.
+    Prices are the current ones.
+    """
+    start, end = _day_bounds(day)
+    # One row per product, its stock summed over every location
+    inventories = Inventory.objects.filter(product__supplier__deleting=False) \
+        .values('product_id', 'product__supplier_id', 'product__price') \
+        .annotate(total=Sum('quantity')).order_by('product_id')
+    snapshot = np.fromiter(
+        (
+            (product_id, supplier_id, quantity, float(price), 0)
+            for product_id, supplier_id, price, quantity in inventories.values_list(
+                'product_id', 'product__supplier_id', 'product__price', 'total'
+            ).iterator(chunk_size=20000)
+        ),
+        dtype=SNAPSHOT_DTYPE,
+    )
+    product_ids = snapshot['product_id']
+
+    since_close = _deltas(product_ids, StockMovement.objects.filter(created_at__gte=end))
+    snapshot['quantity'] = snapshot['quantity'] - since_close
+    removed = StockMovement.objects.filter(created_at__gte=start, created_at__lt=end, delta__lt=0) \
+        .exclude(reason__in=NOT_OUTFLOW)
+    snapshot['outflow'] = -_deltas(product_ids, removed)
+    return snapshot
+
+
+def rollup(snapshot):
+    """
+    Roll a per-SKU snapshot up per supplier.
+    """
+    supplier_ids, index = np.unique(snapshot['supplier_id'], return_inverse=True)
+    size = len(supplier_ids)
+    result = np.zeros(size, dtype=ROLLUP_DTYPE)
+    result['supplier_id'] = supplier_ids
+    result['units'] = np.bincount(index, weights=snapshot['quantity'], minlength=size)
+    result['stock_value'] = np.bincount(index, weights=snapshot['quantity'] * snapshot['price'], minlength=size)
+    result['outflow_units'] = np.bincount(index, weights=snapshot['outflow'], minlength=size)
+    result['outflow_value'] = np.bincount(index, weights=snapshot['outflow'] * snapshot['price'], minlength=size)
+    return result
+
+
+def write_snapshot(day, snapshot):
+    """
+    Store a snapshot and its rollup for `day`, replacing any earlier one.
+    Written to a temporary directory first, so readers never see half a day.
+    """
+    target = snapshot_dir(day)
+    partial = f'{target}.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+    for column in SNAPSHOT_DTYPE.names:
+        np.save(os.path.join(partial, f'{column}.npy'), np.ascontiguousarray(snapshot[column]))
+    np.save(os.path.join(partial, ROLLUP_FILE), rollup(snapshot))
+    shutil.rmtree(target, ignore_errors=True)
+    os.rename(partial, target)
+
+
+def read_snapshot(day):
+    """
+    The per-SKU columns stored for `day`, memory-mapped, or None.
+    """
+    path = snapshot_dir(day)
+    if not os.path.exists(os.path.join(path, 'product_id.npy')):
+        return None
+    return {
+        column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode='r')
+        for column in SNAPSHOT_DTYPE.names
+    }
+
+
+def snapshot_days(start, end):
+    """
+    Days between `start` and `end` (inclusive) that have a rollup, in order.
+    """
+    try:
+        names = os.listdir(settings.ANALYTICS_SNAPSHOT_DIR)
+    except FileNotFoundError:
+        return []
+    days = []
+    for name in names:
+        try:
+            day = date.fromisoformat(name)
+        except ValueError:
+            continue
+        if start <= day <= end and os.path.exists(os.path.join(snapshot_dir(day), ROLLUP_FILE)):
+            days.append(day)
+    return sorted(days)
+
+
+def supplier_series(start, end, supplier_ids=None):
+    """
+    Load the rollups between `start` and `end` as one 2-D array per rollup
+    field, indexed [supplier, day]. Returns (days, supplier ids, series).
+    """
+    days = snapshot_days(start, end)
+    rollups = [np.load(os.path.join(snapshot_dir(day), ROLLUP_FILE)) for day in days]
+    rows = np.concatenate(rollups) if rollups else np.zeros(0, dtype=ROLLUP_DTYPE)
+    day_index = np.repeat(np.arange(len(days)), [len(day_rollup) for day_rollup in rollups])
+    if supplier_ids is not None:
+        keep = np.isin(rows['supplier_id'], supplier_ids)
+        rows, day_index = rows[keep], day_index[keep]
+
+    suppliers, supplier_index = np.unique(rows['supplier_id'], return_inverse=True)
+    series = {}
+    for field in ROLLUP_DTYPE.names[1:]:
+        matrix = np.zeros((len(suppliers), len(days)), dtype=ROLLUP_DTYPE[field])
+        matrix[supplier_index, day_index] = rows[field]
+        series[field] = matrix
+    return days, suppliers, series
+
+
+def stock_value_trend(start, end, supplier_ids=None):
+    """
+    Closing stock value and units per supplier and day, plus the daily totals.
+    """
+    days, suppliers, series = supplier_series(start, end, supplier_ids)
+    return {
+        "dates": [day.isoformat() for day in days],
+        "total_stock_value": np.round(series['stock_value'].sum(axis=0), 2).tolist(),
+        "suppliers": [
+            {
+                "supplier_id": int(supplier_id),
+                "stock_value": np.round(series['stock_value'][row], 2).tolist(),
+                "units": series['units'][row].tolist(),
+            }
+            for row, supplier_id in enumerate(suppliers)
+        ],
+    }
+
+
+def turnover(start, end, supplier_ids=None):
+    """
+    Stock turnover and days of cover per supplier over the snapshots
+    between `start` and `end`:
+
+    - `turnover`: value that left stock over the period divided by the
+      average closing stock value;
+    - `days_of_cover`: days the last closing units last at the period's
+      average daily outflow (null when nothing went out).
+    """
+    days, suppliers, series = supplier_series(start, end, supplier_ids)
+    if not days:
+        return {"start": None, "end": None, "days": 0, "suppliers": []}
+
+    outflow_value = series['outflow_value'].sum(axis=1)
+    average_value = series['stock_value'].mean(axis=1)
+    daily_outflow = series['outflow_units'].sum(axis=1) / len(days)
+    closing_units = series['units'][:, -1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        turnover_ratio = np.where(average_value > 0, outflow_value / average_value, 0.0)
+        cover = np.where(daily_outflow > 0, closing_units / daily_outflow, np.nan)
+
+    return {
+        "start": days[0].isoformat(),
+        "end": days[-1].isoformat(),
+        "days": len(days),
+        "suppliers": [
+            {
+                "supplier_id": int(supplier_id),
+                "average_stock_value": round(float(average_value[row]), 2),
+                "outflow_value": round(float(outflow_value[row]), 2),
+                "outflow_units": int(series['outflow_units'][row].sum()),
+                "turnover": round(float(turnover_ratio[row]), 4),
+                "days_of_cover": None if np.isnan(cover[row]) else round(float(cover[row]), 1),
+            }
+            for row, supplier_id in enumerate(suppliers)
+        ],
+    }
+
+
+def prune(today=None):
+    """
+    Drop per-SKU columns older than ANALYTICS_RAW_RETENTION_DAYS and whole
+    days older than ANALYTICS_RETENTION_DAYS. Returns the days touched.
+    """
+    today = today or timezone.localdate()
+    raw_cutoff = today - timedelta(days=settings.ANALYTICS_RAW_RETENTION_DAYS)
+    cutoff = today - timedelta(days=settings.ANALYTICS_RETENTION_DAYS)
+    pruned = 0
+    for day in snapshot_days(date.min, raw_cutoff - timedelta(days=1)):
+        path = snapshot_dir(day)
+        if day < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            pruned += 1
+        elif os.path.exists(os.path.join(path, 'product_id.npy')):
+            for column in SNAPSHOT_DTYPE.names:
+                os.remove(os.path.join(path, f'{column}.npy'))
+            pruned += 1
+    return pruned
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        from inventory_api import instrumentation, metrics
+        # A no-op unless INSTRUMENTATION_ENABLED is set
+        instrumentation.install()
+        metrics.install()
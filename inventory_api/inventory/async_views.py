@@ -0,0 +1,193 @@
+"""
+Async versions of the high-traffic read endpoints.
+
+These are plain Django async views backed by the async ORM. When the project
+is served through `inventory_api.asgi` (e.g. with uvicorn), a request that is
+waiting on the database does not hold on to a worker thread. The responses
+mirror their DRF counterparts in `views.py`.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from django_filters.filterset import filterset_factory
+from rest_framework import serializers, status
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import hot_stock
+from .models import Product, Inventory, Supplier
+from .serializers import ProductSerializer, InventorySerializer, serializer_field_paths
+from .views import CustomPagination
+
+
+ProductFilterSet = filterset_factory(Product, fields=['name', 'price', 'supplier__name'])
+
+
+def _sparse_fieldset(request):
+    """
+    Parse the `fields` and `exclude` query parameters, as in SparseFieldsetMixin.
+    """
+    def parse(param):
+        value = request.GET.get(param)
+        if value is None:
+            return None
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    return parse('fields'), parse('exclude')
+
+
+def _apply_sparse_fieldset(queryset, serializer_class, fields, exclude, always_load=('version',)):
+    """
+    Narrow the queryset to the columns needed by the trimmed serializer,
+    plus `always_load` (the version, for the ETag).
+    """
+    if fields is None and exclude is None:
+        return queryset
+    relations, columns = serializer_field_paths(serializer_class(fields=fields, exclude=exclude))
+    queryset = queryset.select_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*columns, *always_load)
+
+
+def _page_size(request):
+    """
+    Resolve the page size the same way CustomPagination does.
+    """
+    try:
+        page_size = int(request.GET[CustomPagination.page_size_query_param])
+        if page_size > 0:
+            return min(page_size, CustomPagination.max_page_size)
+    except (KeyError, ValueError):
+        pass
+    return CustomPagination.page_size
+
+
+def _page_link(request, page_number, last_page):
+    """
+    Build the `next`/`previous` links of a paginated response.
+    """
+    if page_number < 1 or page_number > last_page:
+        return None
+    url = request.build_absolute_uri()
+    if page_number == 1:
+        return remove_query_param(url, 'page')
+    return replace_query_param(url, 'page', page_number)
+
+
+@require_GET
+async def product_list(request):
+    """
+    Async GET of the paginated, filterable product list.
+    """
+    fields, exclude = _sparse_fieldset(request)
+    try:
+        queryset = _apply_sparse_fieldset(
+            Product.objects.filter(supplier__deleting=False).select_related('supplier').order_by('name'),
+            ProductSerializer, fields, exclude
+        )
+    except serializers.ValidationError as e:
+        return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+    filterset = ProductFilterSet(request.GET, queryset=queryset)
+    if not filterset.is_valid():
+        return JsonResponse(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+    queryset = filterset.qs
+
+    page_size = _page_size(request)
+    count = await queryset.acount()
+    last_page = max(1, -(-count // page_size))
+    try:
+        page_number = int(request.GET.get('page', 1))
+    except ValueError:
+        page_number = 0
+    if page_number < 1 or page_number > last_page:
+        return JsonResponse({"detail": "Invalid page."}, status=status.HTTP_404_NOT_FOUND)
+
+    offset = (page_number - 1) * page_size
+    products = [product async for product in queryset[offset:offset + page_size]]
+
+    return JsonResponse({
+        "count": count,
+        "next": _page_link(request, page_number + 1, last_page),
+        "previous": _page_link(request, page_number - 1, last_page),
+        "results": ProductSerializer(products, many=True, fields=fields, exclude=exclude).data,
+    })
+
+
+@require_GET
+async def product_detail(request, pk):
+    """
+    Async GET of a single product.
+    """
+    fields, exclude = _sparse_fieldset(request)
+    try:
+        queryset = _apply_sparse_fieldset(
+            Product.objects.filter(supplier__deleting=False).select_related('supplier'),
+            ProductSerializer, fields, exclude
+        )
+        product = await queryset.aget(pk=pk)
+    except serializers.ValidationError as e:
+        return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+    except Product.DoesNotExist:
+        return JsonResponse({"detail": "No Product matches the given query."}, status=status.HTTP_404_NOT_FOUND)
+
+    response = JsonResponse(ProductSerializer(product, fields=fields, exclude=exclude).data)
+    response['ETag'] = f'"{product.version}"'
+    return response
+
+
+@require_GET
+async def inventory_detail(request, pk):
+    """
+    Async GET of the inventory level for a single product.
+    """
+    fields, exclude = _sparse_fieldset(request)
+    try:
+        queryset = _apply_sparse_fieldset(
+            Inventory.objects.filter(product__supplier__deleting=False).select_related('product__supplier'),
+            InventorySerializer, fields, exclude
+        )
+        inventory = await hot_stock.annotate_hot_state(queryset).aget(pk=pk)
+    except serializers.ValidationError as e:
+        return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+    except Inventory.DoesNotExist:
+        return JsonResponse({"detail": "No Inventory matches the given query."}, status=status.HTTP_404_NOT_FOUND)
+
+    await sync_to_async(hot_stock.merge_pending_quantities)([inventory])
+    response = JsonResponse(InventorySerializer(inventory, fields=fields, exclude=exclude).data)
+    response['ETag'] = f'"{inventory.version}"'
+    return response
+
+
+@require_GET
+async def supplier_products(request, pk):
+    """
+    Async GET of all products and their quantities for a given supplier,
+    summed over every location or at `?location=<code>` only.
+    """
+    try:
+        supplier = await Supplier.objects.aget(id=pk)
+    except Supplier.DoesNotExist:
+        return JsonResponse({"error": "Supplier not found"}, status=status.HTTP_404_NOT_FOUND)
+    location = request.GET.get('location') or None
+
+    # Products and their summed quantities in one query instead of one per product
+    products = [
+        product async for product in Product.objects
+        .filter(supplier=supplier)
+        .with_quantity(location)
+        .order_by('pk')
+    ]
+    product_data = ProductSerializer(products, many=True, exclude=['supplier']).data
+
+    total_inventory_value = await supplier.atotal_inventory_value(location)
+
+    return JsonResponse({
+        'supplier_name': supplier.name,
+        'total_products': await Product.objects.filter(supplier=supplier).acount(),
+        'total_inventory_value': "{:,.2f}".format(total_inventory_value),
+        'products': [
+            {'product': data, 'quantity': product.quantity}
+            for product, data in zip(products, product_data)
+        ],
+    })
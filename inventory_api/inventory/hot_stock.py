@@ -0,0 +1,301 @@
+"""
+Redis write-behind counters for hot SKUs.
+
+Inventory rows flagged with `is_hot` don't take a row lock per adjustment.
+Instead, adjustments are added to a pending delta per inventory row (product
+and location, see `hot_key`) in Redis by a Lua script, which also does the oversell check, and `flush_pending_deltas`
+(run every `HOT_SKU_FLUSH_INTERVAL` seconds by Celery beat) applies the
+accumulated deltas to the database in batches.
+
+The available quantity of a hot SKU is
+
+    database quantity + pending delta + deltas of flushed batches the
+    database quantity doesn't include yet
+
+Every flushed batch gets an increasing id, the database records the id of
+each batch it applied (HotStockFlush) in the same transaction as the deltas,
+and readers load the highest applied id in the same statement as the
+quantity. Flushed batches are kept in Redis for `HOT_SKU_FLUSH_RETENTION`
+seconds, so a reader always knows exactly which deltas to add, and a batch
+is applied exactly once even if a worker dies half way through a flush.
+
+Every other write of a hot row's quantity (batch adjustments, reservations,
+PUT/PATCH) is rejected, so the database never moves underneath the pending
+deltas. A delta the database still rejects is retried with the next batch,
+up to HOT_SKU_MAX_RETRIES times; it is then logged and parked in the
+`hotsku:parked` hash instead of being retried forever.
+
+The Lua scripts look up the flushed batches they need by name rather than
+through KEYS, so this needs a single Redis node (or a primary with
+replicas), not Redis Cluster.
+"""
+import logging
+
+import redis
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Subquery, F
+
+from .models import (
+    Inventory, HotStockFlush, StockMovement, InsufficientStockError, HotInventoryError, default_location,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class PendingDeltasError(Exception):
+    """
+    Raised when a row leaves hot-SKU mode while Redis still holds deltas
+    its database quantity doesn't include.
+    """
+
+
+PENDING_KEY = 'hotsku:pending'  # Hash of hot key -> pending delta
+FLUSH_SEQUENCE_KEY = 'hotsku:flush_seq'
+FLUSHES_KEY = 'hotsku:flushes'  # Sorted set of flushed batch ids
+BATCH_KEY_PREFIX = 'hotsku:batch:'  # Hash of hot key -> delta, per flushed batch
+FLUSH_LOCK_KEY = 'hotsku:flush_lock'
+RETRIES_KEY = 'hotsku:retries'  # Hash of hot key -> flushes its delta was rejected by
+PARKED_KEY = 'hotsku:parked'  # Hash of hot key -> delta given up on, for manual review
+
+# Add the deltas of every flushed batch newer than the applied id ARGV[2]
+_UNAPPLIED = """
+local function unapplied(product_id)
+    local total = 0
+    for _, batch_id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '(' .. ARGV[2], '+inf')) do
+        total = total + tonumber(redis.call('HGET', ARGV[1] .. batch_id, product_id) or '0')
+    end
+    return total
+end
+"""
+
+# KEYS: pending, flushes. ARGV: batch prefix, applied id, hot key, delta, database quantity,
+# reserved quantity. Returns {1, new quantity} or {0, current quantity} when the delta would
+# take the quantity below the reserved quantity.
+ADJUST_SCRIPT = _UNAPPLIED + """
+local available = tonumber(ARGV[5]) + tonumber(redis.call('HGET', KEYS[1], ARGV[3]) or '0')
+    + unapplied(ARGV[3])
+local delta = tonumber(ARGV[4])
+if available + delta < tonumber(ARGV[6]) then
+    return {0, available}
+end
+redis.call('HINCRBY', KEYS[1], ARGV[3], delta)
+return {1, available + delta}
+"""
+
+# KEYS: pending, flushes. ARGV: batch prefix, applied id, hot keys...
+# Returns the delta to add to the database quantity of each inventory row.
+PENDING_SCRIPT = _UNAPPLIED + """
+local deltas = {}
+for i = 3, #ARGV do
+    deltas[#deltas + 1] = tonumber(redis.call('HGET', KEYS[1], ARGV[i]) or '0') + unapplied(ARGV[i])
+end
+return deltas
+"""
+
+# KEYS: pending, flush sequence, flushes. ARGV: batch prefix.
+# Moves the pending deltas into a new numbered batch and returns its id.
+FLUSH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local batch_id = redis.call('INCR', KEYS[2])
+redis.call('RENAME', KEYS[1], ARGV[1] .. batch_id)
+redis.call('ZADD', KEYS[3], batch_id, batch_id)
+return batch_id
+"""
+
+_client = None
+
+
+def hot_key(location_id, product_id):
+    """
+    Field of an inventory row in the Redis hashes. Location codes are slugs,
+    so they never contain the separator.
+    """
+    return f'{location_id}:{product_id}'
+
+
+def get_client():
+    """
+    Return the shared Redis client for `HOT_SKU_REDIS_URL`.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.HOT_SKU_REDIS_URL)
+    return _client
+
+
+def annotate_hot_state(queryset):
+    """
+    Annotate an Inventory queryset with what's needed to merge pending deltas:
+    the `is_hot` flag (even when the column is deferred) and the id of the
+    last batch applied to the database, read in the same statement.
+    """
+    last_flush = HotStockFlush.objects.order_by('-flush_id').values('flush_id')[:1]
+    return queryset.annotate(hot_sku=F('is_hot'), hot_flush_id=Subquery(last_flush))
+
+
+def adjust_quantity(delta, **lookup):
+    """
+    Add a signed `delta` to the inventory row matching `lookup` and return
+    the new quantity, as `Inventory.objects.adjust_quantity()` does.
+
+    Rows that aren't hot are updated in the database directly. Hot rows are
+    adjusted in Redis and written to the database by the next flush.
+    """
+    try:
+        return Inventory.objects.adjust_quantity(delta, exclude_hot=True, **lookup)
+    except HotInventoryError:
+        pass
+
+    location_id, product_id, quantity, reserved, applied_id = \
+        annotate_hot_state(Inventory.objects.filter(**lookup)) \
+        .values_list('location_id', 'product_id', 'quantity', 'reserved', 'hot_flush_id').get()
+
+    client = get_client()
+    adjusted, quantity = client.register_script(ADJUST_SCRIPT)(
+        keys=[PENDING_KEY, FLUSHES_KEY],
+        args=[BATCH_KEY_PREFIX, applied_id or 0, hot_key(location_id, product_id), delta, quantity, reserved],
+    )
+    if not adjusted:
+        raise InsufficientStockError(f"Adjustment of {delta} would take the quantity below the reserved quantity.")
+    return quantity
+
+
+def pending_deltas(keys, applied_id):
+    """
+    Return `{hot key: delta}` with the deltas not yet reflected in database
+    quantities that include batches up to `applied_id`.
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+    deltas = get_client().register_script(PENDING_SCRIPT)(
+        keys=[PENDING_KEY, FLUSHES_KEY],
+        args=[BATCH_KEY_PREFIX, applied_id or 0, *keys],
+    )
+    return dict(zip(keys, deltas))
+
+
+def has_pending_deltas(location_id, product_id):
+    """
+    Whether the inventory row has deltas, pending or in a batch not yet
+    applied, that its database quantity doesn't include.
+    """
+    applied_id = HotStockFlush.objects.aggregate(Max('flush_id'))['flush_id__max']
+    key = hot_key(location_id, product_id)
+    return pending_deltas([key], applied_id)[key] != 0
+
+
+def merge_pending_quantities(inventories):
+    """
+    Add the pending deltas of hot SKUs to the quantities of Inventory
+    instances loaded through `annotate_hot_state()`, with one Redis call.
+
+    If Redis can't be reached the database quantities are left as they are.
+    """
+    hot = [
+        inventory for inventory in inventories
+        if getattr(inventory, 'hot_sku', False) and 'quantity' in inventory.__dict__
+    ]
+    if not hot:
+        return
+    try:
+        deltas = pending_deltas(
+            {hot_key(inventory.location_id, inventory.product_id) for inventory in hot}, hot[0].hot_flush_id
+        )
+    except redis.RedisError:
+        logger.warning("Could not read pending hot SKU deltas.", exc_info=True)
+        return
+    for inventory in hot:
+        inventory.quantity += deltas.get(hot_key(inventory.location_id, inventory.product_id), 0)
+
+
+def flush_pending_deltas():
+    """
+    Apply the pending deltas to the database as one numbered batch, finishing
+    any batch an earlier run left half done first. Returns the number of
+    inventory rows written.
+    """
+    client = get_client()
+    lock = client.lock(FLUSH_LOCK_KEY, timeout=max(60, settings.HOT_SKU_FLUSH_INTERVAL * 10))
+    if not lock.acquire(blocking=False):
+        return 0
+
+    try:
+        flushed = 0
+        # Batches without an expiry haven't been confirmed as written yet
+        for batch_id in client.zrange(FLUSHES_KEY, 0, -1):
+            batch_id = int(batch_id)
+            ttl = client.ttl(f'{BATCH_KEY_PREFIX}{batch_id}')
+            if ttl == -1:
+                flushed += _apply_batch(client, batch_id)
+            elif ttl == -2:
+                client.zrem(FLUSHES_KEY, batch_id)
+
+        batch_id = client.register_script(FLUSH_SCRIPT)(
+            keys=[PENDING_KEY, FLUSH_SEQUENCE_KEY, FLUSHES_KEY], args=[BATCH_KEY_PREFIX]
+        )
+        if batch_id:
+            flushed += _apply_batch(client, int(batch_id))
+        return flushed
+    finally:
+        lock.release()
+
+
+def _apply_batch(client, batch_id):
+    """
+    Write one batch of deltas to the database, once, and mark it as applied.
+    """
+    batch_key = f'{BATCH_KEY_PREFIX}{batch_id}'
+    deltas = {key.decode(): int(delta) for key, delta in client.hgetall(batch_key).items()}
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    # Bulk adjustments apply to one location at a time. Keys written before
+    # locations existed are bare product ids, of stock at the default location.
+    by_location, keys = {}, {}
+    for key, delta in deltas.items():
+        location_id, _, product_id = key.rpartition(':')
+        location_id, product_id = location_id or default_location(), int(product_id)
+        by_location.setdefault(location_id, {})[product_id] = delta
+        keys[location_id, product_id] = key
+
+    errors = {}
+    try:
+        with transaction.atomic():
+            # The unique flush id makes re-running a batch a no-op
+            HotStockFlush.objects.create(flush_id=batch_id)
+            for location_id, location_deltas in by_location.items():
+                _, rejected = Inventory.objects.bulk_adjust_quantity(
+                    location_deltas, atomic=False, reason=StockMovement.Reason.HOT_SKU, location_id=location_id
+                )
+                errors.update({keys[location_id, product_id]: error for product_id, error in rejected.items()})
+    except IntegrityError:
+        logger.info("Hot SKU batch %s was already applied.", batch_id)
+        deltas = {}
+
+    # Put rejected deltas back so they are retried with the next batch, a
+    # limited number of times
+    applied = [key for key in deltas if key not in errors]
+    if applied:
+        client.hdel(RETRIES_KEY, *applied)
+    for key, error in errors.items():
+        if error != "Insufficient stock":
+            logger.warning("Dropping hot SKU delta of %s for inventory %s: %s.", deltas[key], key, error)
+        elif client.hincrby(RETRIES_KEY, key, 1) < settings.HOT_SKU_MAX_RETRIES:
+            client.hincrby(PENDING_KEY, key, deltas[key])
+        else:
+            logger.error(
+                "Parking hot SKU delta of %s for inventory %s after %s rejected flushes.",
+                deltas[key], key, settings.HOT_SKU_MAX_RETRIES,
+            )
+            client.hincrby(PARKED_KEY, key, deltas[key])
+            client.hdel(RETRIES_KEY, key)
+
+    # Keep the batch around for readers that loaded quantities before it was applied
+    client.expire(batch_key, settings.HOT_SKU_FLUSH_RETENTION)
+
+    last_applied = HotStockFlush.objects.aggregate(Max('flush_id'))['flush_id__max']
+    HotStockFlush.objects.filter(flush_id__lt=last_applied - 1000).delete()
+    return len(deltas) - len(errors)
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.PositiveSmallIntegerField(choices=[(1, 'Manual update'), (2, 'Adjustment'), (3, 'Batch adjustment'), (4, 'CSV import')])),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='stockmovement_created_idx'), models.Index(fields=['product', 'created_at'], name='stockmovement_product_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('taken_at', models.DateTimeField()),
+                ('product', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'taken_at'], name='stocksnapshot_product_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HotStockFlush',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('flush_id', models.PositiveBigIntegerField(unique=True)),
+                ('applied_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='is_hot',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Manual update'), (2, 'Adjustment'), (3, 'Batch adjustment'), (4, 'CSV import'), (5, 'Hot SKU flush')]),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_hot_sku'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
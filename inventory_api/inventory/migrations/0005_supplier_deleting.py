@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_versioning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='supplier',
+            name='deleting',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_supplier_deleting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Manual update'), (2, 'Adjustment'), (3, 'Batch adjustment'), (4, 'CSV import'), (5, 'Hot SKU flush'), (6, 'Reservation confirmed')]),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Active'), (2, 'Confirmed'), (3, 'Released'), (4, 'Expired')], default=1)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 1)), fields=['expires_at'], name='reservation_active_expiry_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveBigIntegerField(null=True, unique=True)),
+                ('object_type', models.PositiveSmallIntegerField(choices=[(1, 'Product'), (2, 'Inventory'), (3, 'Supplier')])),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('action', models.PositiveSmallIntegerField(choices=[(1, 'Saved'), (2, 'Deleted')])),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('sequence__isnull', True)), fields=['id'], name='change_unsequenced_idx')],
+            },
+        ),
+    ]
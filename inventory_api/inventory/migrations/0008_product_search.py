@@ -0,0 +1,76 @@
+from django.db import migrations
+
+
+# PostgreSQL: a stored generated tsvector column, so every write keeps it up
+# to date (bulk INSERT/UPDATE and raw SQL included), with a GIN index.
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE inventory_product ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX product_search_idx ON inventory_product USING GIN (search_vector)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS product_search_idx",
+    "ALTER TABLE inventory_product DROP COLUMN IF EXISTS search_vector",
+]
+
+# SQLite: an external-content FTS5 table over the product table, kept in sync
+# by triggers. Django rebuilds SQLite tables to alter them, which drops their
+# triggers: a later migration altering inventory_product must recreate them.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE inventory_product_fts USING fts5(
+        name, description, content='inventory_product', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER inventory_product_fts_insert AFTER INSERT ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_product_fts_delete AFTER DELETE ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts (inventory_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_product_fts_update AFTER UPDATE OF name, description ON inventory_product BEGIN
+        INSERT INTO inventory_product_fts (inventory_product_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO inventory_product_fts (rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO inventory_product_fts (inventory_product_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS inventory_product_fts_insert",
+    "DROP TRIGGER IF EXISTS inventory_product_fts_delete",
+    "DROP TRIGGER IF EXISTS inventory_product_fts_update",
+    "DROP TABLE IF EXISTS inventory_product_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_change_feed'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
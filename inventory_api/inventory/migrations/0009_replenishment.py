@@ -0,0 +1,29 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplenishmentForecast',
+            fields=[
+                ('product', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='inventory.product')),
+                ('as_of', models.DateField()),
+                ('quantity', models.IntegerField()),
+                ('consumption_rate', models.FloatField()),
+                ('days_of_cover', models.FloatField(null=True)),
+                ('reorder_point', models.IntegerField()),
+                ('reorder_quantity', models.IntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['days_of_cover', 'product'], name='replenishment_urgency_idx')],
+            },
+        ),
+    ]
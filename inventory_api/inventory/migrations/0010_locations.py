@@ -0,0 +1,52 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:36
+
+import django.db.models.deletion
+import inventory.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_default_location(apps, schema_editor):
+    # Existing stock moves to the location of this deployment
+    Location = apps.get_model('inventory', 'Location')
+    code = settings.INVENTORY_LOCATION
+    Location.objects.using(schema_editor.connection.alias).get_or_create(
+        code=code, defaults={'name': code.replace('-', ' ').title()}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_replenishment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('code', models.SlugField(max_length=20, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.RunPython(create_default_location, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='inventory',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventories', to='inventory.product'),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='location',
+            field=models.ForeignKey(db_constraint=False, db_index=False, default=inventory.models.default_location, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='inventory.location'),
+        ),
+        migrations.AddField(
+            model_name='stockreservation',
+            name='location',
+            field=models.ForeignKey(db_constraint=False, db_index=False, default=inventory.models.default_location, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='inventory.location'),
+        ),
+        migrations.AddConstraint(
+            model_name='inventory',
+            constraint=models.UniqueConstraint(fields=('location', 'product'), name='inventory_location_product_uniq'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-19 12:16
+
+from django.db import migrations, models
+
+
+def mark_snapshotted_movements(apps, schema_editor):
+    # Until now a snapshot included the movements created at or before it
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    StockSnapshot = apps.get_model('inventory', 'StockSnapshot')
+    StockMovement.objects.update(snapshot_at=models.Subquery(
+        StockSnapshot.objects.filter(
+            product_id=models.OuterRef('product_id'), taken_at__gte=models.OuterRef('created_at')
+        ).order_by('taken_at').values('taken_at')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_locations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmovement',
+            name='snapshot_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_snapshotted_movements, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='reason',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Manual update'), (2, 'Adjustment'), (3, 'Batch adjustment'), (4, 'CSV import'), (5, 'Hot SKU flush'), (6, 'Reservation confirmed'), (7, 'Inventory deleted')]),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(condition=models.Q(('snapshot_at__isnull', True)), fields=['product'], name='stockmovement_pending_idx'),
+        ),
+    ]
@@ -1,13 +1,62 @@
-from django.db import models
-from django.db.models import Sum, F
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, connections, router, transaction, IntegrityError
+from django.db.models import Sum, F, Max
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.db.models.functions import Lower
 
 
+class ChangeTrackedModel(models.Model):
+    """
+    Records a Change for every save, in the same transaction as the save.
+    Deletes, including cascades, are recorded set-based before the rows go
+    (see `ChangeManager.record_deletion()`). There are no delete signals, so
+    Django can still delete cascaded rows without loading them; queryset
+    deletes must call `record_deletion()` themselves.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            Change.objects.record(type(self), [self.pk], Change.Action.SAVED, using=using)
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            Change.objects.record_deletion(type(self)._base_manager.using(using).filter(pk=self.pk))
+            return super().delete(using=using, keep_parents=keep_parents)
+
+    @classmethod
+    def record_deletion(cls, queryset):
+        """
+        Record the deletion of the objects matched by `queryset`, right
+        before they are deleted. Called by `ChangeManager.record_deletion()`.
+        """
+        Change.objects.record_matching(queryset, Change.Action.DELETED)
+
+
+class SupplierManager(models.Manager):
+
+    def get_queryset(self):
+        # Suppliers being deleted in the background are hidden from reads
+        return super().get_queryset().filter(deleting=False)
+
+
 # Create your models here.
-class Supplier(models.Model):
+class Supplier(ChangeTrackedModel):
     name = models.CharField(max_length=100)
     contact_info = models.TextField()
+    # Set while inventory.tasks.delete_supplier removes the supplier's products
+    deleting = models.BooleanField(default=False)
+
+    objects = SupplierManager()
+    all_objects = models.Manager()
 
     class Meta:
         constraints = [
@@ -20,34 +69,1001 @@ class Supplier(models.Model):
     def __str__(self):
         return self.name
     
-    def total_inventory_value(self):
-        # Calculate total value of all products and their quantities in one query
-        total_value = Product.objects.filter(supplier=self) \
-            .annotate(total_price=F('price') * F('inventory__quantity')) \
+    def _inventory_value_queryset(self, location=None):
+        # One row per product and location, so stock at every site is counted
+        inventories = Inventory.objects.filter(product__supplier=self)
+        if location:
+            inventories = inventories.filter(location_id=location)
+        return inventories.annotate(total_price=F('product__price') * F('quantity'))
+
+    def total_inventory_value(self, location=None):
+        # Calculate total value of all products and their quantities in one query,
+        # across every location or at `location` only
+        total_value = self._inventory_value_queryset(location) \
             .aggregate(Sum('total_price'))['total_price__sum'] or 0
         
         return total_value
+
+    async def atotal_inventory_value(self, location=None):
+        # Async counterpart of total_inventory_value() for the async views
+        aggregate = await self._inventory_value_queryset(location).aaggregate(Sum('total_price'))
+        return aggregate['total_price__sum'] or 0
     
 
-class Product(models.Model):
+class VersionConflictError(Exception):
+    """
+    Raised when saving an object that changed since it was loaded.
+    """
+
+
+class VersionedModel(models.Model):
+    """
+    Adds a `version` column that every update increments.
+
+    Saving an existing instance only updates its row if the row still has
+    the version the instance holds. The check is part of the UPDATE's WHERE
+    clause, so no row lock is taken; if another writer got there first,
+    VersionConflictError is raised and nothing is written.
+    """
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        abstract = True
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        if not values or 'version' in self.get_deferred_fields():
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+
+        version_field = self._meta.get_field('version')
+        values = [value for value in values if value[0] is not version_field]
+        values.append((version_field, None, self.version + 1))
+        if super()._do_update(
+            base_qs.filter(version=self.version), using, pk_val, values, update_fields, forced_update
+        ):
+            self.version += 1
+            return True
+
+        # Nothing matched: a stale version rather than a missing row
+        if base_qs.filter(pk=pk_val).exists():
+            raise VersionConflictError(
+                f"{self._meta.object_name} {pk_val} has changed since version {self.version}."
+            )
+        return False
+
+
+class ProductQuerySet(models.QuerySet):
+
+    def with_quantity(self, location=None):
+        """
+        Products that have inventory (at `location` only, if given), each
+        annotated with its `quantity` summed over those locations.
+        """
+        if location:
+            products = self.filter(inventories__location_id=location)
+        else:
+            products = self.filter(inventories__isnull=False)
+        # The sum runs over the inventory join of the filter above
+        return products.annotate(quantity=Sum('inventories__quantity'))
+
+    def bulk_delete(self):
+        """
+        Delete the matched products and their inventory with set-based
+        `DELETE ... WHERE id IN (SELECT ...)` statements, without loading
+        them or collecting their dependents. The deletions are added to the
+        change feed and the stock is closed in the ledger in the same
+        transaction. Returns the number of products deleted.
+        """
+        connection = connections[self._db or router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+        product_table = quote(self.model._meta.db_table)
+        inventory_table = quote(Inventory._meta.db_table)
+        batch, params = self.order_by().values('pk').query.sql_with_params()
+
+        now = timezone.now()
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(
+                Change.objects.insert_sql(connection, f"{inventory_table} WHERE product_id IN ({batch})", cte=False),
+                [*Change.objects.insert_params(Inventory, Change.Action.DELETED, now), *params],
+            )
+            cursor.execute(
+                Change.objects.insert_sql(connection, f"({batch}) AS batch", cte=False),
+                [*Change.objects.insert_params(self.model, Change.Action.DELETED, now), *params],
+            )
+            cursor.execute(
+                StockMovement.objects.closing_sql(
+                    connection, f"{inventory_table} WHERE product_id IN ({batch}) AND quantity <> 0"
+                ),
+                [*StockMovement.objects.closing_params(now), *params],
+            )
+            cursor.execute(f"DELETE FROM {inventory_table} WHERE product_id IN ({batch})", params)
+            cursor.execute(f"DELETE FROM {product_table} WHERE id IN ({batch})", params)
+            return cursor.rowcount
+
+
+class Product(ChangeTrackedModel, VersionedModel):
     name = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     supplier = models.ForeignKey(Supplier, related_name='products', on_delete=models.CASCADE)
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return self.name
+
+
+class Location(models.Model):
+    """
+    A site that holds stock, such as a warehouse. Keyed by its code, so the
+    location of a deployment (INVENTORY_LOCATION) is known without a query.
+    """
+    code = models.SlugField(max_length=20, primary_key=True)
+    name = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.name
+
+
+def default_location():
+    """
+    Code of the location used when a write doesn't name one.
+    """
+    return settings.INVENTORY_LOCATION
     
 
-class Inventory(models.Model):
-    product = models.OneToOneField(Product, related_name='inventory', on_delete=models.CASCADE)
+class InsufficientStockError(Exception):
+    """
+    Raised when a stock change would take a quantity below its reserved
+    quantity, i.e. take more than the available stock.
+    """
+
+
+class HotInventoryError(Exception):
+    """
+    Raised when a database adjustment skips a row in hot-SKU mode.
+    """
+
+
+def supports_update_returning(connection):
+    """
+    Whether the database can return columns from an UPDATE statement.
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35, 0)
+    return False
+
+
+class InventoryManager(models.Manager):
+
+    def adjust_quantity(self, delta, reason=None, exclude_hot=False, **lookup):
+        """
+        Atomically add a signed `delta` to the quantity of the inventory row
+        matching `lookup` (e.g. `pk=1`, or `product_id=1` with an optional
+        `location_id`, the default location otherwise) and return the new
+        quantity. The change is recorded in the stock movement ledger with
+        the given `reason` (StockMovement.Reason.ADJUSTMENT by default).
+
+        This is a single conditional `UPDATE ... SET quantity = quantity + delta
+        WHERE quantity + delta >= reserved`, so concurrent adjustments never lose
+        updates and no row lock is held across round-trips. The new value
+        comes from RETURNING where the database supports it.
+
+        Raises InsufficientStockError if the adjustment would oversell and
+        Inventory.DoesNotExist if no row matches. With `exclude_hot=True`, rows
+        in hot-SKU mode are left alone and HotInventoryError is raised instead
+        (see `inventory.hot_stock`).
+        """
+        if 'pk' not in lookup:
+            lookup.setdefault('location_id', default_location())
+        columns = [
+            (self.model._meta.pk if name == 'pk' else self.model._meta.get_field(name)).column
+            for name in lookup
+        ]
+        connection = connections[router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+
+        with transaction.atomic(using=connection.alias):
+            if supports_update_returning(connection):
+                quantity, product_id, version = quote('quantity'), quote('product_id'), quote('version')
+                hot_filter = f"AND NOT {quote('is_hot')} " if exclude_hot else ""
+                sql = (
+                    f"UPDATE {quote(self.model._meta.db_table)} "
+                    f"SET {quantity} = {quantity} + %s, {version} = {version} + 1 "
+                    f"WHERE {' AND '.join(f'{quote(column)} = %s' for column in columns)} "
+                    f"AND {quantity} + %s >= {quote('reserved')} "
+                    f"{hot_filter}"
+                    f"RETURNING {quote('id')}, {product_id}, {quantity}"
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, [delta, *lookup.values(), delta])
+                    row = cursor.fetchone()
+            else:
+                queryset = self.using(connection.alias).filter(**lookup)
+                if exclude_hot:
+                    queryset = queryset.filter(is_hot=False)
+                row = None
+                if queryset.filter(quantity__gte=F('reserved') - delta).update(
+                    quantity=F('quantity') + delta, version=F('version') + 1
+                ):
+                    row = queryset.values_list('pk', 'product_id', 'quantity').get()
+
+            if row is not None:
+                inventory_id, product_id, quantity = row
+                if delta:
+                    StockMovement.objects.using(connection.alias).create(
+                        product_id=product_id, delta=delta, reason=reason or StockMovement.Reason.ADJUSTMENT
+                    )
+                Change.objects.record(self.model, [inventory_id], Change.Action.SAVED, using=connection.alias)
+                return quantity
+
+        # Nothing was updated: tell a missing row apart from an oversell
+        is_hot = self.using(connection.alias).filter(**lookup).values_list('is_hot', flat=True).first()
+        if is_hot is None:
+            raise self.model.DoesNotExist("Inventory not found.")
+        if is_hot and exclude_hot:
+            raise HotInventoryError("Inventory is in hot-SKU mode.")
+        raise InsufficientStockError(f"Adjustment of {delta} would take the quantity below the reserved quantity.")
+
+    def bulk_adjust_quantity(self, adjustments, atomic=True, batch_size=500, reason=None, location_id=None,
+                             exclude_hot=False):
+        """
+        Apply many signed deltas, given as a `{product_id: delta}` dict, to
+        the stock at `location_id` (the default location if not given) in one
+        transaction with one UPDATE statement per `batch_size` products. The
+        applied deltas are recorded in the ledger with one INSERT per chunk.
+        With `exclude_hot=True`, rows in hot-SKU mode are rejected.
+
+        Uses `UPDATE ... FROM (VALUES ...)` on PostgreSQL and a CASE-based
+        UPDATE elsewhere; either way each row only changes if it stays at or
+        above its reserved quantity. Returns `(quantities, errors)`: the new
+        quantity of every adjusted product and an error message for every
+        rejected one.
+
+        With `atomic=True` a single rejection rolls back the whole batch and
+        `quantities` is empty.
+        """
+        connection = connections[router.db_for_write(self.model)]
+        reason = reason or StockMovement.Reason.BATCH
+        location_id = location_id or default_location()
+        inventories = self.using(connection.alias).filter(location_id=location_id)
+        quantities, errors = {}, {}
+        items = list(adjustments.items())
+
+        with transaction.atomic(using=connection.alias):
+            for start in range(0, len(items), batch_size):
+                chunk = dict(items[start:start + batch_size])
+                adjusted = self._bulk_adjust_chunk(connection, chunk, location_id, exclude_hot)
+                quantities.update(adjusted)
+
+                StockMovement.objects.using(connection.alias).bulk_create([
+                    StockMovement(product_id=product_id, delta=chunk[product_id], reason=reason)
+                    for product_id in adjusted if chunk[product_id]
+                ])
+                if adjusted:
+                    Change.objects.record_matching(
+                        inventories.filter(product_id__in=list(adjusted)), Change.Action.SAVED
+                    )
+
+                # Anything not updated is missing, hot or would oversell
+                rejected = [product_id for product_id in chunk if product_id not in quantities]
+                existing = dict(
+                    inventories
+                    .filter(product_id__in=rejected)
+                    .values_list('product_id', 'is_hot')
+                ) if rejected else {}
+                for product_id in rejected:
+                    if product_id not in existing:
+                        errors[product_id] = "Inventory not found"
+                    elif existing[product_id] and exclude_hot:
+                        errors[product_id] = "Inventory is in hot-SKU mode"
+                    else:
+                        errors[product_id] = "Insufficient stock"
+
+                if atomic and errors:
+                    transaction.set_rollback(True, using=connection.alias)
+                    return {}, errors
+
+        return quantities, errors
+
+    def _bulk_adjust_chunk(self, connection, chunk, location_id, exclude_hot=False):
+        """
+        Run the conditional UPDATE for one chunk at one location and return
+        `{product_id: quantity}` for the rows that changed.
+        """
+        if not supports_update_returning(connection):
+            # Without RETURNING the changed rows can't be told apart, so fall
+            # back to one conditional UPDATE per product
+            quantities = {}
+            for product_id, delta in chunk.items():
+                queryset = self.using(connection.alias).filter(product_id=product_id, location_id=location_id)
+                if exclude_hot:
+                    queryset = queryset.filter(is_hot=False)
+                if queryset.filter(quantity__gte=F('reserved') - delta).update(
+                    quantity=F('quantity') + delta, version=F('version') + 1
+                ):
+                    quantities[product_id] = queryset.values_list('quantity', flat=True).get()
+            return quantities
+
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        quantity, product_id, version = quote('quantity'), quote('product_id'), quote('version')
+        reserved, location = quote('reserved'), quote('location_id')
+        pairs = [value for pair in chunk.items() for value in pair]
+        hot_filter = f"AND NOT {quote('is_hot')} " if exclude_hot else ""
+
+        if connection.vendor == 'postgresql':
+            values = ', '.join(['(%s::bigint, %s::integer)'] * len(chunk))
+            sql = (
+                f"UPDATE {table} AS i SET {quantity} = i.{quantity} + v.delta, {version} = i.{version} + 1 "
+                f"FROM (VALUES {values}) AS v(product_id, delta) "
+                f"WHERE i.{location} = %s AND i.{product_id} = v.product_id "
+                f"AND i.{quantity} + v.delta >= i.{reserved} {hot_filter}"
+                f"RETURNING i.{product_id}, i.{quantity}"
+            )
+            params = pairs + [location_id]
+        else:
+            case = f"CASE {product_id} {' '.join(['WHEN %s THEN %s'] * len(chunk))} END"
+            placeholders = ', '.join(['%s'] * len(chunk))
+            sql = (
+                f"UPDATE {table} SET {quantity} = {quantity} + {case}, {version} = {version} + 1 "
+                f"WHERE {location} = %s AND {product_id} IN ({placeholders}) AND {quantity} + {case} >= {reserved} "
+                f"{hot_filter}RETURNING {product_id}, {quantity}"
+            )
+            params = pairs + [location_id] + list(chunk) + pairs
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return dict(cursor.fetchall())
+
+
+class Inventory(ChangeTrackedModel, VersionedModel):
+    """
+    Stock of a product at a location; a product has one row per location
+    that holds it. Rows are keyed (location, product), so the reads and
+    writes of a site stay within its own range of the unique index.
+    """
+    product = models.ForeignKey(Product, related_name='inventories', on_delete=models.CASCADE)
+    # Not enforced by the database, so a site's rows can be written knowing only its code
+    location = models.ForeignKey(
+        Location, related_name='+', on_delete=models.PROTECT, db_constraint=False, db_index=False,
+        default=default_location,
+    )
     quantity = models.PositiveIntegerField(default=0)
+    # Units held by active StockReservations, maintained by StockReservationManager
+    reserved = models.PositiveIntegerField(default=0)
+    # Adjustments of hot SKUs go through Redis, see inventory.hot_stock
+    is_hot = models.BooleanField(default=False)
+
+    objects = InventoryManager()
 
     class Meta:
         verbose_name_plural = _('Inventory Level')
+        constraints = [
+            models.UniqueConstraint(fields=['location', 'product'], name='inventory_location_product_uniq'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.quantity}"
+
+    @classmethod
+    def record_deletion(cls, queryset):
+        super().record_deletion(queryset)
+        # The stock leaves the ledger too, so historical quantities after the delete are right
+        StockMovement.objects.record_closing(queryset)
+
+    @property
+    def available(self):
+        return self.quantity - self.reserved
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored quantity so save() can record the difference
+        instance._loaded_quantity = instance.__dict__.get('quantity')
+        return instance
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # The quantity of a hot SKU only changes through Redis (see
+        # inventory.hot_stock): writing it here would ignore pending deltas.
+        # The new quantity must also still cover the stored reserved count,
+        # which reservations change without loading the row.
+        quantity_changed = any(field.attname == 'quantity' for field, _, _ in values) \
+            and self.quantity != getattr(self, '_loaded_quantity', None)
+        if not quantity_changed:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if super()._do_update(
+            base_qs.filter(is_hot=False, reserved__lte=self.quantity),
+            using, pk_val, values, update_fields, forced_update,
+        ):
+            return True
+        if base_qs.filter(pk=pk_val, is_hot=True).exists():
+            raise HotInventoryError("The quantity of inventory in hot-SKU mode can only be adjusted.")
+        if base_qs.filter(pk=pk_val, reserved__gt=self.quantity).exists():
+            raise InsufficientStockError(f"A quantity of {self.quantity} is less than the reserved quantity.")
+        return False
+
+    def save(self, *args, **kwargs):
+        """
+        Save and record any quantity change in the stock movement ledger.
+        """
+        previous = 0 if self._state.adding else getattr(self, '_loaded_quantity', None)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+            if previous is not None and self.quantity != previous:
+                StockMovement.objects.using(using).create(
+                    product_id=self.product_id,
+                    delta=self.quantity - previous,
+                    reason=StockMovement.Reason.MANUAL,
+                )
+        self._loaded_quantity = self.quantity
     
     # def get_total_number_of_products(self):
-    #     return self.product.count()
\ No newline at end of file
+    #     return self.product.count()
+
+
+class StockMovementManager(models.Manager):
+
+    def record_closing(self, inventories):
+        """
+        Record a movement taking the stock of every inventory row matched by
+        `inventories` to zero, with one `INSERT ... SELECT`. Call it in the
+        same transaction, right before the rows are deleted.
+        """
+        connection = connections[inventories._db or router.db_for_write(inventories.model)]
+        query, params = inventories.exclude(quantity=0).order_by() \
+            .values_list('product_id', 'quantity').query.sql_with_params()
+        sql = self.closing_sql(connection, f"({query}) AS closed")
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*self.closing_params(timezone.now()), *params])
+
+    def closing_sql(self, connection, source):
+        """
+        SQL inserting a closing movement for every `product_id`, `quantity`
+        selected from `source`. Takes `closing_params()` before the
+        parameters of `source`.
+        """
+        quote = connection.ops.quote_name
+        return (
+            f"INSERT INTO {quote(self.model._meta.db_table)} "
+            f"({quote('product_id')}, {quote('delta')}, {quote('reason')}, {quote('created_at')}) "
+            f"SELECT product_id, -quantity, %s, %s FROM {source}"
+        )
+
+    def closing_params(self, when):
+        return [self.model.Reason.CLOSED, when]
+
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger of inventory quantity changes.
+
+    Rows are kept compact (product id, delta, reason, timestamp) and are not
+    tied to the product by a foreign key constraint, so deleting a product
+    neither loses its history nor has to touch the ledger. Deleting stock
+    records a closing movement.
+
+    `snapshot_at` is the `taken_at` of the snapshot run that included the
+    movement. Runs mark what they include rather than going by `created_at`,
+    which is stamped before the movement commits.
+    """
+    class Reason(models.IntegerChoices):
+        MANUAL = 1, _('Manual update')
+        ADJUSTMENT = 2, _('Adjustment')
+        BATCH = 3, _('Batch adjustment')
+        IMPORT = 4, _('CSV import')
+        HOT_SKU = 5, _('Hot SKU flush')
+        RESERVATION = 6, _('Reservation confirmed')
+        CLOSED = 7, _('Inventory deleted')
+
+    product = models.ForeignKey(
+        Product, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False
+    )
+    delta = models.IntegerField()
+    reason = models.PositiveSmallIntegerField(choices=Reason.choices)
+    created_at = models.DateTimeField(default=timezone.now)
+    snapshot_at = models.DateTimeField(null=True, blank=True)
+
+    objects = StockMovementManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='stockmovement_created_idx'),
+            models.Index(fields=['product', 'created_at'], name='stockmovement_product_idx'),
+            # Only the movements the next snapshot run has to pick up
+            models.Index(
+                fields=['product'], condition=models.Q(snapshot_at__isnull=True),
+                name='stockmovement_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.delta:+d} ({self.get_reason_display()})"
+
+
+class StockSnapshotManager(models.Manager):
+
+    def quantity_at(self, product_id, when):
+        """
+        Return the quantity of a product at `when`: the latest snapshot taken
+        at or before that time plus the ledger movements up to `when` that
+        the snapshot didn't include.
+        """
+        snapshot = self.filter(product_id=product_id, taken_at__lte=when) \
+            .order_by('-taken_at').values_list('quantity', 'taken_at').first()
+
+        movements = StockMovement.objects.filter(product_id=product_id, created_at__lte=when)
+        quantity = 0
+        if snapshot:
+            quantity, taken_at = snapshot
+            movements = movements.filter(
+                models.Q(snapshot_at__isnull=True) | models.Q(snapshot_at__gt=taken_at)
+            )
+
+        return quantity + (movements.aggregate(Sum('delta'))['delta__sum'] or 0)
+
+
+class StockSnapshot(models.Model):
+    """
+    Point-in-time quantity of a product, written periodically so historical
+    quantities don't require replaying the whole ledger.
+    """
+    product = models.ForeignKey(
+        Product, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False
+    )
+    quantity = models.IntegerField()
+    taken_at = models.DateTimeField()
+
+    objects = StockSnapshotManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'taken_at'], name='stocksnapshot_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity} at {self.taken_at}"
+
+
+class HotStockFlush(models.Model):
+    """
+    Id of a batch of hot SKU deltas that has been applied to the database.
+    Written in the same transaction as the deltas, so a batch is never
+    applied twice and readers know which batches their quantities include.
+    """
+    flush_id = models.PositiveBigIntegerField(unique=True)
+    applied_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Hot SKU batch {self.flush_id}"
+
+
+class ReservationError(Exception):
+    """
+    Raised when a reservation can't be confirmed or released because it
+    isn't active (it was already confirmed, released or has expired).
+    """
+
+
+class StockReservationManager(models.Manager):
+    """
+    Reserve, confirm and release stock holds.
+
+    `Inventory.reserved` is kept equal to the sum of active holds, so the
+    available quantity is read from the inventory row itself. Every state
+    change is guarded by a conditional UPDATE (enough stock to hold, or the
+    hold still active), so concurrent callers never double-book or
+    double-release. On PostgreSQL each operation is one statement, with the
+    dependent writes in data-modifying CTEs; elsewhere the same statements
+    run one after another in a transaction.
+    """
+
+    def _tables(self, connection):
+        quote = connection.ops.quote_name
+        return (
+            quote(self.model._meta.db_table),
+            quote(Inventory._meta.db_table),
+            quote(StockMovement._meta.db_table),
+        )
+
+    def reserve(self, product_id, quantity, ttl=None, location_id=None):
+        """
+        Hold `quantity` units of a product at `location_id` (the default
+        location if not given) for `ttl` seconds (RESERVATION_TTL_SECONDS by
+        default) and return the reservation id.
+
+        Raises InsufficientStockError if fewer units are available,
+        HotInventoryError if the inventory is in hot-SKU mode (its available
+        quantity depends on deltas pending in Redis) and
+        Inventory.DoesNotExist if the product has no inventory there.
+        """
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=ttl or settings.RESERVATION_TTL_SECONDS)
+        location_id = location_id or default_location()
+        connection = connections[router.db_for_write(self.model)]
+        inventory_row = Inventory.objects.using(connection.alias).filter(product_id=product_id, location_id=location_id)
+
+        with transaction.atomic(using=connection.alias):
+            if connection.vendor == 'postgresql':
+                reservations, inventory, _ = self._tables(connection)
+                sql = (
+                    f"WITH held AS ("
+                    f"UPDATE {inventory} SET reserved = reserved + %s, version = version + 1 "
+                    f"WHERE product_id = %s AND location_id = %s AND quantity - reserved >= %s AND NOT is_hot "
+                    f"RETURNING id, product_id, location_id), "
+                    f"{Change.objects.insert_sql(connection, 'held')} "
+                    f"INSERT INTO {reservations} (product_id, location_id, quantity, status, expires_at, created_at) "
+                    f"SELECT product_id, location_id, %s, %s, %s, %s FROM held RETURNING id"
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, [
+                        quantity, product_id, location_id, quantity,
+                        *Change.objects.insert_params(Inventory, Change.Action.SAVED, now),
+                        quantity, self.model.Status.ACTIVE, expires_at, now,
+                    ])
+                    row = cursor.fetchone()
+                reservation_id = row[0] if row else None
+            else:
+                reservation_id = None
+                if inventory_row.filter(quantity__gte=F('reserved') + quantity, is_hot=False) \
+                        .update(reserved=F('reserved') + quantity, version=F('version') + 1):
+                    reservation_id = self.using(connection.alias).create(
+                        product_id=product_id, location_id=location_id, quantity=quantity,
+                        expires_at=expires_at, created_at=now,
+                    ).pk
+                    Change.objects.record_matching(inventory_row, Change.Action.SAVED)
+
+        if reservation_id is not None:
+            return reservation_id
+        if inventory_row.filter(is_hot=True).exists():
+            raise HotInventoryError("Inventory in hot-SKU mode can't be reserved.")
+        if inventory_row.exists():
+            raise InsufficientStockError(f"Fewer than {quantity} units are available.")
+        raise Inventory.DoesNotExist("Inventory not found.")
+
+    def confirm(self, reservation_id):
+        """
+        Turn an active hold into a sale: the held units leave both the
+        quantity and the reserved count, and the sale is recorded in the
+        ledger. Raises ReservationError if the hold isn't active.
+        """
+        return self._finish(reservation_id, self.model.Status.CONFIRMED)
+
+    def release(self, reservation_id):
+        """
+        Give the units of an active hold back. Raises ReservationError if
+        the hold isn't active.
+        """
+        return self._finish(reservation_id, self.model.Status.RELEASED)
+
+    def _finish(self, reservation_id, status):
+        now = timezone.now()
+        confirm = status == self.model.Status.CONFIRMED
+        connection = connections[router.db_for_write(self.model)]
+
+        with transaction.atomic(using=connection.alias):
+            if connection.vendor == 'postgresql':
+                reservations, inventory, movements = self._tables(connection)
+                quantity_change = "quantity = i.quantity - r.quantity, " if confirm else ""
+                sql = (
+                    f"WITH r AS ("
+                    f"UPDATE {reservations} SET status = %s "
+                    f"WHERE id = %s AND status = %s AND expires_at > %s RETURNING product_id, location_id, quantity), "
+                    f"held AS (UPDATE {inventory} AS i SET {quantity_change}"
+                    f"reserved = i.reserved - r.quantity, version = i.version + 1 "
+                    f"FROM r WHERE i.product_id = r.product_id AND i.location_id = r.location_id RETURNING i.id), "
+                    f"{Change.objects.insert_sql(connection, 'held')} "
+                )
+                params = [
+                    status, reservation_id, self.model.Status.ACTIVE, now,
+                    *Change.objects.insert_params(Inventory, Change.Action.SAVED, now),
+                ]
+                if confirm:
+                    sql += (
+                        f"INSERT INTO {movements} (product_id, delta, reason, created_at) "
+                        f"SELECT product_id, -quantity, %s, %s FROM r RETURNING product_id"
+                    )
+                    params += [StockMovement.Reason.RESERVATION, now]
+                else:
+                    sql += "SELECT product_id FROM r"
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+                    finished = cursor.fetchone() is not None
+            else:
+                active = self.using(connection.alias).filter(
+                    pk=reservation_id, status=self.model.Status.ACTIVE, expires_at__gt=now
+                )
+                row = active.values_list('product_id', 'location_id', 'quantity').first()
+                finished = row is not None and active.update(status=status) == 1
+                if finished:
+                    product_id, location_id, quantity = row
+                    changes = {'reserved': F('reserved') - quantity, 'version': F('version') + 1}
+                    if confirm:
+                        changes['quantity'] = F('quantity') - quantity
+                        StockMovement.objects.using(connection.alias).create(
+                            product_id=product_id, delta=-quantity,
+                            reason=StockMovement.Reason.RESERVATION, created_at=now,
+                        )
+                    inventory = Inventory.objects.using(connection.alias) \
+                        .filter(product_id=product_id, location_id=location_id)
+                    inventory.update(**changes)
+                    Change.objects.record_matching(inventory, Change.Action.SAVED)
+
+        if finished:
+            return True
+        if self.using(connection.alias).filter(pk=reservation_id).exists():
+            raise ReservationError("Reservation is not active.")
+        raise self.model.DoesNotExist("Reservation not found.")
+
+    def release_expired(self, batch_size=1000):
+        """
+        Expire one batch of up to `batch_size` holds whose TTL has passed and
+        give their units back. Returns the number of holds expired.
+        """
+        now = timezone.now()
+        connection = connections[router.db_for_write(self.model)]
+        active = self.model.Status.ACTIVE
+
+        with transaction.atomic(using=connection.alias):
+            if connection.vendor == 'postgresql':
+                reservations, inventory, _ = self._tables(connection)
+                sql = (
+                    f"WITH r AS ("
+                    f"UPDATE {reservations} SET status = %s WHERE id IN ("
+                    f"SELECT id FROM {reservations} WHERE status = %s AND expires_at <= %s "
+                    f"ORDER BY expires_at LIMIT %s) AND status = %s RETURNING product_id, location_id, quantity), "
+                    f"t AS (SELECT product_id, location_id, SUM(quantity) AS quantity FROM r "
+                    f"GROUP BY product_id, location_id), "
+                    f"held AS (UPDATE {inventory} AS i SET reserved = i.reserved - t.quantity, "
+                    f"version = i.version + 1 FROM t "
+                    f"WHERE i.product_id = t.product_id AND i.location_id = t.location_id RETURNING i.id), "
+                    f"{Change.objects.insert_sql(connection, 'held')} "
+                    f"SELECT COUNT(*) FROM r"
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, [
+                        self.model.Status.EXPIRED, active, now, batch_size, active,
+                        *Change.objects.insert_params(Inventory, Change.Action.SAVED, now),
+                    ])
+                    return cursor.fetchone()[0]
+
+            expired = list(
+                self.using(connection.alias)
+                .filter(status=active, expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('id', 'product_id', 'location_id', 'quantity')[:batch_size]
+            )
+            if not expired:
+                return 0
+            # The transaction holds SQLite's write lock from the first UPDATE,
+            # and the status check skips holds finished in the meantime
+            updated = self.using(connection.alias) \
+                .filter(id__in=[row[0] for row in expired], status=active) \
+                .update(status=self.model.Status.EXPIRED)
+            if updated != len(expired):
+                transaction.set_rollback(True, using=connection.alias)
+                return 0
+
+            totals = {}
+            for _, product_id, location_id, quantity in expired:
+                totals[product_id, location_id] = totals.get((product_id, location_id), 0) + quantity
+            for (product_id, location_id), quantity in totals.items():
+                inventory = Inventory.objects.using(connection.alias) \
+                    .filter(product_id=product_id, location_id=location_id)
+                inventory.update(reserved=F('reserved') - quantity, version=F('version') + 1)
+                Change.objects.record_matching(inventory, Change.Action.SAVED)
+            return updated
+
+
+class StockReservation(models.Model):
+    """
+    A temporary hold on stock, e.g. during checkout. Active holds count
+    towards `Inventory.reserved` until they are confirmed, released or
+    expire.
+    """
+    class Status(models.IntegerChoices):
+        ACTIVE = 1, _('Active')
+        CONFIRMED = 2, _('Confirmed')
+        RELEASED = 3, _('Released')
+        EXPIRED = 4, _('Expired')
+
+    product = models.ForeignKey(
+        Product, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False
+    )
+    location = models.ForeignKey(
+        Location, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        default=default_location,
+    )
+    quantity = models.PositiveIntegerField()
+    status = models.PositiveSmallIntegerField(choices=Status.choices, default=Status.ACTIVE)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = StockReservationManager()
+
+    class Meta:
+        indexes = [
+            # Only active holds are ever swept, so only they are indexed
+            models.Index(
+                fields=['expires_at'], name='reservation_active_expiry_idx',
+                condition=models.Q(status=1),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity} ({self.get_status_display()})"
+
+
+class ChangeManager(models.Manager):
+    """
+    Write and sequence the change feed.
+
+    Writers add Change rows in the same transaction as the data they change
+    (an outbox), without a sequence number. `assign_sequence()`, run by the
+    periodic `sequence_change_feed` task, numbers the committed rows
+    afterwards, so sequence numbers follow commit order: a
+    consumer that has seen sequence N never misses a change committed later
+    with a lower id. Sequences are gapless until old rows are pruned.
+    """
+
+    def object_type(self, model):
+        return self.model.ObjectType[model._meta.model_name.upper()]
+
+    def record(self, model, ids, action, using=None):
+        """
+        Record a change of each object of `model` in `ids`.
+        """
+        now = timezone.now()
+        object_type = self.object_type(model)
+        self.using(using or router.db_for_write(self.model)).bulk_create([
+            self.model(object_type=object_type, object_id=pk, action=action, created_at=now)
+            for pk in ids if pk is not None
+        ])
+
+    def record_matching(self, queryset, action):
+        """
+        Record a change of every object matched by `queryset` with one
+        `INSERT ... SELECT`, without loading the objects.
+        """
+        connection = connections[queryset._db or router.db_for_write(queryset.model)]
+        query, params = queryset.order_by().values_list('pk').query.sql_with_params()
+        sql = self.insert_sql(connection, f"({query}) AS matched", cte=False)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*self.insert_params(queryset.model, action, timezone.now()), *params])
+
+    def record_deletion(self, queryset):
+        """
+        Record the deletion of every change-tracked object matched by
+        `queryset` or reached from it through CASCADE foreign keys, with one
+        `INSERT ... SELECT` per model. Call it in the same transaction, right
+        before the delete.
+        """
+        using = queryset._db or router.db_for_write(queryset.model)
+        for relation in queryset.model._meta.related_objects:
+            if relation.on_delete is models.CASCADE:
+                self.record_deletion(relation.related_model._base_manager.using(using).filter(
+                    **{f'{relation.field.name}__in': queryset.values('pk')}
+                ))
+        if issubclass(queryset.model, ChangeTrackedModel):
+            queryset.model.record_deletion(queryset.using(using))
+
+    def insert_sql(self, connection, source, cte=True):
+        """
+        SQL inserting a change for every `id` selected from `source`, as a
+        data-modifying CTE named `changed` by default. Takes `insert_params()`
+        before the parameters of `source`.
+        """
+        quote = connection.ops.quote_name
+        sql = (
+            f"INSERT INTO {quote(self.model._meta.db_table)} "
+            f"({quote('object_type')}, {quote('object_id')}, {quote('action')}, {quote('created_at')}) "
+            f"SELECT %s, id, %s, %s FROM {source}"
+        )
+        return f"changed AS ({sql})" if cte else sql
+
+    def insert_params(self, model, action, when):
+        return [self.object_type(model), action, when]
+
+    def assign_sequence(self, batch_size=10000):
+        """
+        Number up to `batch_size` committed changes that have no sequence
+        yet, in id order, continuing from the highest sequence. Returns the
+        number of changes sequenced.
+        """
+        connection = connections[router.db_for_write(self.model)]
+
+        with transaction.atomic(using=connection.alias):
+            if connection.vendor == 'postgresql':
+                table = connection.ops.quote_name(self.model._meta.db_table)
+                with connection.cursor() as cursor:
+                    # One sequencer at a time; writers are never blocked
+                    cursor.execute("SELECT pg_advisory_xact_lock(%s)", [self.model.SEQUENCER_LOCK_ID])
+                    cursor.execute(
+                        f"UPDATE {table} AS c SET sequence = p.sequence FROM ("
+                        f"SELECT id, (SELECT COALESCE(MAX(sequence), 0) FROM {table}) "
+                        f"+ ROW_NUMBER() OVER (ORDER BY id) AS sequence "
+                        f"FROM {table} WHERE sequence IS NULL ORDER BY id LIMIT %s) AS p "
+                        f"WHERE c.id = p.id",
+                        [batch_size],
+                    )
+                    return cursor.rowcount
+
+            pending = list(
+                self.using(connection.alias).select_for_update()
+                .filter(sequence__isnull=True).order_by('id')[:batch_size]
+            )
+            if not pending:
+                return 0
+            last = self.using(connection.alias).aggregate(Max('sequence'))['sequence__max'] or 0
+            for offset, change in enumerate(pending, start=1):
+                change.sequence = last + offset
+            try:
+                with transaction.atomic(using=connection.alias):
+                    self.using(connection.alias).bulk_update(pending, ['sequence'], batch_size=1000)
+            except IntegrityError:
+                # Another sequencer numbered them first
+                return 0
+            return len(pending)
+
+
+class Change(models.Model):
+    """
+    An entry of the change feed: a product, inventory level or supplier was
+    saved or deleted. Entries are compact; consumers fetch the current state
+    of the objects they care about.
+    """
+    class ObjectType(models.IntegerChoices):
+        PRODUCT = 1, _('Product')
+        INVENTORY = 2, _('Inventory')
+        SUPPLIER = 3, _('Supplier')
+
+    class Action(models.IntegerChoices):
+        SAVED = 1, _('Saved')
+        DELETED = 2, _('Deleted')
+
+    SEQUENCER_LOCK_ID = 4040  # PostgreSQL advisory lock held while sequencing
+
+    # Assigned after commit by ChangeManager.assign_sequence(); the feed cursor
+    sequence = models.PositiveBigIntegerField(null=True, unique=True)
+    object_type = models.PositiveSmallIntegerField(choices=ObjectType.choices)
+    object_id = models.PositiveBigIntegerField()
+    action = models.PositiveSmallIntegerField(choices=Action.choices)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = ChangeManager()
+
+    class Meta:
+        indexes = [
+            # Only the rows still waiting for a sequence number are scanned by id
+            models.Index(fields=['id'], name='change_unsequenced_idx', condition=models.Q(sequence__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.sequence}: {self.get_object_type_display()} {self.object_id} {self.get_action_display()}"
+
+
+class ReplenishmentForecast(models.Model):
+    """
+    Suggested reorder of a product, recomputed every night from its recent
+    consumption by the `forecast_replenishment` task (see
+    inventory.replenishment). The whole table is replaced at once.
+    """
+    product = models.OneToOneField(
+        Product, primary_key=True, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False
+    )
+    as_of = models.DateField()  # Day whose closing stock the forecast starts from
+    quantity = models.IntegerField()
+    consumption_rate = models.FloatField()  # Units per day
+    days_of_cover = models.FloatField(null=True)  # Null when nothing is consumed
+    reorder_point = models.IntegerField()
+    reorder_quantity = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['days_of_cover', 'product'], name='replenishment_urgency_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: reorder {self.reorder_quantity} ({self.days_of_cover} days of cover)"
@@ -0,0 +1,136 @@
+"""
+Replenishment forecast: consumption rate, days of cover and a suggested
+reorder quantity for every product, stored in ReplenishmentForecast.
+
+The daily consumption of each product is the `outflow` column of the nightly
+per-SKU analytics snapshots (see inventory.analytics): units that left stock
+that day, manual corrections and imports excluded. Over the last
+REPLENISHMENT_WINDOW_DAYS snapshots:
+
+- `consumption_rate`: mean daily outflow;
+- `reorder_point`: demand over REPLENISHMENT_LEAD_TIME_DAYS plus a safety
+  stock of REPLENISHMENT_SAFETY_FACTOR standard deviations of that demand;
+- `reorder_quantity`: once the closing stock is at or below the reorder
+  point, what brings it back up to the demand over the lead time and
+  REPLENISHMENT_REVIEW_DAYS, plus the safety stock; 0 otherwise.
+
+All products are computed together with NumPy, one day of columns at a time.
+NumPy is imported by this module, which is only imported where it is used.
+"""
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import analytics
+from .models import ReplenishmentForecast
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+
+
+def daily_outflow(end):
+    """
+    Sum and sum of squares of the daily outflow of every product over the
+    REPLENISHMENT_WINDOW_DAYS snapshots up to `end`, aligned with the products
+    of the latest snapshot. Returns (latest day, latest snapshot columns,
+    number of days, sums, sums of squares), or None without snapshots.
+    """
+    start = end - timedelta(days=settings.REPLENISHMENT_WINDOW_DAYS - 1)
+    snapshots = [(day, analytics.read_snapshot(day)) for day in analytics.snapshot_days(start, end)]
+    snapshots = [(day, columns) for day, columns in snapshots if columns is not None]
+    if not snapshots:
+        return None
+
+    latest_day, latest = snapshots[-1]
+    product_ids = np.asarray(latest['product_id'])
+    total = np.zeros(len(product_ids), dtype=np.float64)
+    squares = np.zeros(len(product_ids), dtype=np.float64)
+    for day, columns in snapshots:
+        # Products missing from a day (created since, or gone) consumed nothing that day
+        outflow = np.zeros(len(product_ids), dtype=np.float64)
+        positions = np.searchsorted(product_ids, columns['product_id'])
+        found = positions < len(product_ids)
+        found[found] = product_ids[positions[found]] == columns['product_id'][found]
+        outflow[positions[found]] = columns['outflow'][found]
+        total += outflow
+        squares += outflow ** 2
+    return latest_day, latest, len(snapshots), total, squares
+
+
+def forecast(end=None):
+    """
+    Compute the forecast of every product from the snapshots up to `end`
+    (yesterday by default). Returns a dict of NumPy columns named after the
+    ReplenishmentForecast fields, or None without snapshots.
+    """
+    end = end or timezone.localdate() - timedelta(days=1)
+    outflow = daily_outflow(end)
+    if outflow is None:
+        return None
+    as_of, latest, days, total, squares = outflow
+
+    lead_time = settings.REPLENISHMENT_LEAD_TIME_DAYS
+    quantity = np.maximum(np.asarray(latest['quantity'], dtype=np.int64), 0)
+    rate = total / days
+    deviation = np.sqrt(np.maximum(squares / days - rate ** 2, 0))
+    safety_stock = settings.REPLENISHMENT_SAFETY_FACTOR * deviation * np.sqrt(lead_time)
+    reorder_point = np.ceil(rate * lead_time + safety_stock)
+    order_up_to = np.ceil(rate * (lead_time + settings.REPLENISHMENT_REVIEW_DAYS) + safety_stock)
+    reorder_quantity = np.where(
+        (rate > 0) & (quantity <= reorder_point), np.maximum(order_up_to - quantity, 0), 0
+    )
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(rate > 0, quantity / rate, np.nan)
+
+    return {
+        'as_of': as_of,
+        'product_id': np.asarray(latest['product_id']),
+        'quantity': quantity,
+        'consumption_rate': np.round(rate, 4),
+        'days_of_cover': np.round(days_of_cover, 1),
+        'reorder_point': reorder_point.astype(np.int64),
+        'reorder_quantity': reorder_quantity.astype(np.int64),
+    }
+
+
+def store(result):
+    """
+    Replace the stored forecast with `result`, in one transaction so readers
+    see either the previous night's forecast or this one.
+    """
+    rows = zip(
+        result['product_id'].tolist(), result['quantity'].tolist(), result['consumption_rate'].tolist(),
+        result['days_of_cover'].tolist(), result['reorder_point'].tolist(), result['reorder_quantity'].tolist(),
+    )
+    with transaction.atomic():
+        ReplenishmentForecast.objects.all().delete()
+        batch = []
+        for product_id, quantity, rate, cover, reorder_point, reorder_quantity in rows:
+            batch.append(ReplenishmentForecast(
+                product_id=product_id, as_of=result['as_of'], quantity=quantity, consumption_rate=rate,
+                days_of_cover=None if cover != cover else cover,  # NaN: nothing consumed
+                reorder_point=reorder_point, reorder_quantity=reorder_quantity,
+            ))
+            if len(batch) == BATCH_SIZE:
+                ReplenishmentForecast.objects.bulk_create(batch)
+                batch = []
+        ReplenishmentForecast.objects.bulk_create(batch)
+    return len(result['product_id'])
+
+
+def update(end=None):
+    """
+    Recompute and store the forecast. Returns the number of products, or 0
+    when there are no snapshots to forecast from (the stored one is kept).
+    """
+    result = forecast(end)
+    if result is None:
+        logger.warning("No analytics snapshots to forecast replenishment from.")
+        return 0
+    return store(result)
@@ -0,0 +1,109 @@
+"""
+Ranked full-text search over product names and descriptions.
+
+- PostgreSQL: the generated `search_vector` tsvector column and its GIN
+  index (migration 0008), ranked by `ts_rank_cd` with names weighted above
+  descriptions.
+- SQLite: the `inventory_product_fts` FTS5 table kept in sync by triggers,
+  ranked by `bm25`.
+- Other databases: `icontains` filters, ordered by name.
+
+Every term of the query must match, on its stem; the last term also matches
+as a prefix, so results follow what someone is typing.
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import Q
+
+from .models import Product, Supplier
+
+
+TERM = re.compile(r'\w+')
+MAX_TERMS = 10
+NAME_WEIGHT = 10.0  # bm25 weight of a name match against a description match
+
+
+def search_terms(query):
+    return TERM.findall(query.lower())[:MAX_TERMS]
+
+
+class ProductSearch:
+    """
+    The products matching a query, best match first. Evaluated lazily like a
+    queryset: `count()` and each slice run one query, so it can be handed to
+    a paginator.
+    """
+    def __init__(self, query, using=None):
+        self.terms = search_terms(query)
+        self.connection = connections[using or router.db_for_read(Product)]
+
+    def _from_where(self):
+        """
+        FROM/WHERE clause, its parameters and the ORDER BY clause, for this
+        database.
+        """
+        quote = self.connection.ops.quote_name
+        product_table = quote(Product._meta.db_table)
+        supplier_table = quote(Supplier._meta.db_table)
+        vendor = self.connection.vendor
+
+        if vendor == 'postgresql':
+            tsquery = ' & '.join(self.terms[:-1] + [f'{self.terms[-1]}:*'])
+            return (
+                f"FROM {product_table} p JOIN {supplier_table} s ON s.id = p.supplier_id, "
+                f"to_tsquery('english', %s) query "
+                f"WHERE p.search_vector @@ query AND NOT s.deleting",
+                [tsquery],
+                "ts_rank_cd(p.search_vector, query) DESC, p.id",
+            )
+
+        fts_table = quote(f'{Product._meta.db_table}_fts')
+        match = ' '.join([f'"{term}"' for term in self.terms[:-1]] + [f'"{self.terms[-1]}"*'])
+        return (
+            f"FROM {fts_table} JOIN {product_table} p ON p.id = {fts_table}.rowid "
+            f"JOIN {supplier_table} s ON s.id = p.supplier_id "
+            f"WHERE {fts_table} MATCH %s AND NOT s.deleting",
+            [match],
+            f"bm25({fts_table}, {NAME_WEIGHT}, 1.0), p.id",
+        )
+
+    def _fallback(self):
+        condition = Q()
+        for term in self.terms:
+            condition &= Q(name__icontains=term) | Q(description__icontains=term)
+        return Product.objects.using(self.connection.alias) \
+            .filter(condition, supplier__deleting=False).order_by('name', 'id')
+
+    def count(self):
+        if not self.terms:
+            return 0
+        if self.connection.vendor not in ('postgresql', 'sqlite'):
+            return self._fallback().count()
+        from_where, params, _ = self._from_where()
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) {from_where}", params)
+            return cursor.fetchone()[0]
+
+    def ids(self, offset, limit):
+        """
+        Ids of the matches `offset` to `offset + limit`, best first.
+        """
+        if not self.terms:
+            return []
+        if self.connection.vendor not in ('postgresql', 'sqlite'):
+            return list(self._fallback().values_list('id', flat=True)[offset:offset + limit])
+        from_where, params, order_by = self._from_where()
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT p.id {from_where} ORDER BY {order_by} LIMIT %s OFFSET %s", params + [limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError("ProductSearch only supports slicing without a step.")
+        start = key.start or 0
+        ids = self.ids(start, key.stop - start)
+        products = Product.objects.using(self.connection.alias).select_related('supplier').in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
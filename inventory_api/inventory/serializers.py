@@ -1,15 +1,291 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.db.utils import IntegrityError
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Product, Inventory, Supplier
+from .models import (
+    Product, Inventory, Supplier, StockMovement, StockReservation, VersionedModel, VersionConflictError, Change,
+    ChangeTrackedModel, ReplenishmentForecast, Location, default_location,
+)
+from .search import search_terms
+
+
+class DynamicFieldsMixin:
+    """
+    Serializer mixin that takes optional `fields` and `exclude` keyword
+    arguments and drops the matching fields from the representation.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        exclude = kwargs.pop('exclude', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is None and exclude is None:
+            return
+
+        readable = [name for name, field in self.fields.items() if not field.write_only]
+        requested = set(fields or []) | set(exclude or [])
+        unknown = requested - set(readable)
+        if unknown:
+            raise serializers.ValidationError(
+                {"fields": f"Unknown field(s): {', '.join(sorted(unknown))}"}
+            )
+
+        for name in readable:
+            if (fields is not None and name not in fields) or (exclude and name in exclude):
+                self.fields.pop(name)
+
+
+def serializer_field_paths(serializer, prefix=''):
+    """
+    Map the readable fields of a serializer onto ORM lookups.
+
+    Returns a tuple of (relations, columns) suitable for `select_related()`
+    and `only()`, recursing into nested serializers.
+    """
+    relations, columns = [], []
+    # Computed fields can name the columns they are computed from
+    computed = getattr(getattr(serializer, 'Meta', None), 'computed_field_columns', {})
+    for name, field in serializer.fields.items():
+        if name in computed:
+            columns.extend(prefix + column for column in computed[name])
+            continue
+        if field.write_only or field.source == '*':
+            continue
+        path = prefix + '__'.join(field.source_attrs)
+        if isinstance(field, serializers.BaseSerializer):
+            relations.append(path)
+            nested_relations, nested_columns = serializer_field_paths(field, prefix=f"{path}__")
+            relations.extend(nested_relations)
+            columns.extend(nested_columns)
+        else:
+            columns.append(path)
+    return relations, columns
+
+
+class _DeferredPK:
+    """
+    Placeholder for a primary key that a BulkListSerializer resolves later.
+    """
+    def __init__(self, pk):
+        self.pk = pk
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that, inside a BulkListSerializer, defers the
+    lookup so all items are resolved with one query instead of one each.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(self.root, BulkListSerializer):
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return _DeferredPK(self.get_queryset().model._meta.pk.to_python(data))
+        except Exception:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class BulkVersionConflictError(VersionConflictError):
+    """
+    Raised by a bulk update when items changed since the version they were
+    sent with. `errors` has one error dict per item, in request order.
+    """
+
+    def __init__(self, errors):
+        super().__init__("Some objects have changed since the versions sent.")
+        self.errors = errors
 
 
-class SupplierSerializer(serializers.ModelSerializer):
+class BulkListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer for bulk writes.
+
+    - Creates with a single `bulk_create()` and updates with `bulk_update()`.
+    - Resolves BulkPrimaryKeyRelatedFields with one query per field.
+    - Reports errors per item, in the order the items were sent.
+
+    For updates, pass the existing objects as `instance`; each item is
+    matched to its object by `id`. Items of versioned models may send the
+    `version` they were read at: those are saved one by one through
+    VersionedModel's conditional UPDATE, and if any of them changed since,
+    BulkVersionConflictError is raised.
+    """
+    batch_size = 500
+
+    @property
+    def instance_map(self):
+        if not hasattr(self, '_instance_map'):
+            self._instance_map = {obj.pk: obj for obj in self.instance or []}
+        return self._instance_map
+
+    def item_instances(self):
+        """
+        The existing object for each submitted item, or None when creating.
+        """
+        if self.instance is None:
+            return [None] * len(self.initial_data)
+        return [self.instance_map[int(item['id'])] for item in self.initial_data]
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            try:
+                instance = self.instance_map.get(int(data.get('id')))
+            except (AttributeError, TypeError, ValueError):
+                instance = None
+            if instance is None:
+                raise serializers.ValidationError({'id': ["Not found."]})
+            self.child.instance = instance
+        return super().run_child_validation(data)
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        errors = self.validate_items(items)
+        self.expected_versions = [None] * len(items)
+        if self.instance is not None and issubclass(self.child.Meta.model, VersionedModel):
+            version_field = serializers.IntegerField(min_value=1)
+            for index, (item, item_errors) in enumerate(zip(data, errors)):
+                if item.get('version') is None:
+                    continue
+                try:
+                    self.expected_versions[index] = version_field.run_validation(item['version'])
+                except serializers.ValidationError as error:
+                    item_errors['version'] = error.detail
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def validate_items(self, items):
+        """
+        Batched validation across all items. Returns one error dict per item.
+        """
+        errors = [{} for _ in items]
+        for name, field in self.child.fields.items():
+            if not isinstance(field, BulkPrimaryKeyRelatedField):
+                continue
+            source = field.source
+            pks = {item[source].pk for item in items if isinstance(item.get(source), _DeferredPK)}
+            found = field.get_queryset().in_bulk(pks)
+            for item, item_errors in zip(items, errors):
+                if not isinstance(item.get(source), _DeferredPK):
+                    continue
+                pk = item[source].pk
+                if pk in found:
+                    item[source] = found[pk]
+                else:
+                    item_errors[name] = [field.error_messages['does_not_exist'].format(pk_value=pk)]
+        return errors
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        instances = model.objects.bulk_create(
+            [model(**attrs) for attrs in validated_data], batch_size=self.batch_size
+        )
+        self.record_changes(instances)
+        return instances
+
+    def record_changes(self, instances):
+        """
+        Add the written objects to the change feed, in the caller's transaction.
+        """
+        model = self.child.Meta.model
+        if issubclass(model, ChangeTrackedModel):
+            Change.objects.record(model, [obj.pk for obj in instances], Change.Action.SAVED)
+
+    def update(self, instance, validated_data):
+        model = self.child.Meta.model
+        instances = self.item_instances()
+        self.update_versioned(instances, validated_data)
+
+        unchecked = [
+            (obj, attrs) for obj, attrs, version in zip(instances, validated_data, self.expected_versions)
+            if version is None
+        ]
+        instances = [obj for obj, _ in unchecked]
+        fields = set()
+        for obj, attrs in unchecked:
+            for attr, value in attrs.items():
+                setattr(obj, attr, value)
+                fields.add(attr)
+        if fields:
+            fields = sorted(fields)
+            if issubclass(model, VersionedModel):
+                # Bump versions in the same UPDATE so outstanding ETags go stale
+                for obj in instances:
+                    obj.version = F('version') + 1
+                fields.append('version')
+            model.objects.bulk_update(instances, fields, batch_size=self.batch_size)
+            if issubclass(model, VersionedModel):
+                # Drop the expressions; the new versions are loaded on access
+                for obj in instances:
+                    del obj.version
+            self.record_changes(instances)
+        return self.item_instances()
+
+    def update_versioned(self, instances, validated_data):
+        """
+        Save the items sent with a version, each with an UPDATE conditional
+        on that version (which also records the change). Runs before the
+        bulk UPDATE, so a conflict aborts the request before it writes.
+        """
+        errors = [{} for _ in instances]
+        for obj, attrs, version, item_errors in zip(instances, validated_data, self.expected_versions, errors):
+            if version is None:
+                continue
+            for attr, value in attrs.items():
+                setattr(obj, attr, value)
+            obj.version = version
+            try:
+                with transaction.atomic():
+                    obj.save(update_fields=list(attrs) or ['version'])
+            except VersionConflictError:
+                item_errors['version'] = [f"Has changed since version {version}."]
+        if any(errors):
+            raise BulkVersionConflictError(errors)
+
+
+class SupplierBulkListSerializer(BulkListSerializer):
+    """
+    Checks supplier names for case-insensitive duplicates with one query.
+    """
+
+    def validate_items(self, items):
+        errors = super().validate_items(items)
+
+        names = [item['name'].lower() for item in items if 'name' in item]
+        taken = dict(
+            Supplier.objects.annotate(lower_name=Lower('name'))
+            .filter(lower_name__in=names)
+            .values_list('lower_name', 'pk')
+        )
+
+        seen = set()
+        for item, obj, item_errors in zip(items, self.item_instances(), errors):
+            if 'name' not in item:
+                continue
+            name = item['name'].lower()
+            owner = taken.get(name)
+            if name in seen or (owner is not None and (obj is None or owner != obj.pk)):
+                item_errors['name'] = ["A supplier with this name already exists (case-insensitive)."]
+            seen.add(name)
+        return errors
+
+
+class SupplierSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     DocString
     """
     class Meta:
         model = Supplier
         fields = '__all__'
+        # Only set by schedule_supplier_deletion(), which also starts the deletion
+        read_only_fields = ['deleting']
+        list_serializer_class = SupplierBulkListSerializer
 
     def create(self, validated_data):
         """
@@ -23,12 +299,12 @@ class SupplierSerializer(serializers.ModelSerializer):
             )
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     DocString
     """
     supplier = SupplierSerializer(read_only=True)
-    supplier_id = serializers.PrimaryKeyRelatedField(
+    supplier_id = BulkPrimaryKeyRelatedField(
         queryset=Supplier.objects.all(),
         source='supplier',
         write_only=True
@@ -37,6 +313,35 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'description', 'price', 'supplier', 'supplier_id']
+        list_serializer_class = BulkListSerializer
+
+
+class LocationSerializer(serializers.ModelSerializer):
+    """
+    A warehouse or store holding stock, identified by its code.
+    """
+    class Meta:
+        model = Location
+        fields = ['code', 'name']
+
+
+class LocationStockSerializer(serializers.Serializer):
+    """
+    The stock of a product at one location.
+    """
+    location = serializers.CharField()
+    quantity = serializers.IntegerField()
+    reserved = serializers.IntegerField()
+    available = serializers.IntegerField()
+
+
+class ProductStockSerializer(LocationStockSerializer):
+    """
+    The stock of a product summed over every location, with the breakdown.
+    """
+    location = None
+    product_id = serializers.IntegerField()
+    locations = LocationStockSerializer(many=True)
 
 
 # class SupplierProductInventoryResponseSerializer(serializers.Serializer):
@@ -49,7 +354,11 @@ class ProductSerializer(serializers.ModelSerializer):
 #     products = ProductInventorySerializer(many=True)
 
 
-class InventorySerializer(serializers.ModelSerializer):
+def _default_location_instance():
+    return Location(code=default_location())
+
+
+class InventorySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """
     DocString
     """
@@ -59,10 +368,181 @@ class InventorySerializer(serializers.ModelSerializer):
         source='product',
         write_only=True
     )
+    location = serializers.PrimaryKeyRelatedField(queryset=Location.objects.all(), default=_default_location_instance)
+
+    available = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Inventory
-        fields = ['id', 'product', 'product_id', 'quantity']
+        fields = ['id', 'product', 'product_id', 'location', 'quantity', 'reserved', 'available', 'is_hot']
+        read_only_fields = ['reserved']
+        computed_field_columns = {'available': ['quantity', 'reserved']}
+
+    def to_internal_value(self, data):
+        attrs = super().to_internal_value(data)
+        # An inventory level is stock of one product at one location: moving
+        # it is an adjustment at both ends, not an edit of the row. Checked
+        # before the unique (product, location) validator runs.
+        if self.instance is not None:
+            if 'location' not in data:
+                attrs.pop('location', None)  # PUT fills in the default location
+            for source, field in (('location', 'location'), ('product', 'product_id')):
+                if source in attrs and attrs[source].pk != getattr(self.instance, f'{source}_id'):
+                    raise serializers.ValidationError({field: ["Can't be changed."]})
+        return attrs
+
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    """
+    A single entry of the stock movement ledger.
+    """
+    class Meta:
+        model = StockMovement
+        fields = ['id', 'product_id', 'delta', 'reason', 'created_at']
+
+
+class StockReservationSerializer(serializers.ModelSerializer):
+    """
+    A stock hold. Create it with a `product_id`, a `quantity` and optionally
+    a `ttl` in seconds (RESERVATION_TTL_SECONDS by default) and the
+    `location` to hold it at (INVENTORY_LOCATION by default).
+    """
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    ttl = serializers.IntegerField(min_value=1, max_value=86400, required=False, write_only=True)
+
+    class Meta:
+        model = StockReservation
+        fields = ['id', 'product_id', 'location', 'quantity', 'ttl', 'status', 'expires_at', 'created_at']
+        read_only_fields = ['status', 'expires_at', 'created_at']
+
+
+class InventoryAdjustSerializer(serializers.Serializer):
+    """
+    A signed change to apply to an inventory quantity.
+    """
+    delta = serializers.IntegerField()
+
+    def validate_delta(self, value):
+        if value == 0:
+            raise serializers.ValidationError("Delta must not be zero.")
+        return value
+
+
+class InventoryBatchAdjustItemSerializer(serializers.Serializer):
+    """
+    A single stock movement within a batch adjustment.
+    """
+    product_id = serializers.IntegerField(min_value=1)
+    delta = serializers.IntegerField()
+
+
+class InventoryBatchAdjustSerializer(serializers.Serializer):
+    """
+    Validates a batch of stock movements.
+
+    - `atomic`: apply every movement or none of them.
+    - `partial`: apply the movements that can be applied and report the rest.
+
+    Every movement applies to `location` (INVENTORY_LOCATION by default).
+    """
+    MODE_ATOMIC = 'atomic'
+    MODE_PARTIAL = 'partial'
+
+    mode = serializers.ChoiceField(choices=[MODE_ATOMIC, MODE_PARTIAL], default=MODE_ATOMIC)
+    location = serializers.PrimaryKeyRelatedField(queryset=Location.objects.all(), required=False)
+    adjustments = InventoryBatchAdjustItemSerializer(many=True, allow_empty=False)
+
+    def validate_adjustments(self, value):
+        max_batch_size = self.context.get('max_batch_size')
+        if max_batch_size and len(value) > max_batch_size:
+            raise serializers.ValidationError(
+                f"A maximum of {max_batch_size} adjustments can be sent at once."
+            )
+        return value
+
+
+class BatchRetrieveSerializer(serializers.Serializer):
+    """
+    Validates the list of ids requested from a batch retrieve endpoint.
+    """
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_ids(self, value):
+        max_batch_size = self.context.get('max_batch_size')
+        if max_batch_size and len(value) > max_batch_size:
+            raise serializers.ValidationError(
+                f"A maximum of {max_batch_size} ids can be requested at once."
+            )
+        return value
+
+
+class ChangeFeedQuerySerializer(serializers.Serializer):
+    """
+    Validates the cursor and page size of a change feed request.
+    """
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    """
+    Validates the date range and supplier filter of an analytics request.
+    The range defaults to the year up to today.
+    """
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    supplier = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault('end', timezone.localdate())
+        attrs.setdefault('start', attrs['end'] - timedelta(days=365))
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("start must not be after end.")
+        return attrs
+
+
+class ReplenishmentForecastSerializer(serializers.ModelSerializer):
+    """
+    The suggested reorder of a product, with its name and supplier.
+    """
+    product_id = serializers.IntegerField()
+    product_name = serializers.CharField(source='product.name')
+    supplier_id = serializers.IntegerField(source='product.supplier_id')
+
+    class Meta:
+        model = ReplenishmentForecast
+        fields = [
+            'product_id', 'product_name', 'supplier_id', 'as_of', 'quantity', 'consumption_rate',
+            'days_of_cover', 'reorder_point', 'reorder_quantity',
+        ]
+
+
+class ReplenishmentQuerySerializer(serializers.Serializer):
+    """
+    Validates the filters and ordering of a replenishment request.
+    """
+    ORDERINGS = {
+        'urgency': [F('days_of_cover').asc(nulls_last=True), 'product_id'],
+        'reorder_quantity': ['-reorder_quantity', 'product_id'],
+        'consumption_rate': ['-consumption_rate', 'product_id'],
+    }
+
+    ordering = serializers.ChoiceField(choices=list(ORDERINGS), default='urgency')
+    supplier = serializers.IntegerField(min_value=1, required=False)
+    reorder = serializers.BooleanField(required=False, help_text="Only products to reorder now.")
+
+
+class ProductSearchQuerySerializer(serializers.Serializer):
+    """
+    Validates the query of a product search, which must contain a word.
+    """
+    q = serializers.CharField(max_length=200)
+
+    def validate_q(self, value):
+        if not search_terms(value):
+            raise serializers.ValidationError("Enter at least one word to search for.")
+        return value
 
 
 class ProductCSVUploadSerializer(serializers.Serializer):
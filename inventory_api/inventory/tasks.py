@@ -1,76 +1,145 @@
+import json
+import tempfile
+from decimal import Decimal
+
 from celery import shared_task
-from django.db.models import Sum, F
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import (
-    SimpleDocTemplate, Table,
-    TableStyle, Paragraph, Spacer
-)
-from reportlab.lib.styles import getSampleStyleSheet
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+from django.db.models import Sum, F, Max, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
 from django.conf import settings
-from datetime import datetime
+from datetime import date, datetime, timedelta
 import os
 
-from .models import Product, Supplier, Inventory
+from inventory_api.db_router import use_replica
+from .models import Product, Supplier, Inventory, StockMovement, StockSnapshot, StockReservation, Change
+from . import hot_stock
 
 
-@shared_task
-def generate_inventory_report():
+REPORT_ARTIFACTS_DIR = 'report_artifacts'
+
+
+def report_artifact_name(task_id):
+    """
+    Storage name of the report data written by the report task `task_id`.
+    """
+    return f'{REPORT_ARTIFACTS_DIR}/{task_id}.json'
+
+
+def write_inventory_report(name):
     """
-    Generate a report on inventory levels, including:
+    Write the inventory report as JSON to the default storage under `name`,
+    one inventory row at a time. Returns the totals.
+
+    The report contains:
     - Low stock alerts (based on inventory threshold).
-    - Supplier performance metrics.
-    - Stock value for each product and overall inventory.
-    """
-
-    report = {}
-
-    # Inventory levels and stock value
-    inventories = Inventory.objects.select_related('product')  # Optimize queries
-    total_stock_value = 0
-    report['inventory_levels'] = []
-
-    for inventory in inventories:
-        product = inventory.product
-        stock_value = product.price * inventory.quantity
-        total_stock_value += stock_value
-
-        report['inventory_levels'].append({
-            "product_name": product.name,
-            "inventory": inventory.quantity,
-            "price": product.price,
-            "stock_value": stock_value,
-            "low_stock_alert": inventory.quantity < 10,  # Threshold for low stock
-        })
-
-    # Overall stock value
-    report['total_stock_value'] = total_stock_value
-
-    # Supplier performance
-    suppliers = Supplier.objects.all()
-    report['supplier_performance'] = [
-        {
-            "supplier_name": supplier.name,
-            "total_products_supplied": Product.objects.filter(supplier=supplier).count(),
-            "total_inventory": Inventory.objects.filter(product__supplier=supplier).aggregate(
-                total_inventory=Sum('quantity')
-            )['total_inventory'] or 0,
-            "total_stock_value": supplier.total_inventory_value(),
-        }
-        for supplier in suppliers
-    ]
+    - Supplier performance metrics, across every location.
+    - Stock value for each product and location and overall inventory.
+    """
+    total_stock_value = Decimal(0)
+    products = 0
+
+    with tempfile.TemporaryFile(mode='w+') as file:
+        # Inventory levels and stock value
+        file.write('{"inventory_levels": [')
+        inventories = Inventory.objects.select_related('product').order_by('product_id', 'location_id')
+        for inventory in inventories.iterator(chunk_size=2000):
+            product = inventory.product
+            stock_value = product.price * inventory.quantity
+            total_stock_value += stock_value
+
+            if products:
+                file.write(', ')
+            json.dump({
+                "product_name": product.name,
+                "location": inventory.location_id,
+                "inventory": inventory.quantity,
+                "price": product.price,
+                "stock_value": stock_value,
+                "low_stock_alert": inventory.quantity < 10,  # Threshold for low stock
+            }, file, cls=DjangoJSONEncoder)
+            products += 1
 
+        # Overall stock value
+        file.write(f'], "total_stock_value": {json.dumps(total_stock_value, cls=DjangoJSONEncoder)}, ')
+
+        # Supplier performance, for every supplier in one grouped query over
+        # their products' inventory rows at all locations
+        suppliers = Supplier.objects.annotate(
+            products_supplied=Count('products', distinct=True),
+            total_inventory=Sum('products__inventories__quantity'),
+            total_stock_value=Sum(F('products__inventories__quantity') * F('products__price')),
+        ).order_by('pk')
+        file.write('"supplier_performance": ')
+        json.dump([
+            {
+                "supplier_name": supplier.name,
+                "total_products_supplied": supplier.products_supplied,
+                "total_inventory": supplier.total_inventory or 0,
+                "total_stock_value": supplier.total_stock_value or 0,
+            }
+            for supplier in suppliers
+        ], file, cls=DjangoJSONEncoder)
+        file.write('}')
+
+        file.seek(0)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, File(file))
+
+    return {"products": products, "total_stock_value": str(total_stock_value)}
+
+
+def read_inventory_report(name):
+    """
+    Load a report written by `write_inventory_report`, with its amounts as Decimals.
+    """
+    with default_storage.open(name) as file:
+        report = json.load(file)
+    report['total_stock_value'] = Decimal(report['total_stock_value'])
+    for item in report['inventory_levels']:
+        item['price'] = Decimal(item['price'])
+        item['stock_value'] = Decimal(item['stock_value'])
+    for supplier in report['supplier_performance']:
+        supplier['total_stock_value'] = Decimal(supplier['total_stock_value'])
     return report
 
 
+@shared_task(bind=True)
+@use_replica()
+def generate_inventory_report(self):
+    """
+    Generate a report on inventory levels into a JSON artifact in the default
+    storage. The task result only references the artifact, so the report data
+    never passes through the result backend.
+    """
+    name = report_artifact_name(self.request.id)
+    return {"artifact": name, **write_inventory_report(name)}
+
+
 @shared_task
+@use_replica()
 def generate_inventory_report_pdf(task_id):
     """
-    Generate a PDF version of the inventory report.
+    Generate a PDF version of the inventory report written by the report
+    task `task_id`, or of a fresh report if its artifact is gone.
     """
+    # Imported here so only the processes that build PDFs load reportlab
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+    from reportlab.platypus import (
+        SimpleDocTemplate, Table,
+        TableStyle, Paragraph, Spacer
+    )
+    from reportlab.lib.styles import getSampleStyleSheet
 
-    # Call the `generate_inventory_report` task to fetch the report data
-    report = generate_inventory_report()
+    name = report_artifact_name(task_id)
+    if not default_storage.exists(name):
+        write_inventory_report(name)
+    report = read_inventory_report(name)
 
     # Use the MEDIA_ROOT directory for storing generated reports
     reports_dir = os.path.join(settings.MEDIA_ROOT, "generated_reports")
@@ -99,17 +168,18 @@ def generate_inventory_report_pdf(task_id):
     elements.append(Spacer(1, 20))
 
     # Inventory Levels Table
-    inventory_data = [["Product Name", "Inventory", "Price", "Stock Value", "Low Stock Alert"]]
+    inventory_data = [["Product Name", "Location", "Inventory", "Price", "Stock Value", "Low Stock Alert"]]
     for item in report["inventory_levels"]:
         inventory_data.append([
             item["product_name"],
+            item["location"],
             f"{item['inventory']:,}",
             f"${item['price']:,.2f}",
             f"${item['stock_value']:,.2f}",
             "Yes" if item["low_stock_alert"] else "No"
         ])
 
-    inventory_table = Table(inventory_data, colWidths=[150, 80, 80, 100, 100])
+    inventory_table = Table(inventory_data, colWidths=[130, 70, 70, 70, 90, 80])
     inventory_table.setStyle(TableStyle([
         ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
         ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
@@ -151,3 +221,255 @@ def generate_inventory_report_pdf(task_id):
 
     # Return the file path relative to MEDIA_URL for download purposes
     return os.path.join("generated_reports", file_name)
+
+
+@shared_task
+def snapshot_stock_levels():
+    """
+    Write a StockSnapshot for every product whose stock moved since the last
+    snapshot run (and for products that have never been snapshotted), so the
+    quantity at any point in time only needs a short ledger scan.
+
+    The run marks the ledger rows it includes with its `taken_at`, reading
+    them together with the quantities, so a movement committed after an
+    earlier run is picked up by the next one whatever its `created_at`.
+    """
+    connection = connections[router.db_for_write(StockSnapshot)]
+    # Stored as the ORM stores it, so it compares equal to the values it reads back
+    taken_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    quote = connection.ops.quote_name
+    snapshot_table = quote(StockSnapshot._meta.db_table)
+    inventory_table = quote(Inventory._meta.db_table)
+    movement_table = quote(StockMovement._meta.db_table)
+
+    mark_sql = f"UPDATE {movement_table} SET snapshot_at = %s WHERE snapshot_at IS NULL"
+    # One set-based INSERT ... SELECT instead of loading every row into Python;
+    # snapshots hold a product's quantity summed over its locations
+    snapshot_sql = (
+        f"INSERT INTO {snapshot_table} (product_id, quantity, taken_at) "
+        f"SELECT i.product_id, SUM(i.quantity), %s FROM {inventory_table} i "
+        f"WHERE {{moved}} "
+        f"OR NOT EXISTS (SELECT 1 FROM {snapshot_table} s WHERE s.product_id = i.product_id) "
+        f"GROUP BY i.product_id"
+    )
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # One statement, so the marked movements and the summed quantities
+            # come from the same MVCC snapshot
+            cursor.execute(
+                f"WITH marked AS ({mark_sql} RETURNING product_id) "
+                + snapshot_sql.format(moved="i.product_id IN (SELECT product_id FROM marked)"),
+                [taken_at, taken_at],
+            )
+        else:
+            # SQLite has one writer at a time: once the UPDATE holds the write
+            # lock, no movement or quantity can change until the INSERT is done
+            cursor.execute(mark_sql, [taken_at])
+            cursor.execute(
+                snapshot_sql.format(moved=(
+                    f"EXISTS (SELECT 1 FROM {movement_table} m "
+                    f"WHERE m.product_id = i.product_id AND m.snapshot_at = %s)"
+                )),
+                [taken_at, taken_at],
+            )
+        return cursor.rowcount
+
+
+@shared_task
+def compact_stock_movements(older_than_days=None):
+    """
+    Collapse ledger rows older than `older_than_days` (STOCK_LEDGER_RETENTION_DAYS
+    by default) into one row per product, reason and day. Net quantities are
+    preserved; only intra-day detail is dropped.
+
+    Only rows a snapshot run has already included are compacted, and never
+    across runs: the compacted row carries the `snapshot_at` of the rows it
+    replaces, so `quantity_at()` counts it in exactly the same snapshots.
+    """
+    if older_than_days is None:
+        older_than_days = settings.STOCK_LEDGER_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+
+    with transaction.atomic(using=router.db_for_write(StockMovement)):
+        old_rows = StockMovement.objects.filter(created_at__lt=cutoff, snapshot_at__isnull=False)
+        last_id = old_rows.aggregate(Max('id'))['id__max']
+        if last_id is None:
+            return 0
+        old_rows = old_rows.filter(id__lte=last_id)
+
+        summaries = (
+            old_rows.annotate(day=TruncDate('created_at'))
+            .values('product_id', 'reason', 'day', 'snapshot_at')
+            .annotate(total=Sum('delta'), last_at=Max('created_at'))
+            .order_by()
+        )
+        compacted = StockMovement.objects.bulk_create([
+            StockMovement(
+                product_id=row['product_id'],
+                delta=row['total'],
+                reason=row['reason'],
+                created_at=row['last_at'],
+                snapshot_at=row['snapshot_at'],
+            )
+            for row in summaries.iterator() if row['total']
+        ], batch_size=1000)
+
+        deleted, _ = old_rows.delete()
+
+    return deleted - len(compacted)
+
+
+@shared_task
+def flush_hot_sku_deltas():
+    """
+    Write the stock deltas accumulated in Redis for hot SKUs to the database.
+    """
+    return hot_stock.flush_pending_deltas()
+
+
+@shared_task(bind=True)
+def delete_supplier(self, supplier_id, batch_size=None):
+    """
+    Delete a supplier marked as `deleting`, together with its products and
+    their inventory, without loading any of them into memory.
+
+    Dependents are removed `batch_size` products at a time with
+    `ProductQuerySet.bulk_delete()`, one short transaction per batch, and
+    progress is reported as the task's PROGRESS state. The stock ledger is
+    kept, as it is for any deleted product, and closed with a movement
+    taking the deleted stock to zero.
+    """
+    batch_size = batch_size or settings.SUPPLIER_DELETE_BATCH_SIZE
+    connection = connections[router.db_for_write(Supplier)]
+    supplier_table = connection.ops.quote_name(Supplier._meta.db_table)
+
+    # The next batch of the supplier's products, lowest ids first
+    products = Product.objects.filter(supplier_id=supplier_id)
+    batch = Product.objects.filter(pk__in=products.order_by('pk').values('pk')[:batch_size])
+
+    total = products.count()
+    deleted = 0
+    while True:
+        count = batch.bulk_delete()
+        if not count:
+            break
+        deleted += count
+        self.update_state(state='PROGRESS', meta={'deleted_products': deleted, 'total_products': total})
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {supplier_table} WHERE id = %s AND deleting", [supplier_id])
+
+    return {'deleted_products': deleted, 'total_products': total}
+
+
+@shared_task
+def release_expired_reservations(batch_size=None):
+    """
+    Release every stock reservation whose TTL has passed, one set-based
+    statement per batch of RESERVATION_SWEEP_BATCH_SIZE holds.
+    """
+    batch_size = batch_size or settings.RESERVATION_SWEEP_BATCH_SIZE
+    released = 0
+    while True:
+        count = StockReservation.objects.release_expired(batch_size=batch_size)
+        released += count
+        if count < batch_size:
+            return released
+
+
+@shared_task
+def sequence_change_feed():
+    """
+    Number the change feed entries committed since the last run, so the feed
+    can serve them. Runs every CHANGE_FEED_SEQUENCE_INTERVAL seconds, keeping
+    the feed's GET read-only. Returns the number of entries sequenced.
+    """
+    sequenced = 0
+    while True:
+        count = Change.objects.assign_sequence(batch_size=10000)
+        sequenced += count
+        if count < 10000:
+            return sequenced
+
+
+@shared_task
+def prune_change_feed(older_than_days=None):
+    """
+    Delete sequenced change feed entries older than `older_than_days`
+    (CHANGE_FEED_RETENTION_DAYS by default). Consumers whose cursor falls
+    behind the pruned range get 410 from the feed and resync.
+    """
+    if older_than_days is None:
+        older_than_days = settings.CHANGE_FEED_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    Change.objects.assign_sequence()
+    # Sequenced rows only, so the retained sequences stay contiguous
+    last = Change.objects.filter(sequence__isnull=False, created_at__lt=cutoff) \
+        .aggregate(Max('sequence'))['sequence__max']
+    if last is None:
+        return 0
+    deleted, _ = Change.objects.filter(sequence__lte=last).delete()
+    return deleted
+
+
+@shared_task
+def prune_report_artifacts(older_than_seconds=None):
+    """
+    Delete report artifacts older than `older_than_seconds`
+    (REPORT_ARTIFACT_TTL by default), once their task results have expired.
+    """
+    if older_than_seconds is None:
+        older_than_seconds = settings.REPORT_ARTIFACT_TTL
+    cutoff = timezone.now() - timedelta(seconds=older_than_seconds)
+    try:
+        _, files = default_storage.listdir(REPORT_ARTIFACTS_DIR)
+    except FileNotFoundError:
+        return 0
+    deleted = 0
+    for file_name in files:
+        name = f'{REPORT_ARTIFACTS_DIR}/{file_name}'
+        if default_storage.get_modified_time(name) < cutoff:
+            default_storage.delete(name)
+            deleted += 1
+    return deleted
+
+
+@shared_task
+@use_replica()
+def snapshot_inventory_analytics(day=None):
+    """
+    Store the closing stock of `day` (an ISO date, yesterday by default) in
+    the columnar analytics store. Returns the number of SKUs.
+    """
+    # Imported here so only the processes that run analytics load NumPy
+    from . import analytics
+
+    day = date.fromisoformat(day) if day else timezone.localdate() - timedelta(days=1)
+    snapshot = analytics.take_snapshot(day)
+    analytics.write_snapshot(day, snapshot)
+    return len(snapshot)
+
+
+@shared_task
+def forecast_replenishment(day=None):
+    """
+    Recompute the replenishment forecast of every product from the analytics
+    snapshots up to `day` (an ISO date, yesterday by default). Returns the
+    number of products.
+    """
+    # Imported here so only the processes that run forecasts load NumPy
+    from . import replenishment
+
+    return replenishment.update(date.fromisoformat(day) if day else None)
+
+
+@shared_task
+def prune_analytics_snapshots():
+    """
+    Drop analytics snapshots past their retention (ANALYTICS_RAW_RETENTION_DAYS
+    for per-SKU columns, ANALYTICS_RETENTION_DAYS for supplier rollups).
+    """
+    from . import analytics
+
+    return analytics.prune()
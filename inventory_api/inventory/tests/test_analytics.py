@@ -0,0 +1,176 @@
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory import analytics
+from inventory.models import StockMovement, ReplenishmentForecast
+from inventory.tasks import snapshot_inventory_analytics, prune_analytics_snapshots, forecast_replenishment
+from .factories import SupplierFactory, ProductFactory, InventoryFactory
+
+
+class AnalyticsTestMixin:
+    def setUp(self):
+        self.snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.snapshot_dir.cleanup)
+        snapshots = override_settings(ANALYTICS_SNAPSHOT_DIR=self.snapshot_dir.name)
+        snapshots.enable()
+        self.addCleanup(snapshots.disable)
+
+        self.supplier = SupplierFactory()
+        self.other_supplier = SupplierFactory()
+        self.inventory = InventoryFactory(
+            product=ProductFactory(supplier=self.supplier, price=Decimal("2.00")), quantity=100
+        )
+        InventoryFactory(product=ProductFactory(supplier=self.supplier, price=Decimal("1.00")), quantity=50)
+        InventoryFactory(product=ProductFactory(supplier=self.other_supplier, price=Decimal("5.00")), quantity=10)
+        # Stocked before any of the days snapshotted here
+        StockMovement.objects.update(created_at=timezone.now() - timedelta(days=5000))
+
+    def move(self, delta, day, reason=StockMovement.Reason.ADJUSTMENT, hour=12):
+        StockMovement.objects.create(
+            product_id=self.inventory.product_id, delta=delta, reason=reason,
+            created_at=timezone.make_aware(datetime.combine(day, time(hour))),
+        )
+
+
+class AnalyticsSnapshotTestCase(AnalyticsTestMixin, TestCase):
+    def test_snapshot_is_the_closing_stock(self):
+        day = timezone.localdate() - timedelta(days=1)
+        self.move(-6, day)
+        self.move(-3, day, reason=StockMovement.Reason.MANUAL)
+        # Moved after the day closed: the current quantity includes it, the snapshot must not
+        self.move(-20, day + timedelta(days=1), hour=0)
+
+        snapshot = analytics.take_snapshot(day)
+        row = snapshot[snapshot["product_id"] == self.inventory.product_id][0]
+        self.assertEqual(row["quantity"], 120)
+        # Manual corrections don't count as outflow
+        self.assertEqual(row["outflow"], 6)
+
+    def test_task_writes_columns_and_rollup(self):
+        day = date(2024, 3, 1)
+        self.assertEqual(snapshot_inventory_analytics(day.isoformat()), 3)
+
+        columns = analytics.read_snapshot(day)
+        self.assertEqual(sorted(columns), sorted(analytics.SNAPSHOT_DTYPE.names))
+        self.assertEqual(len(columns["product_id"]), 3)
+        self.assertEqual(analytics.stock_value_trend(day, day)["total_stock_value"], [300.0])
+
+    def test_prune(self):
+        today = timezone.localdate()
+        old, older = today - timedelta(days=40), today - timedelta(days=900)
+        for day in (today, old, older):
+            analytics.write_snapshot(day, analytics.take_snapshot(day))
+
+        self.assertEqual(prune_analytics_snapshots(), 2)
+        self.assertIsNotNone(analytics.read_snapshot(today))
+        # Per-SKU columns are gone, the rollup stays
+        self.assertIsNone(analytics.read_snapshot(old))
+        self.assertEqual(analytics.snapshot_days(date.min, today), [old, today])
+        self.assertFalse(os.path.exists(analytics.snapshot_dir(older)))
+
+
+class AnalyticsAPITestCase(AnalyticsTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.days = [date(2024, 1, 1) + timedelta(days=offset) for offset in range(4)]
+        for day in self.days:
+            self.move(-10, day)
+        # The current quantity (100) is the closing stock of the last day
+        for day in self.days:
+            snapshot_inventory_analytics(day.isoformat())
+
+    def test_stock_value_trend(self):
+        response = self.client.get(reverse("inventory:analytics-stock-value"),
+                                    {"start": "2024-01-01", "end": "2024-01-31"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["dates"], [day.isoformat() for day in self.days])
+        self.assertEqual(response.data["total_stock_value"], [360.0, 340.0, 320.0, 300.0])
+
+        supplier = next(item for item in response.data["suppliers"] if item["supplier_id"] == self.supplier.pk)
+        self.assertEqual(supplier["supplier_name"], self.supplier.name)
+        self.assertEqual(supplier["units"], [180, 170, 160, 150])
+
+    def test_turnover_and_days_of_cover(self):
+        response = self.client.get(reverse("inventory:analytics-turnover"),
+                                   {"start": "2024-01-01", "end": "2024-01-31", "supplier": [self.supplier.pk]})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["days"], 4)
+        [supplier] = response.data["suppliers"]
+        self.assertEqual(supplier["outflow_units"], 40)
+        self.assertEqual(supplier["outflow_value"], 80.0)
+        # 80 out over an average stock value of 280
+        self.assertEqual(supplier["turnover"], round(80 / 280, 4))
+        # 150 units at 10 a day
+        self.assertEqual(supplier["days_of_cover"], 15.0)
+
+        response = self.client.get(reverse("inventory:analytics-turnover"),
+                                   {"start": "2024-01-01", "end": "2024-01-31", "supplier": [self.other_supplier.pk]})
+        self.assertIsNone(response.data["suppliers"][0]["days_of_cover"])
+
+    def test_invalid_range(self):
+        response = self.client.get(reverse("inventory:analytics-turnover"), {"start": "2024-02-01", "end": "2024-01-01"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_no_snapshots(self):
+        response = self.client.get(reverse("inventory:analytics-turnover"), {"start": "2020-01-01", "end": "2020-01-31"})
+        self.assertEqual(response.data, {"start": None, "end": None, "days": 0, "suppliers": []})
+
+
+@override_settings(REPLENISHMENT_WINDOW_DAYS=28, REPLENISHMENT_LEAD_TIME_DAYS=7,
+                   REPLENISHMENT_REVIEW_DAYS=14, REPLENISHMENT_SAFETY_FACTOR=1.65)
+class ReplenishmentTestCase(AnalyticsTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.days = [date(2024, 1, 1) + timedelta(days=offset) for offset in range(4)]
+        for day, outflow in zip(self.days, (20, 40, 20, 40)):
+            self.move(-outflow, day)
+            snapshot_inventory_analytics(day.isoformat())
+
+    def test_forecast(self):
+        self.assertEqual(forecast_replenishment(self.days[-1].isoformat()), 3)
+
+        forecast = ReplenishmentForecast.objects.get(product_id=self.inventory.product_id)
+        self.assertEqual(forecast.as_of, self.days[-1])
+        self.assertEqual(forecast.quantity, 100)
+        self.assertEqual(forecast.consumption_rate, 30)
+        self.assertEqual(forecast.days_of_cover, 3.3)
+        # 7 days at 30 a day, plus 1.65 deviations (10 a day) over the lead time
+        self.assertEqual(forecast.reorder_point, 254)
+        # Up to 21 days of demand plus the safety stock
+        self.assertEqual(forecast.reorder_quantity, 574)
+
+        idle = ReplenishmentForecast.objects.exclude(product_id=self.inventory.product_id)
+        self.assertEqual([(item.days_of_cover, item.reorder_quantity) for item in idle], [(None, 0), (None, 0)])
+
+    def test_forecast_keeps_previous_without_snapshots(self):
+        forecast_replenishment(self.days[-1].isoformat())
+        self.assertEqual(forecast_replenishment("2020-01-01"), 0)
+        self.assertEqual(ReplenishmentForecast.objects.count(), 3)
+
+    def test_endpoint(self):
+        forecast_replenishment(self.days[-1].isoformat())
+        url = reverse("inventory:replenishment")
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 3)
+        first = response.data["results"][0]
+        self.assertEqual(first["product_id"], self.inventory.product_id)
+        self.assertEqual(first["supplier_id"], self.supplier.pk)
+        # Nothing consumed: least urgent
+        self.assertEqual([item["days_of_cover"] for item in response.data["results"][1:]], [None, None])
+
+        response = self.client.get(url, {"reorder": "true"})
+        self.assertEqual([item["product_id"] for item in response.data["results"]], [self.inventory.product_id])
+        response = self.client.get(url, {"supplier": self.other_supplier.pk})
+        self.assertEqual(response.data["count"], 1)
+        response = self.client.get(url, {"ordering": "unknown"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
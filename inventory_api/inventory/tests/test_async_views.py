@@ -0,0 +1,81 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from .factories import SupplierFactory, ProductFactory, InventoryFactory
+
+
+class AsyncProductViewTestCase(APITestCase):
+    def setUp(self):
+        self.supplier = SupplierFactory()
+        self.products = [
+            ProductFactory(name=f"Product {i:02d}", supplier=self.supplier) for i in range(12)
+        ]
+
+    def test_product_list_matches_sync_view(self):
+        sync_response = self.client.get(reverse("inventory:product-list"), {"page": 2})
+        async_response = self.client.get(reverse("inventory:async-product-list"), {"page": 2})
+
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        data = async_response.json()
+        self.assertEqual(data["count"], sync_response.data["count"])
+        self.assertEqual(data["results"], sync_response.json()["results"])
+        self.assertIsNone(data["next"])
+        self.assertIsNotNone(data["previous"])
+
+    def test_product_list_filter_and_sparse_fields(self):
+        response = self.client.get(
+            reverse("inventory:async-product-list"), {"name": "Product 03", "fields": "id,name"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"], [{"id": self.products[3].id, "name": "Product 03"}])
+
+    def test_product_list_invalid_page(self):
+        response = self.client.get(reverse("inventory:async-product-list"), {"page": 5})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_product_detail(self):
+        product = self.products[0]
+        response = self.client.get(reverse("inventory:async-product-detail", args=[product.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["supplier"]["name"], self.supplier.name)
+
+    def test_product_detail_not_found(self):
+        response = self.client.get(reverse("inventory:async-product-detail", args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_write_methods_not_allowed(self):
+        response = self.client.post(reverse("inventory:async-product-list"), {})
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class AsyncInventoryViewTestCase(APITestCase):
+    def setUp(self):
+        self.inventory = InventoryFactory(quantity=42)
+
+    def test_inventory_detail(self):
+        response = self.client.get(reverse("inventory:async-inventory-detail", args=[self.inventory.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["quantity"], 42)
+        self.assertEqual(response.json()["product"]["name"], self.inventory.product.name)
+
+
+class AsyncSupplierProductsViewTestCase(APITestCase):
+    def setUp(self):
+        self.supplier = SupplierFactory(name="Test Supplier")
+        product1 = ProductFactory(supplier=self.supplier, name="Product 1", price=10.00)
+        product2 = ProductFactory(supplier=self.supplier, name="Product 2", price=20.00)
+        InventoryFactory(product=product1, quantity=50)
+        InventoryFactory(product=product2, quantity=30)
+
+    def test_supplier_products_matches_sync_view(self):
+        sync_response = self.client.get(reverse("inventory:supplier-products", args=[self.supplier.id]))
+        async_response = self.client.get(reverse("inventory:async-supplier-products", args=[self.supplier.id]))
+
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response.json(), sync_response.json())
+        self.assertEqual(async_response.json()["total_inventory_value"], "1,100.00")
+
+    def test_supplier_not_found(self):
+        response = self.client.get(reverse("inventory:async-supplier-products", args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json()["error"], "Supplier not found")
@@ -0,0 +1,168 @@
+from datetime import timedelta
+
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models.deletion import Collector
+from django.urls import reverse
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory.models import Change, Inventory, Product, StockReservation
+from inventory.tasks import delete_supplier, prune_change_feed, sequence_change_feed
+from .factories import SupplierFactory, ProductFactory, InventoryFactory
+
+
+def recorded(object_type, action=Change.Action.SAVED):
+    return list(
+        Change.objects.filter(object_type=object_type, action=action).order_by('id').values_list('object_id', flat=True)
+    )
+
+
+class ChangeRecordingTestCase(TestCase):
+    def setUp(self):
+        self.inventory = InventoryFactory(quantity=10)
+        self.product = self.inventory.product
+        Change.objects.all().delete()
+
+    def test_save_and_delete_are_recorded(self):
+        self.product.name = "Renamed"
+        self.product.save()
+        self.assertEqual(recorded(Change.ObjectType.PRODUCT), [self.product.pk])
+
+        product_id = self.product.pk
+        self.product.delete()
+        # The inventory goes with the product
+        self.assertEqual(recorded(Change.ObjectType.PRODUCT, Change.Action.DELETED), [product_id])
+        self.assertEqual(recorded(Change.ObjectType.INVENTORY, Change.Action.DELETED), [self.inventory.pk])
+
+    def test_queryset_delete_is_recorded(self):
+        products = Product.objects.filter(pk=self.product.pk)
+        Change.objects.record_deletion(products)
+        products.delete()
+        self.assertEqual(recorded(Change.ObjectType.PRODUCT, Change.Action.DELETED), [self.product.pk])
+        self.assertEqual(recorded(Change.ObjectType.INVENTORY, Change.Action.DELETED), [self.inventory.pk])
+        # Nothing listens to deletes, so cascades don't load the rows
+        self.assertTrue(Collector(using="default").can_fast_delete(Inventory.objects.all()))
+
+    def test_adjustments_are_recorded(self):
+        Inventory.objects.adjust_quantity(-1, pk=self.inventory.pk)
+        other = InventoryFactory(quantity=5)
+        Change.objects.filter(object_type=Change.ObjectType.INVENTORY, object_id=other.pk).delete()
+        Inventory.objects.bulk_adjust_quantity({self.product.pk: 2, other.product_id: 3})
+
+        self.assertEqual(recorded(Change.ObjectType.INVENTORY), [self.inventory.pk, self.inventory.pk, other.pk])
+
+    def test_rolled_back_adjustment_is_not_recorded(self):
+        Inventory.objects.bulk_adjust_quantity({self.product.pk: -1, 999999: 1}, atomic=True)
+        self.assertFalse(Change.objects.exists())
+
+    def test_reservations_are_recorded(self):
+        reservation_id = StockReservation.objects.reserve(self.product.pk, 2)
+        StockReservation.objects.release(reservation_id)
+        self.assertEqual(recorded(Change.ObjectType.INVENTORY), [self.inventory.pk, self.inventory.pk])
+
+    def test_supplier_deletion_task_records_dependents(self):
+        supplier = self.product.supplier
+        second = InventoryFactory(product=ProductFactory(supplier=supplier))
+        Change.objects.all().delete()
+
+        delete_supplier.apply(args=[supplier.pk], kwargs={'batch_size': 1})
+        self.assertEqual(
+            sorted(recorded(Change.ObjectType.PRODUCT, Change.Action.DELETED)),
+            [self.product.pk, second.product_id],
+        )
+        self.assertEqual(
+            sorted(recorded(Change.ObjectType.INVENTORY, Change.Action.DELETED)),
+            [self.inventory.pk, second.pk],
+        )
+
+    def test_sequence_follows_assignment_order(self):
+        ProductFactory(supplier=self.product.supplier)
+        first = Change.objects.assign_sequence()
+        ProductFactory(supplier=self.product.supplier)
+        self.assertEqual(Change.objects.assign_sequence(), 1)
+        sequences = list(Change.objects.order_by('id').values_list('sequence', flat=True))
+        self.assertEqual(sequences, list(range(1, first + 2)))
+
+    def test_prune_keeps_recent_changes(self):
+        ProductFactory()
+        Change.objects.update(created_at=timezone.now() - timedelta(days=30))
+        recent = ProductFactory()
+
+        self.assertGreater(prune_change_feed(), 0)
+        self.assertEqual(recorded(Change.ObjectType.PRODUCT), [recent.pk])
+
+
+class ChangeFeedAPITestCase(APITestCase):
+    def setUp(self):
+        self.supplier = SupplierFactory()
+        self.url = reverse("inventory:change-feed")
+        Change.objects.all().delete()
+
+    def test_feed_returns_changes_after_cursor(self):
+        products = ProductFactory.create_batch(3, supplier=self.supplier)
+        # Reads don't sequence; the periodic task does
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["results"], [])
+        self.assertEqual(sequence_change_feed(), 3)
+
+        response = self.client.get(self.url, {"limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [
+            {"sequence": 1, "type": "product", "id": products[0].pk, "action": "saved"},
+            {"sequence": 2, "type": "product", "id": products[1].pk, "action": "saved"},
+        ])
+        self.assertTrue(response.data["has_more"])
+
+        response = self.client.get(self.url, {"since": response.data["next_cursor"]})
+        self.assertEqual([change["id"] for change in response.data["results"]], [products[2].pk])
+        self.assertFalse(response.data["has_more"])
+
+        cursor = response.data["next_cursor"]
+        response = self.client.get(self.url, {"since": cursor})
+        self.assertEqual(response.data, {"results": [], "next_cursor": cursor, "has_more": False})
+
+    def test_bulk_and_csv_writes_are_in_feed(self):
+        response = self.client.post(
+            reverse("inventory:product-bulk"),
+            [{"name": "Bulk", "description": "x", "price": "1.00", "supplier_id": self.supplier.pk}],
+            format="json",
+        )
+        bulk_id = response.data[0]["id"]
+
+        df = pd.DataFrame({
+            "name": ["Imported"], "description": ["x"], "price": [2.5],
+            "supplier_name": [self.supplier.name], "quantity": [4],
+        })
+        csv_file = SimpleUploadedFile("products.csv", df.to_csv(index=False).encode(), content_type="text/csv")
+        self.client.post(reverse("inventory:product-upload-csv"), {"file": csv_file}, format="multipart")
+        imported = Product.objects.get(name="Imported")
+
+        sequence_change_feed()
+        response = self.client.get(self.url)
+        changes = {(change["type"], change["id"]) for change in response.data["results"]}
+        self.assertIn(("product", bulk_id), changes)
+        self.assertIn(("product", imported.pk), changes)
+        self.assertIn(("inventory", imported.inventories.get().pk), changes)
+
+    def test_supplier_delete_is_in_feed(self):
+        self.client.delete(reverse("inventory:supplier-detail", args=[self.supplier.pk]))
+        sequence_change_feed()
+        response = self.client.get(self.url)
+        self.assertIn(
+            {"sequence": 1, "type": "supplier", "id": self.supplier.pk, "action": "deleted"},
+            response.data["results"],
+        )
+
+    def test_pruned_cursor_is_gone(self):
+        ProductFactory.create_batch(2, supplier=self.supplier)
+        Change.objects.assign_sequence()
+        Change.objects.filter(sequence=1).delete()
+
+        response = self.client.get(self.url, {"since": 0})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(response.data["latest_cursor"], 2)
+        response = self.client.get(self.url, {"since": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -0,0 +1,57 @@
+import gzip
+import brotli
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import SimpleTestCase, RequestFactory
+from django.test.utils import override_settings
+from inventory_api.compression import CompressionMiddleware, choose_encoding
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTestCase(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.body = b'{"name": "Product", "quantity": 10}' * 50
+
+    def process(self, response, accept_encoding="gzip, deflate, br"):
+        request = self.factory.get("/api/inventory/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding("gzip, br"), "br")
+        self.assertEqual(choose_encoding("gzip, br;q=0"), "gzip")
+        self.assertEqual(choose_encoding("*"), "br")
+        self.assertIsNone(choose_encoding("identity"))
+        self.assertIsNone(choose_encoding(""))
+
+    def test_brotli_large_response(self):
+        response = self.process(HttpResponse(self.body, content_type="application/json"))
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), self.body)
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_gzip_fallback(self):
+        response = self.process(HttpResponse(self.body, content_type="application/json"), "gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_small_response_not_compressed(self):
+        response = self.process(HttpResponse(b'{"id": 1}', content_type="application/json"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response.content, b'{"id": 1}')
+
+    def test_incompressible_content_type_skipped(self):
+        response = self.process(HttpResponse(self.body, content_type="application/pdf"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_streaming_response(self):
+        chunks = [self.body[i:i + 64] for i in range(0, len(self.body), 64)]
+        response = self.process(StreamingHttpResponse(iter(chunks), content_type="text/csv"), "gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertFalse(response.has_header("Content-Length"))
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), self.body)
+
+    def test_small_streaming_response_not_compressed(self):
+        response = self.process(StreamingHttpResponse(iter([b"a,b\n", b"1,2\n"]), content_type="text/csv"))
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(b"".join(response.streaming_content), b"a,b\n1,2\n")
@@ -0,0 +1,82 @@
+import time
+from django.http import HttpResponse
+from django.test import SimpleTestCase, RequestFactory
+from django.test.utils import override_settings
+from inventory.models import Product
+from inventory_api.db_router import (
+    PIN_COOKIE_NAME,
+    PrimaryReplicaRouter,
+    ReplicaRoutingMiddleware,
+    use_primary,
+    use_replica,
+)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"], REPLICA_STICKY_SECONDS=5)
+class PrimaryReplicaRouterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_default_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Product), "default")
+
+    def test_replica_reads_until_write(self):
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Product), "replica_0")
+            self.assertEqual(self.router.db_for_write(Product), "default")
+            # Read-after-write stays on the primary
+            self.assertEqual(self.router.db_for_read(Product), "default")
+
+    def test_use_primary(self):
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Product), "default")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Product), "default")
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate("default", "inventory"))
+        self.assertFalse(self.router.allow_migrate("replica_0", "inventory"))
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"], REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingMiddlewareTestCase(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+
+    def run_middleware(self, request, write=False):
+        read_db = {}
+
+        def get_response(request):
+            if write:
+                self.router.db_for_write(Product)
+            read_db["alias"] = self.router.db_for_read(Product)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return read_db["alias"], response
+
+    def test_safe_request_reads_from_replica(self):
+        alias, response = self.run_middleware(self.factory.get("/api/products/"))
+        self.assertEqual(alias, "replica_0")
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+    def test_write_request_pins_client_to_primary(self):
+        alias, response = self.run_middleware(self.factory.post("/api/products/"), write=True)
+        self.assertEqual(alias, "default")
+        self.assertEqual(response.cookies[PIN_COOKIE_NAME]["max-age"], 5)
+
+    def test_pinned_client_reads_from_primary(self):
+        request = self.factory.get("/api/products/")
+        request.COOKIES[PIN_COOKIE_NAME] = str(time.time() + 5)
+        alias, _ = self.run_middleware(request)
+        self.assertEqual(alias, "default")
+
+    def test_expired_pin_reads_from_replica(self):
+        request = self.factory.get("/api/products/")
+        request.COOKIES[PIN_COOKIE_NAME] = str(time.time() - 1)
+        alias, _ = self.run_middleware(request)
+        self.assertEqual(alias, "replica_0")
@@ -0,0 +1,178 @@
+from unittest.mock import patch
+
+import fakeredis
+from django.urls import reverse
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory import hot_stock
+from inventory.models import Inventory, InsufficientStockError, HotInventoryError, StockMovement, HotStockFlush
+from inventory.tasks import flush_hot_sku_deltas
+from .factories import InventoryFactory
+
+
+class HotStockTestCase(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = patch.object(hot_stock, "get_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.inventory = InventoryFactory(quantity=10, is_hot=True)
+
+    def load(self):
+        inventory = hot_stock.annotate_hot_state(Inventory.objects.all()).get(pk=self.inventory.pk)
+        hot_stock.merge_pending_quantities([inventory])
+        return inventory.quantity
+
+    def test_adjustment_stays_in_redis_until_flushed(self):
+        self.assertEqual(hot_stock.adjust_quantity(-3, pk=self.inventory.pk), 7)
+
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 10)
+        self.assertEqual(self.load(), 7)
+
+        self.assertEqual(flush_hot_sku_deltas(), 1)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 7)
+        self.assertEqual(self.load(), 7)
+        movement = StockMovement.objects.get(product=self.inventory.product, reason=StockMovement.Reason.HOT_SKU)
+        self.assertEqual(movement.delta, -3)
+
+    def test_oversell_is_rejected_in_redis(self):
+        hot_stock.adjust_quantity(-8, pk=self.inventory.pk)
+        with self.assertRaises(InsufficientStockError):
+            hot_stock.adjust_quantity(-3, pk=self.inventory.pk)
+        self.assertEqual(self.load(), 2)
+
+    def test_cold_inventory_is_updated_in_database(self):
+        cold = InventoryFactory(quantity=5)
+        self.assertEqual(hot_stock.adjust_quantity(-2, pk=cold.pk), 3)
+        cold.refresh_from_db()
+        self.assertEqual(cold.quantity, 3)
+        self.assertFalse(self.redis.exists(hot_stock.PENDING_KEY))
+
+    def test_flushed_batch_not_yet_applied_is_counted(self):
+        hot_stock.adjust_quantity(-4, pk=self.inventory.pk)
+        # A flush that moved the deltas out of the pending hash but died before writing them
+        hot_stock.get_client().register_script(hot_stock.FLUSH_SCRIPT)(
+            keys=[hot_stock.PENDING_KEY, hot_stock.FLUSH_SEQUENCE_KEY, hot_stock.FLUSHES_KEY],
+            args=[hot_stock.BATCH_KEY_PREFIX],
+        )
+        self.assertEqual(self.load(), 6)
+        with self.assertRaises(InsufficientStockError):
+            hot_stock.adjust_quantity(-7, pk=self.inventory.pk)
+
+        # The next run finishes the batch exactly once
+        self.assertEqual(flush_hot_sku_deltas(), 1)
+        self.assertEqual(flush_hot_sku_deltas(), 0)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 6)
+        self.assertEqual(self.load(), 6)
+        self.assertEqual(HotStockFlush.objects.count(), 1)
+
+    def test_reapplying_a_batch_is_a_no_op(self):
+        hot_stock.adjust_quantity(-1, pk=self.inventory.pk)
+        flush_hot_sku_deltas()
+        batch_id = HotStockFlush.objects.get().flush_id
+        # Make the batch look unconfirmed again
+        self.redis.persist(f"{hot_stock.BATCH_KEY_PREFIX}{batch_id}")
+
+        flush_hot_sku_deltas()
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 9)
+
+    def test_rejected_deltas_are_requeued(self):
+        hot_stock.adjust_quantity(-6, pk=self.inventory.pk)
+        # The stored quantity drops underneath the pending delta
+        Inventory.objects.filter(pk=self.inventory.pk).update(quantity=2)
+
+        self.assertEqual(flush_hot_sku_deltas(), 0)
+        key = hot_stock.hot_key(self.inventory.location_id, self.inventory.product_id)
+        self.assertEqual(int(self.redis.hget(hot_stock.PENDING_KEY, key)), -6)
+
+    @override_settings(HOT_SKU_MAX_RETRIES=2)
+    def test_repeatedly_rejected_deltas_are_parked(self):
+        hot_stock.adjust_quantity(-6, pk=self.inventory.pk)
+        Inventory.objects.filter(pk=self.inventory.pk).update(quantity=2)
+        key = hot_stock.hot_key(self.inventory.location_id, self.inventory.product_id)
+
+        with self.assertLogs("inventory.hot_stock", "ERROR"):
+            flush_hot_sku_deltas()
+            flush_hot_sku_deltas()
+        self.assertIsNone(self.redis.hget(hot_stock.PENDING_KEY, key))
+        self.assertEqual(int(self.redis.hget(hot_stock.PARKED_KEY, key)), -6)
+        self.assertIsNone(self.redis.hget(hot_stock.RETRIES_KEY, key))
+
+    def test_direct_writes_of_hot_quantities_are_rejected(self):
+        _, errors = Inventory.objects.bulk_adjust_quantity({self.inventory.product_id: -1}, exclude_hot=True)
+        self.assertEqual(errors, {self.inventory.product_id: "Inventory is in hot-SKU mode"})
+
+        self.inventory.quantity = 3
+        with self.assertRaises(HotInventoryError):
+            self.inventory.save()
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 10)
+
+
+class HotStockAPITestCase(APITestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = patch.object(hot_stock, "get_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.inventory = InventoryFactory(quantity=10, is_hot=True)
+
+    def test_reads_include_pending_delta(self):
+        response = self.client.post(
+            reverse("inventory:inventory-adjust", args=[self.inventory.pk]), {"delta": -4}, format="json"
+        )
+        self.assertEqual(response.data["quantity"], 6)
+
+        response = self.client.get(reverse("inventory:inventory-detail", args=[self.inventory.pk]))
+        self.assertEqual(response.data["quantity"], 6)
+        response = self.client.get(reverse("inventory:inventory-detail", args=[self.inventory.pk]), {"fields": "quantity"})
+        self.assertEqual(response.data, {"quantity": 6})
+        response = self.client.get(reverse("inventory:inventory"))
+        self.assertEqual(response.data[0]["quantity"], 6)
+        response = self.client.get(reverse("inventory:inventory-batch"), {"ids": str(self.inventory.pk)})
+        self.assertEqual(response.data["results"][0]["quantity"], 6)
+
+    def test_oversell_returns_conflict(self):
+        response = self.client.post(
+            reverse("inventory:inventory-adjust", args=[self.inventory.pk]), {"delta": -11}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_quantity_writes_return_conflict(self):
+        url = reverse("inventory:inventory-detail", args=[self.inventory.pk])
+        response = self.client.patch(url, {"quantity": 3}, format="json", HTTP_IF_MATCH="*")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        response = self.client.post(
+            reverse("inventory:inventory-batch-adjust"),
+            {"adjustments": [{"product_id": self.inventory.product_id, "delta": -1}]},
+            format="json",
+        )
+        self.assertEqual(response.data["results"][0]["error"], "Inventory is in hot-SKU mode")
+
+        response = self.client.post(
+            reverse("inventory:reservation-list"), {"product_id": self.inventory.product_id, "quantity": 1}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data, {"error": "Inventory is in hot-SKU mode"})
+
+    def test_leaving_hot_mode_waits_for_flush(self):
+        url = reverse("inventory:inventory-detail", args=[self.inventory.pk])
+        hot_stock.adjust_quantity(-4, pk=self.inventory.pk)
+
+        response = self.client.patch(url, {"is_hot": False}, format="json", HTTP_IF_MATCH="*")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.inventory.refresh_from_db()
+        self.assertTrue(self.inventory.is_hot)
+
+        flush_hot_sku_deltas()
+        response = self.client.patch(url, {"is_hot": False}, format="json", HTTP_IF_MATCH="*")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.is_hot), (6, False))
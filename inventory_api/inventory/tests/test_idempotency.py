@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase
+from django.test.client import encode_multipart
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APIClient
+from inventory.models import Inventory, Product
+from inventory_api.idempotency import IN_FLIGHT, REPLAYED_HEADER, IdempotencyMiddleware, idempotency_cache_key
+from .factories import InventoryFactory, SupplierFactory
+
+
+class IdempotencyMiddlewareTestCase(APITestCase):
+    def setUp(self):
+        caches["idempotency"].clear()
+        self.inventory = InventoryFactory(quantity=10)
+        self.url = reverse("inventory:inventory-adjust", args=[self.inventory.id])
+
+    def test_retry_replays_first_response(self):
+        first = self.client.post(self.url, {"delta": -3}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+        retry = self.client.post(self.url, {"delta": -3}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry["Content-Type"], "application/json")
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 7)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.client.post(self.url, {"delta": -3}, format="json")
+        self.client.post(self.url, {"delta": -3}, format="json")
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 4)
+
+    def test_key_reused_for_different_request(self):
+        self.client.post(self.url, {"delta": -3}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+        response = self.client.post(self.url, {"delta": -4}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+        self.assertEqual(response.status_code, 422)
+
+    def test_multipart_retry_with_new_boundary_is_replayed(self):
+        supplier = SupplierFactory(name="company")
+        url = reverse("inventory:product-upload-csv")
+
+        def upload(boundary, csv):
+            body = encode_multipart(boundary, {"file": SimpleUploadedFile("products.csv", csv, content_type="text/csv")})
+            return self.client.generic(
+                "POST", url, body, content_type=f"multipart/form-data; boundary={boundary}", HTTP_IDEMPOTENCY_KEY="csv"
+            )
+
+        csv = f"name,description,price,supplier_name,quantity\nLamp,x,2.5,{supplier.name},4\n".encode()
+        first = upload("first-boundary", csv)
+        retry = upload("second-boundary", csv)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(Product.objects.filter(name="Lamp").count(), 1)
+
+        response = upload("third-boundary", csv.replace(b"Lamp", b"Desk"))
+        self.assertEqual(response.status_code, 422)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_duplicate_of_request_in_flight(self):
+        self.client.post(self.url, {"delta": -3}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+        # Make the stored entry look unfinished
+        cache = caches["idempotency"]
+        cache.set(idempotency_cache_key("abc"), {**cache.get(idempotency_cache_key("abc")), "state": IN_FLIGHT})
+
+        response = self.client.post(self.url, {"delta": -3}, format="json", HTTP_IDEMPOTENCY_KEY="abc")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+
+class ConcurrentIdempotencyTestCase(TransactionTestCase):
+    def setUp(self):
+        caches["idempotency"].clear()
+
+    def test_concurrent_duplicates_wait_for_first(self):
+        inventory = InventoryFactory(quantity=10)
+        url = reverse("inventory:inventory-adjust", args=[inventory.id])
+        started, release = threading.Event(), threading.Event()
+        original = IdempotencyMiddleware._store_response
+
+        def slow_store_response(middleware, *args):
+            # Hold the first request open until the duplicate is waiting
+            started.set()
+            release.wait(5)
+            return original(middleware, *args)
+
+        responses = {}
+
+        def send(name):
+            try:
+                responses[name] = APIClient().post(url, {"delta": -3}, format="json", HTTP_IDEMPOTENCY_KEY="xyz")
+            finally:
+                connection.close()
+
+        with override_settings(IDEMPOTENCY_WAIT_TIMEOUT=5):
+            IdempotencyMiddleware._store_response = slow_store_response
+            try:
+                first = threading.Thread(target=send, args=("first",))
+                first.start()
+                started.wait(5)
+                IdempotencyMiddleware._store_response = original
+                second = threading.Thread(target=send, args=("second",))
+                second.start()
+                release.set()
+                first.join()
+                second.join()
+            finally:
+                IdempotencyMiddleware._store_response = original
+
+        self.assertEqual(responses["second"]["Idempotent-Replayed"], "true")
+        self.assertEqual(responses["second"].content, responses["first"].content)
+        self.assertEqual(Inventory.objects.get(pk=inventory.pk).quantity, 7)
+
+
+class AsyncIdempotencyTestCase(SimpleTestCase):
+    def setUp(self):
+        caches["idempotency"].clear()
+
+    async def test_duplicate_waits_without_blocking_the_event_loop(self):
+        calls = []
+        release = asyncio.Event()
+
+        async def view(request):
+            calls.append(request)
+            await release.wait()
+            return JsonResponse({"calls": len(calls)})
+
+        middleware = IdempotencyMiddleware(view)
+
+        def request():
+            return RequestFactory().post(
+                "/api/things/", {"a": 1}, content_type="application/json", HTTP_IDEMPOTENCY_KEY="async"
+            )
+
+        async def release_later():
+            # Only reached if the waiting duplicate yields to the event loop
+            await asyncio.sleep(0.2)
+            release.set()
+
+        first, second, _ = await asyncio.gather(middleware(request()), middleware(request()), release_later())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(sum(response.has_header(REPLAYED_HEADER) for response in (first, second)), 1)
+
+    @override_settings(IDEMPOTENCY_LOCK_TIMEOUT=0.3)
+    def test_claim_is_extended_while_request_runs(self):
+        cache = caches["idempotency"]
+        cache.set("claim", IN_FLIGHT, 0.3)
+        stop = threading.Event()
+        extender = threading.Thread(target=IdempotencyMiddleware(None)._extend_claim, args=(cache, "claim", stop))
+        extender.start()
+        try:
+            time.sleep(0.6)
+            self.assertEqual(cache.get("claim"), IN_FLIGHT)
+        finally:
+            stop.set()
+            extender.join()
@@ -0,0 +1,79 @@
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework.test import APITestCase
+
+from inventory.tasks import snapshot_stock_levels
+from inventory_api import instrumentation
+from .factories import SupplierFactory, ProductFactory, InventoryFactory
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_SLOW_REQUEST_MS=60000)
+class InstrumentationMiddlewareTestCase(APITestCase):
+    def setUp(self):
+        self.supplier = SupplierFactory()
+        for _ in range(3):
+            InventoryFactory(product=ProductFactory(supplier=self.supplier))
+
+    def test_server_timing_header(self):
+        with self.assertLogs("inventory_api.instrumentation", "INFO") as logs:
+            response = self.client.get(reverse("inventory:supplier-products", args=[self.supplier.pk]))
+
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries, \d+ repeated", '
+                                                    r'serializer;dur=[\d.]+, total;dur=[\d.]+$')
+        summary = json.loads(logs.records[0].getMessage())
+        self.assertEqual(summary["route"], "inventory:supplier-products")
+        self.assertEqual(summary["status"], 200)
+        # Products and their quantities are read in one query
+        self.assertEqual(summary["repeated_queries"], 0)
+        self.assertEqual(len(summary["slowest_queries"]), 3)
+        self.assertNotIn("all_queries", summary)
+
+    def test_repeated_queries_are_counted(self):
+        import pandas as pd
+
+        df = pd.DataFrame({
+            "name": ["A", "B", "C"], "description": ["x"] * 3, "price": [1.5] * 3,
+            "supplier_name": [self.supplier.name] * 3, "quantity": [1] * 3,
+        })
+        csv_file = SimpleUploadedFile("products.csv", df.to_csv(index=False).encode(), content_type="text/csv")
+        with self.assertLogs("inventory_api.instrumentation", "INFO") as logs:
+            self.client.post(reverse("inventory:product-upload-csv"), {"file": csv_file}, format="multipart")
+
+        # The import looks up the supplier of every row
+        self.assertGreaterEqual(logs.records[0].instrumentation["repeated_queries"], 2)
+
+    def test_serializer_time_is_recorded(self):
+        with self.assertLogs("inventory_api.instrumentation", "INFO") as logs:
+            self.client.get(reverse("inventory:inventory"))
+        self.assertGreater(logs.records[0].instrumentation["serializer_ms"], 0)
+
+    @override_settings(INSTRUMENTATION_SLOW_REQUEST_MS=0)
+    def test_slow_request_logs_every_query(self):
+        with self.assertLogs("inventory_api.instrumentation", "WARNING") as logs:
+            self.client.get(reverse("inventory:supplier"))
+        summary = logs.records[0].instrumentation
+        self.assertEqual(len(summary["all_queries"]), summary["queries"])
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get(reverse("inventory:supplier"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+
+@override_settings(INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_SLOW_TASK_MS=60000)
+class InstrumentationTaskTestCase(TestCase):
+    def setUp(self):
+        instrumentation.install()
+        InventoryFactory()
+
+    def test_task_is_measured(self):
+        with self.assertLogs("inventory_api.instrumentation", "INFO") as logs:
+            snapshot_stock_levels.apply()
+        summary = logs.records[0].instrumentation
+        self.assertEqual(summary["task"], "inventory.tasks.snapshot_stock_levels")
+        self.assertEqual(summary["state"], "SUCCESS")
+        self.assertGreaterEqual(summary["queries"], 2)
@@ -0,0 +1,161 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+import fakeredis
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory import hot_stock
+from inventory.models import Inventory, InsufficientStockError, Location, Product, StockReservation, StockSnapshot
+from inventory.tasks import flush_hot_sku_deltas, snapshot_stock_levels
+from .factories import SupplierFactory, ProductFactory, InventoryFactory
+
+
+class LocationModelTestCase(TestCase):
+    def setUp(self):
+        self.store = Location.objects.create(code="store", name="Store")
+        self.product = ProductFactory(price=Decimal("2.00"))
+        self.main = InventoryFactory(product=self.product, quantity=10)
+        self.other = InventoryFactory(product=self.product, location=self.store, quantity=5)
+
+    def test_one_row_per_location(self):
+        self.assertEqual(self.main.location_id, "main")
+        with self.assertRaises(IntegrityError):
+            InventoryFactory(product=self.product, location=self.store)
+
+    def test_adjust_quantity_at_a_location(self):
+        self.assertEqual(Inventory.objects.adjust_quantity(-2, product_id=self.product.pk), 8)
+        self.assertEqual(Inventory.objects.adjust_quantity(-5, product_id=self.product.pk, location_id="store"), 0)
+        with self.assertRaises(InsufficientStockError):
+            Inventory.objects.adjust_quantity(-1, product_id=self.product.pk, location_id="store")
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.quantity, 0)
+
+    def test_bulk_adjust_at_a_location(self):
+        quantities, errors = Inventory.objects.bulk_adjust_quantity({self.product.pk: 3}, location_id="store")
+        self.assertEqual((quantities, errors), ({self.product.pk: 8}, {}))
+        self.main.refresh_from_db()
+        self.assertEqual(self.main.quantity, 10)
+
+    def test_reservations_hold_stock_at_their_location(self):
+        with self.assertRaises(InsufficientStockError):
+            StockReservation.objects.reserve(self.product.pk, 6, location_id="store")
+        reservation_id = StockReservation.objects.reserve(self.product.pk, 4, location_id="store")
+        StockReservation.objects.confirm(reservation_id)
+
+        self.main.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.main.quantity, self.main.reserved), (10, 0))
+        self.assertEqual((self.other.quantity, self.other.reserved), (1, 0))
+
+    def test_totals_span_locations(self):
+        supplier = self.product.supplier
+        self.assertEqual(supplier.total_inventory_value(), Decimal("30.00"))
+        self.assertEqual(supplier.total_inventory_value("store"), Decimal("10.00"))
+        self.assertEqual(Product.objects.with_quantity().get().quantity, 15)
+        self.assertEqual(Product.objects.with_quantity("store").get().quantity, 5)
+
+        self.assertEqual(snapshot_stock_levels(), 1)
+        self.assertEqual(StockSnapshot.objects.get(product=self.product).quantity, 15)
+
+    def test_hot_deltas_are_flushed_to_their_location(self):
+        redis = fakeredis.FakeRedis()
+        patcher = patch.object(hot_stock, "get_client", return_value=redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Inventory.objects.filter(product=self.product).update(is_hot=True)
+
+        self.assertEqual(hot_stock.adjust_quantity(-3, product_id=self.product.pk, location_id="store"), 2)
+        self.assertEqual(flush_hot_sku_deltas(), 1)
+        self.main.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.main.quantity, self.other.quantity), (10, 2))
+
+
+class LocationAPITestCase(APITestCase):
+    def setUp(self):
+        self.store = Location.objects.create(code="store", name="Store")
+        self.supplier = SupplierFactory()
+        self.product = ProductFactory(supplier=self.supplier, price=Decimal("2.00"))
+        self.main = InventoryFactory(product=self.product, quantity=10)
+        InventoryFactory(product=self.product, location=self.store, quantity=5)
+
+    def test_list_and_create_locations(self):
+        response = self.client.post(reverse("inventory:location"), {"code": "east", "name": "East"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.get(reverse("inventory:location"))
+        self.assertEqual([location["code"] for location in response.data], ["east", "main", "store"])
+
+    def test_product_stock(self):
+        StockReservation.objects.reserve(self.product.pk, 2)
+        response = self.client.get(reverse("inventory:product-stock", args=[self.product.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            "product_id": self.product.pk, "quantity": 15, "reserved": 2, "available": 13,
+            "locations": [
+                {"location": "main", "quantity": 10, "reserved": 2, "available": 8},
+                {"location": "store", "quantity": 5, "reserved": 0, "available": 5},
+            ],
+        })
+        response = self.client.get(reverse("inventory:product-stock", args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_inventory_filters_and_writes(self):
+        response = self.client.get(reverse("inventory:inventory"), {"location": "store"})
+        self.assertEqual([(item["location"], item["quantity"]) for item in response.data], [("store", 5)])
+
+        response = self.client.post(
+            reverse("inventory:inventory"), {"product_id": self.product.pk, "location": "store", "quantity": 1}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        url = reverse("inventory:inventory-detail", args=[self.main.pk])
+        response = self.client.patch(url, {"location": "store"}, format="json", HTTP_IF_MATCH="*")
+        self.assertEqual(response.data, {"location": ["Can't be changed."]})
+        response = self.client.put(
+            url, {"product_id": self.product.pk, "quantity": 12}, format="json", HTTP_IF_MATCH="*"
+        )
+        self.assertEqual((response.data["location"], response.data["quantity"]), ("main", 12))
+
+        response = self.client.post(
+            reverse("inventory:inventory-batch-adjust"),
+            {"location": "store", "adjustments": [{"product_id": self.product.pk, "delta": -5}]},
+            format="json",
+        )
+        self.assertEqual(response.data["results"][0]["quantity"], 0)
+
+        response = self.client.post(
+            reverse("inventory:reservation-list"),
+            {"product_id": self.product.pk, "quantity": 1, "location": "store"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_supplier_products_by_location(self):
+        url = reverse("inventory:supplier-products", args=[self.supplier.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.data["total_inventory_value"], "30.00")
+        self.assertEqual(response.data["products"][0]["quantity"], 15)
+
+        response = self.client.get(url, {"location": "store"})
+        self.assertEqual(response.data["total_inventory_value"], "10.00")
+        self.assertEqual(response.data["products"][0]["quantity"], 5)
+
+    def test_csv_import_location_column(self):
+        import pandas as pd
+
+        df = pd.DataFrame({
+            "name": ["Kettle", "Toaster", "Lamp"], "description": ["x"] * 3, "price": [2.5] * 3,
+            "supplier_name": [self.supplier.name] * 3, "quantity": [4] * 3, "location": ["store", None, "nowhere"],
+        })
+        csv_file = SimpleUploadedFile("products.csv", df.to_csv(index=False).encode(), content_type="text/csv")
+        response = self.client.post(reverse("inventory:product-upload-csv"), {"file": csv_file}, format="multipart")
+
+        self.assertEqual((response.data["success_count"], response.data["error_count"]), (2, 1))
+        self.assertEqual(response.data["errors"][0]["error"], "Location 'nowhere' not found.")
+        self.assertEqual(Inventory.objects.get(product__name="Kettle").location_id, "store")
+        self.assertEqual(Inventory.objects.get(product__name="Toaster").location_id, "main")
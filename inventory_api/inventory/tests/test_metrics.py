@@ -0,0 +1,81 @@
+from unittest import mock
+
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.db import connections
+from django.test import TestCase
+from prometheus_client import REGISTRY
+from rest_framework.test import APITestCase
+
+from inventory.tasks import snapshot_stock_levels
+from inventory_api import metrics
+from .factories import SupplierFactory
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsEndpointTestCase(APITestCase):
+    def test_request_latency_by_route(self):
+        labels = {"route": "inventory:supplier", "method": "GET", "status": "200"}
+        before = sample("http_request_duration_seconds_count", **labels)
+        self.client.get(reverse("inventory:supplier"))
+        self.assertEqual(sample("http_request_duration_seconds_count", **labels), before + 1)
+
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_request_duration_seconds_bucket{le="0.005",method="GET",route="inventory:supplier"',
+                      response.content)
+
+    def test_unmatched_paths_share_a_label(self):
+        self.client.get("/no-such-page/")
+        self.assertGreater(
+            sample("http_request_duration_seconds_count", route="unmatched", method="GET", status="404"), 0
+        )
+
+    def test_csv_import_rows(self):
+        supplier = SupplierFactory()
+        imported = sample("csv_import_rows_total", outcome="imported")
+        failed = sample("csv_import_rows_total", outcome="failed")
+        df = pd.DataFrame({
+            "name": ["A", "B"], "description": ["x", "y"], "price": [1.0, 2.0],
+            "supplier_name": [supplier.name, "Unknown"], "quantity": [1, 2],
+        })
+        csv_file = SimpleUploadedFile("products.csv", df.to_csv(index=False).encode(), content_type="text/csv")
+        self.client.post(reverse("inventory:product-upload-csv"), {"file": csv_file}, format="multipart")
+
+        self.assertEqual(sample("csv_import_rows_total", outcome="imported"), imported + 1)
+        self.assertEqual(sample("csv_import_rows_total", outcome="failed"), failed + 1)
+
+
+class TaskMetricsTestCase(TestCase):
+    def test_task_runtime(self):
+        labels = {"task": "inventory.tasks.snapshot_stock_levels", "state": "SUCCESS"}
+        before = sample("celery_task_runtime_seconds_count", **labels)
+        snapshot_stock_levels.apply()
+        self.assertEqual(sample("celery_task_runtime_seconds_count", **labels), before + 1)
+        self.assertEqual(sample("db_connections_open", alias="default"), 1)
+
+    def test_publish_time_is_sent_with_the_task(self):
+        headers = {}
+        metrics._before_task_publish(headers=headers)
+        self.assertIn(metrics.PUBLISHED_AT_HEADER, headers)
+
+    def test_pool_stats(self):
+        pool = mock.Mock(closed=False)
+        pool.pop_stats.return_value = {
+            "pool_size": 3, "pool_available": 2, "requests_waiting": 0,
+            "requests_num": 5, "requests_wait_ms": 1500, "requests_errors": 1,
+        }
+        checkouts = sample("db_pool_checkouts_total", alias="default")
+        waited = sample("db_pool_wait_seconds_total", alias="default")
+
+        with mock.patch.object(connections["default"], "pool", pool, create=True):
+            metrics.record_connections()
+
+        self.assertEqual(sample("db_connections_open", alias="default"), 3)
+        self.assertEqual(sample("db_pool_available", alias="default"), 2)
+        self.assertEqual(sample("db_pool_checkouts_total", alias="default"), checkouts + 5)
+        self.assertEqual(sample("db_pool_wait_seconds_total", alias="default"), waited + 1.5)
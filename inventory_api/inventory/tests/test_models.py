@@ -1,5 +1,28 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest.mock import patch
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
 from decimal import Decimal
+from datetime import timedelta
+from django.utils import timezone
+from inventory.models import (
+    Inventory,
+    InsufficientStockError,
+    Product,
+    ReservationError,
+    StockMovement,
+    StockReservation,
+    StockSnapshot,
+    Supplier,
+    VersionConflictError,
+)
+from inventory.tasks import (
+    snapshot_stock_levels, compact_stock_movements, delete_supplier, release_expired_reservations,
+    generate_inventory_report, generate_inventory_report_pdf, prune_report_artifacts, read_inventory_report,
+)
 from .factories import SupplierFactory, ProductFactory, InventoryFactory
 
 
@@ -12,6 +35,36 @@ class SupplierModelTestCase(TestCase):
         self.assertEqual(str(self.supplier), self.supplier.name)
         self.assertIsNotNone(self.supplier.contact_info)
 
+    def test_deleting_supplier_is_hidden(self):
+        Supplier.objects.filter(pk=self.supplier.pk).update(deleting=True)
+        self.assertFalse(Supplier.objects.filter(pk=self.supplier.pk).exists())
+        self.assertTrue(Supplier.all_objects.filter(pk=self.supplier.pk).exists())
+
+    def test_delete_supplier_task(self):
+        supplier = SupplierFactory(deleting=True)
+        for _ in range(5):
+            InventoryFactory(product=ProductFactory(supplier=supplier))
+        other = InventoryFactory()
+        deleted_stock = list(
+            Inventory.objects.filter(product__supplier=supplier, quantity__gt=0).values_list("product_id", "quantity")
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            result = delete_supplier.apply(args=[supplier.pk], kwargs={"batch_size": 2})
+
+        self.assertEqual(result.get(), {"deleted_products": 5, "total_products": 5})
+        self.assertFalse(Supplier.all_objects.filter(pk=supplier.pk).exists())
+        self.assertFalse(Product.objects.filter(supplier_id=supplier.pk).exists())
+        self.assertEqual(list(Inventory.objects.all()), [other])
+        # The deleted stock is closed in the ledger
+        self.assertCountEqual(
+            StockMovement.objects.filter(reason=StockMovement.Reason.CLOSED).values_list("product_id", "delta"),
+            [(product_id, -quantity) for product_id, quantity in deleted_stock],
+        )
+        # Set-based deletes only: nothing is loaded into Python
+        selects = [q["sql"] for q in queries if q["sql"].lstrip().upper().startswith("SELECT")]
+        self.assertEqual(len(selects), 1)  # The initial count
+
 
 class ProductModelTestCase(TestCase):
     @classmethod
@@ -23,6 +76,24 @@ class ProductModelTestCase(TestCase):
         self.assertGreater(self.product.price, Decimal("0.0"))
         self.assertIsNotNone(self.product.supplier)
 
+    def test_save_increments_version(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.name = "Renamed"
+        product.save()
+        self.assertEqual(product.version, 2)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).version, 2)
+
+    def test_stale_save_is_rejected(self):
+        first = Product.objects.get(pk=self.product.pk)
+        second = Product.objects.get(pk=self.product.pk)
+        first.name = "First"
+        first.save()
+
+        second.name = "Second"
+        with self.assertRaises(VersionConflictError), transaction.atomic():
+            second.save()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).name, "First")
+
 
 class InventoryModelTestCase(TestCase):
     @classmethod
@@ -34,4 +105,314 @@ class InventoryModelTestCase(TestCase):
         self.assertGreaterEqual(self.inventory.quantity, 0)
 
     def test_inventory_product_link(self):
-        self.assertEqual(self.inventory.product.inventory.quantity, self.inventory.quantity)
+        self.assertEqual(self.inventory.product.inventories.get().quantity, self.inventory.quantity)
+
+
+class InventoryAdjustQuantityTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.inventory = InventoryFactory(quantity=10)
+
+    def test_adjust_quantity(self):
+        self.assertEqual(Inventory.objects.adjust_quantity(-4, pk=self.inventory.pk), 6)
+        self.assertEqual(Inventory.objects.adjust_quantity(5, product_id=self.inventory.product_id), 11)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 11)
+
+    def test_adjust_quantity_single_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            Inventory.objects.adjust_quantity(-10, pk=self.inventory.pk)
+        statements = [q["sql"].split()[0] for q in ctx.captured_queries]
+        # One UPDATE plus the ledger and change feed INSERTs, no SELECT ... FOR UPDATE
+        self.assertEqual(statements.count("UPDATE"), 1)
+        self.assertEqual(statements.count("INSERT"), 2)
+        self.assertNotIn("SELECT", statements)
+
+    def test_adjust_quantity_rejects_oversell(self):
+        with self.assertRaises(InsufficientStockError):
+            Inventory.objects.adjust_quantity(-11, pk=self.inventory.pk)
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, 10)
+
+    def test_adjust_quantity_missing_row(self):
+        with self.assertRaises(Inventory.DoesNotExist):
+            Inventory.objects.adjust_quantity(1, pk=999)
+
+    @patch("inventory.models.supports_update_returning", return_value=False)
+    def test_adjust_quantity_without_returning(self, _):
+        self.assertEqual(Inventory.objects.adjust_quantity(-3, pk=self.inventory.pk), 7)
+        with self.assertRaises(InsufficientStockError):
+            Inventory.objects.adjust_quantity(-8, pk=self.inventory.pk)
+
+
+class InventoryBulkAdjustQuantityTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.inventory1 = InventoryFactory(quantity=10)
+        cls.inventory2 = InventoryFactory(quantity=3)
+
+    def test_bulk_adjust_quantity(self):
+        deltas = {self.inventory1.product_id: -4, self.inventory2.product_id: 2}
+        with CaptureQueriesContext(connection) as ctx:
+            quantities, errors = Inventory.objects.bulk_adjust_quantity(deltas)
+        # A single UPDATE, ledger INSERT and change feed INSERT for the whole batch
+        statements = [q["sql"].split()[0] for q in ctx.captured_queries]
+        self.assertEqual(statements.count("UPDATE"), 1)
+        self.assertEqual(statements.count("INSERT"), 2)
+        self.assertNotIn("SELECT", statements)
+        self.assertEqual(errors, {})
+        self.assertEqual(quantities, {self.inventory1.product_id: 6, self.inventory2.product_id: 5})
+
+    def test_bulk_adjust_quantity_atomic_rolls_back(self):
+        deltas = {self.inventory1.product_id: -4, self.inventory2.product_id: -5, 999: 1}
+        quantities, errors = Inventory.objects.bulk_adjust_quantity(deltas, atomic=True)
+        self.assertEqual(quantities, {})
+        self.assertEqual(errors, {self.inventory2.product_id: "Insufficient stock", 999: "Inventory not found"})
+        self.inventory1.refresh_from_db()
+        self.assertEqual(self.inventory1.quantity, 10)
+
+    def test_bulk_adjust_quantity_partial(self):
+        deltas = {self.inventory1.product_id: -4, self.inventory2.product_id: -5}
+        quantities, errors = Inventory.objects.bulk_adjust_quantity(deltas, atomic=False, batch_size=1)
+        self.assertEqual(quantities, {self.inventory1.product_id: 6})
+        self.assertEqual(errors, {self.inventory2.product_id: "Insufficient stock"})
+        self.inventory1.refresh_from_db()
+        self.assertEqual(self.inventory1.quantity, 6)
+
+    @patch("inventory.models.supports_update_returning", return_value=False)
+    def test_bulk_adjust_quantity_without_returning(self, _):
+        deltas = {self.inventory1.product_id: -4, self.inventory2.product_id: -5}
+        quantities, errors = Inventory.objects.bulk_adjust_quantity(deltas, atomic=False)
+        self.assertEqual(quantities, {self.inventory1.product_id: 6})
+        self.assertEqual(errors, {self.inventory2.product_id: "Insufficient stock"})
+
+
+class StockLedgerTestCase(TestCase):
+    def setUp(self):
+        self.inventory = InventoryFactory(quantity=10)
+        self.product_id = self.inventory.product_id
+
+    def movements(self):
+        return list(
+            StockMovement.objects.filter(product_id=self.product_id)
+            .order_by("id").values_list("delta", "reason")
+        )
+
+    def test_quantity_changes_are_recorded(self):
+        Inventory.objects.adjust_quantity(-3, pk=self.inventory.pk)
+        Inventory.objects.bulk_adjust_quantity({self.product_id: 5})
+        inventory = Inventory.objects.get(pk=self.inventory.pk)
+        inventory.quantity = 20
+        inventory.save()
+
+        self.assertEqual(self.movements(), [
+            (10, StockMovement.Reason.MANUAL),
+            (-3, StockMovement.Reason.ADJUSTMENT),
+            (5, StockMovement.Reason.BATCH),
+            (8, StockMovement.Reason.MANUAL),
+        ])
+
+    def test_rejected_adjustment_not_recorded(self):
+        with self.assertRaises(InsufficientStockError):
+            Inventory.objects.adjust_quantity(-11, pk=self.inventory.pk)
+        self.assertEqual(len(self.movements()), 1)
+
+    def test_quantity_at(self):
+        snapshot_stock_levels()
+        snapshot_time = StockSnapshot.objects.get(product_id=self.product_id).taken_at
+        Inventory.objects.adjust_quantity(-4, pk=self.inventory.pk)
+        now = timezone.now()
+
+        self.assertEqual(StockSnapshot.objects.quantity_at(self.product_id, snapshot_time), 10)
+        self.assertEqual(StockSnapshot.objects.quantity_at(self.product_id, now), 6)
+        # Before the snapshot, the ledger alone is replayed
+        self.assertEqual(StockSnapshot.objects.quantity_at(self.product_id, snapshot_time - timedelta(days=1)), 0)
+
+    def test_snapshot_only_changed_products(self):
+        other = InventoryFactory(quantity=1)
+        self.assertEqual(snapshot_stock_levels(), 2)
+        Inventory.objects.adjust_quantity(1, pk=self.inventory.pk)
+        self.assertEqual(snapshot_stock_levels(), 1)
+        self.assertEqual(StockSnapshot.objects.filter(product_id=other.product_id).count(), 1)
+
+    def test_late_committed_movement_counted_once(self):
+        snapshot_stock_levels()
+        taken_at = StockSnapshot.objects.get(product_id=self.product_id).taken_at
+        # Stamped before the snapshot, but committed after it
+        with transaction.atomic():
+            Inventory.objects.filter(pk=self.inventory.pk).update(quantity=7)
+            StockMovement.objects.create(
+                product_id=self.product_id, delta=-3, reason=StockMovement.Reason.ADJUSTMENT,
+                created_at=taken_at - timedelta(seconds=1),
+            )
+        now = timezone.now()
+        self.assertEqual(StockSnapshot.objects.quantity_at(self.product_id, now), 7)
+
+        self.assertEqual(snapshot_stock_levels(), 1)
+        self.assertEqual(StockSnapshot.objects.quantity_at(self.product_id, now), 7)
+        self.assertEqual(StockSnapshot.objects.quantity_at(self.product_id, timezone.now()), 7)
+        self.assertFalse(StockMovement.objects.filter(snapshot_at__isnull=True).exists())
+
+    def test_deletion_closes_stock(self):
+        snapshot_stock_levels()
+        self.inventory.delete()
+
+        self.assertEqual(self.movements()[-1], (-10, StockMovement.Reason.CLOSED))
+        self.assertEqual(StockSnapshot.objects.quantity_at(self.product_id, timezone.now()), 0)
+
+    def test_compact_stock_movements(self):
+        old = timezone.now() - timedelta(days=100)
+        StockMovement.objects.filter(product_id=self.product_id).update(created_at=old, snapshot_at=old)
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                product_id=self.product_id, delta=-1, reason=StockMovement.Reason.ADJUSTMENT,
+                created_at=old, snapshot_at=old,
+            )
+            for _ in range(5)
+        ])
+        # Not included in any snapshot yet
+        StockMovement.objects.create(
+            product_id=self.product_id, delta=-1, reason=StockMovement.Reason.ADJUSTMENT, created_at=old,
+        )
+
+        self.assertEqual(compact_stock_movements(older_than_days=90), 4)
+        self.assertEqual(sorted(self.movements()), [
+            (-5, StockMovement.Reason.ADJUSTMENT),
+            (-1, StockMovement.Reason.ADJUSTMENT),
+            (10, StockMovement.Reason.MANUAL),
+        ])
+        self.assertEqual(StockSnapshot.objects.quantity_at(self.product_id, timezone.now()), 4)
+
+    def test_compaction_keeps_snapshot_boundaries(self):
+        day = timezone.now().replace(hour=12, minute=0) - timedelta(days=100)
+        first, second = day + timedelta(hours=2), day + timedelta(hours=5)
+        StockMovement.objects.filter(product_id=self.product_id).update(created_at=day, snapshot_at=first)
+        StockMovement.objects.bulk_create([
+            StockMovement(
+                product_id=self.product_id, delta=delta, reason=StockMovement.Reason.ADJUSTMENT,
+                created_at=day + timedelta(hours=hours), snapshot_at=snapshot_at,
+            )
+            for delta, hours, snapshot_at in ((-1, 1, first), (-1, 3, second))
+        ])
+        # Taken between the two adjustments of the same day
+        StockSnapshot.objects.create(product_id=self.product_id, quantity=9, taken_at=first)
+        StockSnapshot.objects.create(product_id=self.product_id, quantity=8, taken_at=second)
+        between = day + timedelta(hours=4)
+        self.assertEqual(StockSnapshot.objects.quantity_at(self.product_id, between), 8)
+
+        self.assertEqual(compact_stock_movements(older_than_days=90), 0)
+        self.assertEqual(StockSnapshot.objects.quantity_at(self.product_id, between), 8)
+        self.assertEqual(StockSnapshot.objects.quantity_at(self.product_id, first), 9)
+
+
+class StockReservationTestCase(TestCase):
+    def setUp(self):
+        self.inventory = InventoryFactory(quantity=10)
+        self.product_id = self.inventory.product_id
+
+    def assertStock(self, quantity, reserved):
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (quantity, reserved))
+
+    def test_reserve_holds_available_stock(self):
+        StockReservation.objects.reserve(self.product_id, 6)
+        self.assertStock(10, 6)
+        self.assertEqual(self.inventory.available, 4)
+
+        with self.assertRaises(InsufficientStockError):
+            StockReservation.objects.reserve(self.product_id, 5)
+        with self.assertRaises(Inventory.DoesNotExist):
+            StockReservation.objects.reserve(0, 1)
+        self.assertStock(10, 6)
+
+    def test_adjustments_cannot_take_reserved_stock(self):
+        StockReservation.objects.reserve(self.product_id, 6)
+        with self.assertRaises(InsufficientStockError):
+            Inventory.objects.adjust_quantity(-5, product_id=self.product_id)
+        self.assertEqual(Inventory.objects.adjust_quantity(-4, product_id=self.product_id), 6)
+
+    def test_confirm(self):
+        reservation_id = StockReservation.objects.reserve(self.product_id, 3)
+        StockReservation.objects.confirm(reservation_id)
+        self.assertStock(7, 0)
+        self.assertEqual(StockReservation.objects.get(pk=reservation_id).status, StockReservation.Status.CONFIRMED)
+        movement = StockMovement.objects.get(product_id=self.product_id, reason=StockMovement.Reason.RESERVATION)
+        self.assertEqual(movement.delta, -3)
+
+        # A hold can only be finished once
+        with self.assertRaises(ReservationError):
+            StockReservation.objects.release(reservation_id)
+        self.assertStock(7, 0)
+
+    def test_release(self):
+        reservation_id = StockReservation.objects.reserve(self.product_id, 3)
+        StockReservation.objects.release(reservation_id)
+        self.assertStock(10, 0)
+        with self.assertRaises(ReservationError):
+            StockReservation.objects.confirm(reservation_id)
+        with self.assertRaises(StockReservation.DoesNotExist):
+            StockReservation.objects.confirm(0)
+
+    def test_expired_hold_cannot_be_confirmed(self):
+        reservation_id = StockReservation.objects.reserve(self.product_id, 3)
+        StockReservation.objects.filter(pk=reservation_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertRaises(ReservationError):
+            StockReservation.objects.confirm(reservation_id)
+
+    def test_release_expired_reservations(self):
+        other = InventoryFactory(quantity=10)
+        expired = [
+            StockReservation.objects.reserve(self.product_id, 1),
+            StockReservation.objects.reserve(self.product_id, 2),
+            StockReservation.objects.reserve(other.product_id, 4),
+        ]
+        active = StockReservation.objects.reserve(self.product_id, 5)
+        StockReservation.objects.filter(pk__in=expired).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(release_expired_reservations(batch_size=2), 3)
+        self.assertStock(10, 5)
+        other.refresh_from_db()
+        self.assertEqual(other.reserved, 0)
+        self.assertEqual(
+            set(StockReservation.objects.filter(status=StockReservation.Status.EXPIRED).values_list('pk', flat=True)),
+            set(expired),
+        )
+        self.assertEqual(StockReservation.objects.get(pk=active).status, StockReservation.Status.ACTIVE)
+
+
+class InventoryReportTaskTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        supplier = SupplierFactory()
+        InventoryFactory(product=ProductFactory(supplier=supplier, price=Decimal("2.50")), quantity=4)
+        InventoryFactory(product=ProductFactory(supplier=supplier, price=Decimal("1.00")), quantity=20)
+
+    def test_result_references_the_artifact(self):
+        result = generate_inventory_report.apply(task_id="report-task").result
+
+        self.assertEqual(result, {
+            "artifact": "report_artifacts/report-task.json", "products": 2, "total_stock_value": "30.00",
+        })
+        report = read_inventory_report(result["artifact"])
+        self.assertEqual(report["total_stock_value"], Decimal("30.00"))
+        self.assertEqual(
+            [(item["inventory"], item["stock_value"], item["low_stock_alert"]) for item in report["inventory_levels"]],
+            [(4, Decimal("10.00"), True), (20, Decimal("20.00"), False)],
+        )
+        self.assertEqual(report["supplier_performance"][0]["total_inventory"], 24)
+
+    def test_pdf_is_built_from_the_artifact(self):
+        generate_inventory_report.apply(task_id="report-task")
+        path = generate_inventory_report_pdf.apply(args=["report-task"]).result
+        self.assertTrue(os.path.exists(os.path.join(self.media_root.name, path)))
+
+    def test_prune_report_artifacts(self):
+        generate_inventory_report.apply(task_id="report-task")
+        self.assertEqual(prune_report_artifacts(older_than_seconds=3600), 0)
+        self.assertEqual(prune_report_artifacts(older_than_seconds=0), 1)
+        self.assertFalse(default_storage.exists("report_artifacts/report-task.json"))
@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from inventory.models import Product, Supplier
+from inventory.search import ProductSearch
+from .factories import SupplierFactory, ProductFactory
+
+
+class ProductSearchTestCase(APITestCase):
+    def setUp(self):
+        self.supplier = SupplierFactory()
+        self.cable = ProductFactory(supplier=self.supplier, name="USB cable", description="Braided, two metres")
+        self.charger = ProductFactory(
+            supplier=self.supplier, name="Wall charger", description="Ships with a USB cable"
+        )
+        self.lamp = ProductFactory(supplier=self.supplier, name="Desk lamp", description="Warm white light")
+
+    def search(self, query, **params):
+        return self.client.get(reverse("inventory:product-search"), {"q": query, **params})
+
+    def names(self, response):
+        return [product["name"] for product in response.data["results"]]
+
+    def test_name_matches_rank_first(self):
+        response = self.search("usb cable")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(self.names(response), ["USB cable", "Wall charger"])
+
+    def test_stemming_and_prefix(self):
+        self.assertEqual(self.names(self.search("cables")), ["USB cable", "Wall charger"])
+        self.assertEqual(self.names(self.search("desk la")), ["Desk lamp"])
+        self.assertEqual(self.names(self.search("lamp ship")), [])
+
+    def test_index_follows_writes(self):
+        self.lamp.name = "Floor lamp"
+        self.lamp.save()
+        self.assertEqual(self.names(self.search("desk")), [])
+        self.assertEqual(self.names(self.search("floor")), ["Floor lamp"])
+
+        Product.objects.filter(pk=self.cable.pk).update(description="Coiled spring")
+        self.assertEqual(self.names(self.search("braided")), [])
+
+        self.charger.delete()
+        self.assertEqual(self.names(self.search("charger")), [])
+
+        Product.objects.bulk_create([
+            Product(name=f"Bulk kettle {number}", description="", price=Decimal("5.00"), supplier=self.supplier)
+            for number in range(3)
+        ])
+        self.assertEqual(self.search("kettle").data["count"], 3)
+
+    def test_pagination(self):
+        ProductFactory.create_batch(12, supplier=self.supplier, name="Spare bulb", description="")
+        response = self.search("bulb", page=2, page_size=5)
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertIsNotNone(response.data["next"])
+
+        # Equal ranks keep a stable order across pages
+        pages = [ProductSearch("bulb")[start:start + 5] for start in (0, 5, 10)]
+        ids = [product.pk for page in pages for product in page]
+        self.assertEqual(len(set(ids)), 12)
+
+    def test_excludes_suppliers_being_deleted(self):
+        Supplier.objects.filter(pk=self.supplier.pk).update(deleting=True)
+        self.assertEqual(self.search("usb").data["count"], 0)
+
+    def test_query_needs_a_word(self):
+        for params in ({}, {"q": ""}, {"q": "  -- "}):
+            response = self.client.get(reverse("inventory:product-search"), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Quotes and FTS operators are not passed through
+        self.assertEqual(self.search('"usb" OR NEAR(cable').status_code, status.HTTP_200_OK)
@@ -1,4 +1,6 @@
 import os
+import subprocess
+import sys
 from unittest.mock import patch, MagicMock
 from rest_framework.test import APITestCase
 from rest_framework import status
@@ -7,7 +9,9 @@ import pandas as pd
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from .factories import SupplierFactory, ProductFactory, InventoryFactory
-from django.test.utils import override_settings
+from django.test import SimpleTestCase
+from django.test.utils import override_settings, CaptureQueriesContext
+from django.db import connection
 
 
 class SupplierAPIViewTestCase(APITestCase):
@@ -33,9 +37,39 @@ class SupplierAPIViewTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["name"], "Updated Supplier")
 
-    def test_delete_supplier(self):
+    def test_deleting_flag_is_read_only(self):
+        response = self.client.patch(self.supplier_detail_url, {"deleting": True}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data["deleting"])
+        response = self.client.post(
+            reverse("inventory:supplier"), {"name": "Hidden", "contact_info": "x", "deleting": True}, format="json"
+        )
+        self.assertFalse(response.data["deleting"])
+        self.assertEqual(len(self.client.get(reverse("inventory:supplier")).data), 2)
+
+    @patch("inventory.views.delete_supplier.delay")
+    def test_delete_supplier(self, mock_delay):
+        mock_delay.return_value.id = "task-id"
+        product = ProductFactory(supplier=self.supplier)
         response = self.client.delete(self.supplier_detail_url)
-        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data, {"task_id": "task-id"})
+        mock_delay.assert_called_once_with(self.supplier.id)
+
+        # Hidden from reads while the task runs
+        self.assertEqual(self.client.get(self.supplier_detail_url).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse("inventory:product-detail", args=[product.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch("inventory.views.AsyncResult")
+    def test_supplier_deletion_status(self, mock_result):
+        mock_result.return_value.state = "PROGRESS"
+        mock_result.return_value.info = {"deleted_products": 1000, "total_products": 2500}
+        response = self.client.get(reverse("inventory:supplier-deletion", args=["task-id"]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            "task_id": "task-id", "status": "PROGRESS", "deleted_products": 1000, "total_products": 2500,
+        })
 
 
 class ProductAPIViewTestCase(APITestCase):
@@ -68,15 +102,52 @@ class ProductAPIViewTestCase(APITestCase):
             "description": self.product.description,
             "supplier_id": self.product.supplier.id,
         }
-        response = self.client.put(self.product_detail_url, data)
+        response = self.client.put(self.product_detail_url, data, HTTP_IF_MATCH='"1"')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["name"], "Updated Product")
         self.assertEqual(response.data["price"], "30.00")
+        self.assertEqual(response["ETag"], '"2"')
+
+    def test_get_product_etag(self):
+        response = self.client.get(self.product_detail_url)
+        self.assertEqual(response["ETag"], '"1"')
+        response = self.client.get(self.product_detail_url, {"fields": "name"})
+        self.assertEqual(response["ETag"], '"1"')
+
+    def test_update_product_requires_if_match(self):
+        response = self.client.patch(self.product_detail_url, {"name": "Renamed"})
+        self.assertEqual(response.status_code, status.HTTP_428_PRECONDITION_REQUIRED)
+
+    def test_update_product_with_stale_version(self):
+        response = self.client.patch(self.product_detail_url, {"name": "First"}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.patch(self.product_detail_url, {"name": "Second"}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, "First")
 
     def test_delete_product(self):
         response = self.client.delete(self.product_detail_url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_list_products_sparse_fields(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("inventory:product-list"), {"fields": "id,name,price"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["results"][0]), {"id", "name", "price"})
+        # The heavy description column should not be selected at all
+        self.assertFalse(any("description" in q["sql"] for q in ctx.captured_queries))
+
+    def test_retrieve_product_exclude_fields(self):
+        response = self.client.get(self.product_detail_url, {"exclude": "description,supplier"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {"id", "name", "price"})
+
+    def test_sparse_fields_unknown_field(self):
+        response = self.client.get(reverse("inventory:product-list"), {"fields": "name,bogus"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("bogus", response.data["fields"])
+
 
 class InventoryAPIViewTestCase(APITestCase):
     def setUp(self):
@@ -98,14 +169,144 @@ class InventoryAPIViewTestCase(APITestCase):
 
     def test_update_inventory(self):
         data = {"quantity": 50, "product_id": self.inventory.product.id}
-        response = self.client.put(self.inventory_detail_url, data)
+        etag = self.client.get(self.inventory_detail_url)["ETag"]
+        response = self.client.put(self.inventory_detail_url, data, HTTP_IF_MATCH=etag)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["quantity"], 50)
 
+    def test_adjust_invalidates_etag(self):
+        etag = self.client.get(self.inventory_detail_url)["ETag"]
+        self.client.post(reverse("inventory:inventory-adjust", args=[self.inventory.id]), {"delta": 1}, format="json")
+        response = self.client.patch(self.inventory_detail_url, {"quantity": 3}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
     def test_delete_inventory(self):
         response = self.client.delete(self.inventory_detail_url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+    def test_adjust_inventory(self):
+        url = reverse("inventory:inventory-adjust", args=[self.inventory.id])
+        response = self.client.post(url, {"delta": 5}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["quantity"], self.inventory.quantity + 5)
+
+    def test_adjust_inventory_oversell(self):
+        url = reverse("inventory:inventory-adjust", args=[self.inventory.id])
+        response = self.client.post(url, {"delta": -(self.inventory.quantity + 1)}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.inventory.refresh_from_db()
+        self.assertGreaterEqual(self.inventory.quantity, 0)
+
+    def test_adjust_inventory_not_found(self):
+        url = reverse("inventory:inventory-adjust", args=[999])
+        response = self.client.post(url, {"delta": 1}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_adjust_inventory_zero_delta(self):
+        url = reverse("inventory:inventory-adjust", args=[self.inventory.id])
+        response = self.client.post(url, {"delta": 0}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_adjust_inventory(self):
+        product_id = self.inventory.product.id
+        data = {"adjustments": [
+            {"product_id": product_id, "delta": 5},
+            {"product_id": product_id, "delta": -2},
+        ]}
+        response = self.client.post(reverse("inventory:inventory-batch-adjust"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["success_count"], 2)
+        self.assertEqual(response.data["results"][1]["quantity"], self.inventory.quantity + 3)
+
+    def test_batch_adjust_inventory_atomic_failure(self):
+        other = InventoryFactory(quantity=1)
+        data = {"adjustments": [
+            {"product_id": self.inventory.product.id, "delta": 1},
+            {"product_id": other.product.id, "delta": -2},
+        ]}
+        response = self.client.post(reverse("inventory:inventory-batch-adjust"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["results"][0]["status"], "rolled_back")
+        self.assertEqual(response.data["results"][1]["error"], "Insufficient stock")
+        quantity = self.inventory.quantity
+        self.inventory.refresh_from_db()
+        self.assertEqual(self.inventory.quantity, quantity)
+
+    def test_batch_adjust_inventory_partial(self):
+        data = {"mode": "partial", "adjustments": [
+            {"product_id": self.inventory.product.id, "delta": 1},
+            {"product_id": 999, "delta": 1},
+        ]}
+        response = self.client.post(reverse("inventory:inventory-batch-adjust"), data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["success_count"], 1)
+        self.assertEqual(response.data["results"][1]["error"], "Inventory not found")
+
+    def test_list_stock_movements(self):
+        inventory = InventoryFactory(quantity=5)
+        InventoryFactory._meta.model.objects.adjust_quantity(1, pk=inventory.id)
+        url = reverse("inventory:product-movements", args=[inventory.product.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(response.data["results"][0]["delta"], 1)
+
+        response = self.client.get(url, {"since": "not-a-date"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_inventory_sparse_fields(self):
+        response = self.client.get(reverse("inventory:inventory"), {"fields": "id,quantity"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{"id": self.inventory.id, "quantity": self.inventory.quantity}])
+
+
+class StockReservationAPITestCase(APITestCase):
+    def setUp(self):
+        self.inventory = InventoryFactory(quantity=5)
+        self.url = reverse("inventory:reservation-list")
+
+    def test_reserve_and_confirm(self):
+        response = self.client.post(
+            self.url, {"product_id": self.inventory.product_id, "quantity": 2, "ttl": 60}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], 1)
+        reservation_id = response.data["id"]
+
+        response = self.client.get(reverse("inventory:inventory-detail", args=[self.inventory.id]))
+        self.assertEqual((response.data["quantity"], response.data["reserved"], response.data["available"]), (5, 2, 3))
+        response = self.client.get(
+            reverse("inventory:inventory-detail", args=[self.inventory.id]), {"fields": "available"}
+        )
+        self.assertEqual(response.data, {"available": 3})
+
+        response = self.client.post(reverse("inventory:reservation-confirm", args=[reservation_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], 2)
+        response = self.client.post(reverse("inventory:reservation-release", args=[reservation_id]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_reserve_insufficient_stock(self):
+        response = self.client.post(self.url, {"product_id": self.inventory.product_id, "quantity": 6}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data, {"error": "Insufficient stock"})
+
+    def test_update_cannot_drop_quantity_below_reserved(self):
+        self.client.post(self.url, {"product_id": self.inventory.product_id, "quantity": 3}, format="json")
+        url = reverse("inventory:inventory-detail", args=[self.inventory.id])
+
+        response = self.client.patch(url, {"quantity": 2}, format="json", HTTP_IF_MATCH="*")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data, {"error": "Insufficient stock"})
+        response = self.client.patch(url, {"quantity": 3}, format="json", HTTP_IF_MATCH="*")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.inventory.refresh_from_db()
+        self.assertEqual((self.inventory.quantity, self.inventory.reserved), (3, 3))
+
+    def test_release_unknown_reservation(self):
+        response = self.client.post(reverse("inventory:reservation-release", args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
 
 class ProductCSVUploadTestCase(APITestCase):
     def setUp(self):
@@ -278,3 +479,191 @@ class SupplierProductInventoryAPIViewTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
         self.assertIn("error", response.data)
         self.assertEqual(response.data["error"], "Supplier not found")
+
+
+class BatchRetrieveAPIViewTestCase(APITestCase):
+    def setUp(self):
+        self.inventory1 = InventoryFactory(quantity=5)
+        self.inventory2 = InventoryFactory(quantity=7)
+        self.product_batch_url = reverse("inventory:product-batch")
+        self.inventory_batch_url = reverse("inventory:inventory-batch")
+
+    def test_batch_products_in_request_order(self):
+        product1, product2 = self.inventory1.product, self.inventory2.product
+        ids = f"{product2.id},999,{product1.id}"
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.product_batch_url, {"ids": ids})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(results[0]["name"], product2.name)
+        self.assertEqual(results[1], {"id": 999, "error": "Not found"})
+        self.assertEqual(results[2]["supplier"]["name"], product1.supplier.name)
+
+    def test_batch_inventory_post(self):
+        data = {"ids": [self.inventory2.id, self.inventory1.id]}
+        response = self.client.post(f"{self.inventory_batch_url}?fields=id,quantity", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [
+            {"id": self.inventory2.id, "quantity": 7},
+            {"id": self.inventory1.id, "quantity": 5},
+        ])
+
+    def test_batch_invalid_ids(self):
+        response = self.client.get(self.product_batch_url, {"ids": "1,abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_too_many_ids(self):
+        data = {"ids": list(range(1, 502))}
+        response = self.client.post(self.product_batch_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("ids", response.data)
+
+
+class BulkAPIViewTestCase(APITestCase):
+    def setUp(self):
+        self.supplier = SupplierFactory(name="Bulk Supplier")
+        self.products = [ProductFactory(supplier=self.supplier, name=f"Bulk {i}") for i in range(3)]
+        self.product_bulk_url = reverse("inventory:product-bulk")
+        self.supplier_bulk_url = reverse("inventory:supplier-bulk")
+
+    def test_bulk_create_products(self):
+        other_supplier = SupplierFactory()
+        data = [
+            {"name": f"New {i}", "description": "Bulk", "price": "9.99",
+             "supplier_id": [self.supplier.id, other_supplier.id][i % 2]}
+            for i in range(20)
+        ]
+        # One supplier lookup, one INSERT and one change feed INSERT, however many items are sent
+        with self.assertNumQueries(5):
+            response = self.client.post(self.product_bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 20)
+        self.assertEqual(response.data[1]["supplier"]["id"], other_supplier.id)
+        self.assertEqual(ProductFactory._meta.model.objects.count(), 23)
+
+    def test_bulk_create_products_per_item_errors(self):
+        data = [
+            {"name": "Good", "description": "Bulk", "price": "9.99", "supplier_id": self.supplier.id},
+            {"name": "Bad supplier", "description": "Bulk", "price": "9.99", "supplier_id": 999},
+        ]
+        response = self.client.post(self.product_bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("supplier_id", response.data[1])
+        self.assertEqual(ProductFactory._meta.model.objects.count(), 3)
+
+    def test_bulk_update_products(self):
+        data = [
+            {"id": self.products[0].id, "price": "1.00"},
+            {"id": self.products[2].id, "name": "Renamed", "price": "2.00"},
+        ]
+        response = self.client.patch(self.product_bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[1]["name"], "Renamed")
+        self.products[2].refresh_from_db()
+        self.assertEqual(self.products[2].name, "Renamed")
+        self.assertEqual(str(self.products[2].price), "2.00")
+        self.assertEqual(self.products[2].version, 2)
+
+    def test_bulk_update_products_with_versions(self):
+        data = [
+            {"id": self.products[0].id, "price": "1.00", "version": 1},
+            {"id": self.products[1].id, "name": "Renamed"},
+        ]
+        response = self.client.patch(self.product_bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data], [self.products[0].id, self.products[1].id])
+
+        # Both products are now at version 2
+        data = [
+            {"id": self.products[0].id, "price": "3.00", "version": 1},
+            {"id": self.products[1].id, "price": "3.00", "version": 2},
+            {"id": self.products[2].id, "price": "3.00"},
+        ]
+        response = self.client.patch(self.product_bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(response.data, [{"version": ["Has changed since version 1."]}, {}, {}])
+        # Nothing was written, including the items without a conflict
+        self.assertFalse(ProductFactory._meta.model.objects.filter(price="3.00").exists())
+
+        response = self.client.patch(
+            self.product_bulk_url, [{"id": self.products[0].id, "version": "x"}], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("version", response.data[0])
+
+    def test_bulk_update_products_unknown_id(self):
+        data = [{"id": self.products[0].id, "price": "1.00"}, {"id": 999, "price": "2.00"}]
+        response = self.client.patch(self.product_bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[1]["id"], ["Not found."])
+
+    def test_bulk_delete_products(self):
+        inventory = InventoryFactory(product=self.products[0], quantity=5)
+        ids = [self.products[0].id, self.products[1].id]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(self.product_bulk_url, {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["deleted"], 2)
+        self.assertEqual(ProductFactory._meta.model.objects.count(), 1)
+        self.assertFalse(InventoryFactory._meta.model.objects.filter(pk=inventory.pk).exists())
+        # Set-based: nothing is loaded to be deleted
+        self.assertFalse([q["sql"] for q in queries if q["sql"].lstrip().upper().startswith("SELECT")])
+
+    def test_bulk_delete_skips_products_of_deleting_suppliers(self):
+        deleting = ProductFactory(supplier=SupplierFactory(deleting=True))
+        response = self.client.delete(self.product_bulk_url, {"ids": [deleting.id]}, format="json")
+        self.assertEqual(response.data["deleted"], 0)
+        self.assertTrue(ProductFactory._meta.model.objects.filter(pk=deleting.pk).exists())
+
+    @patch("inventory.views.delete_supplier.delay")
+    def test_bulk_delete_suppliers_in_background(self, mock_delay):
+        mock_delay.return_value.id = "task-id"
+        other = SupplierFactory()
+        response = self.client.delete(self.supplier_bulk_url, {"ids": [self.supplier.id, other.id, 999]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data, {"tasks": [
+            {"id": self.supplier.id, "task_id": "task-id"}, {"id": other.id, "task_id": "task-id"},
+        ]})
+        self.assertEqual(mock_delay.call_count, 2)
+
+        # Hidden from reads, products included, while the tasks run
+        self.assertFalse(SupplierFactory._meta.model.objects.filter(pk__in=[self.supplier.id, other.id]).exists())
+        response = self.client.get(reverse("inventory:product-detail", args=[self.products[0].id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_create_suppliers_duplicate_names(self):
+        data = [
+            {"name": "Fresh", "contact_info": "a"},
+            {"name": "bulk supplier", "contact_info": "b"},
+            {"name": "FRESH", "contact_info": "c"},
+        ]
+        response = self.client.post(self.supplier_bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("name", response.data[1])
+        self.assertIn("name", response.data[2])
+
+    def test_bulk_update_suppliers(self):
+        data = [{"id": self.supplier.id, "name": "BULK SUPPLIER", "contact_info": "Updated"}]
+        response = self.client.patch(self.supplier_bulk_url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["contact_info"], "Updated")
+
+
+class LazyImportTestCase(SimpleTestCase):
+    def test_heavy_dependencies_are_not_imported_at_startup(self):
+        # A fresh interpreter, since this one has imported them for other tests
+        script = (
+            "import sys, django; django.setup()\n"
+            "from django.urls import get_resolver; get_resolver().url_patterns\n"
+            "import inventory.tasks, inventory_api.celery\n"
+            "print(','.join(m for m in ('pandas', 'numpy', 'reportlab') if m in sys.modules))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "inventory_api.settings"},
+        )
+        self.assertEqual(result.stdout.strip(), "")
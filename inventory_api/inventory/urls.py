@@ -1,17 +1,50 @@
 from django.urls import path
 
-from . import views
+from . import views, async_views
 
 app_name = 'inventory'
 
 urlpatterns = [
     path('suppliers/', views.SupplierAPIView.as_view(), name="supplier"),
     path('suppliers/<int:pk>/', views.SupplierDetailAPIView.as_view(), name="supplier-detail"),
+    path('suppliers/bulk/', views.SupplierBulkAPIView.as_view(), name="supplier-bulk"),
+    path('suppliers/deletions/<str:task_id>/', views.SupplierDeletionStatusAPIView.as_view(), name="supplier-deletion"),
     path('products/', views.ProductListCreateAPIView.as_view(), name="product-list"),
+    path('products/search/', views.ProductSearchAPIView.as_view(), name="product-search"),
     path('products/<int:pk>/', views.ProductDetailAPIView.as_view(), name="product-detail"),
+    path('products/<int:pk>/stock/', views.ProductStockAPIView.as_view(), name="product-stock"),
+    path('products/<int:pk>/movements/', views.StockMovementListAPIView.as_view(), name="product-movements"),
+    path('products/bulk/', views.ProductBulkAPIView.as_view(), name="product-bulk"),
+    path('products/batch/', views.ProductBatchAPIView.as_view(), name="product-batch"),
+    path('locations/', views.LocationAPIView.as_view(), name="location"),
     path('inventory/', views.InventoryAPIView.as_view(), name="inventory"),
     path('inventory/<int:pk>/', views.InventoryDetailAPIView.as_view(), name="inventory-detail"),
+    path('inventory/<int:pk>/adjust/', views.InventoryAdjustAPIView.as_view(), name="inventory-adjust"),
+    path('inventory/batch-adjust/', views.InventoryBatchAdjustAPIView.as_view(), name="inventory-batch-adjust"),
+    path('inventory/batch/', views.InventoryBatchAPIView.as_view(), name="inventory-batch"),
+    path('inventory/reservations/', views.StockReservationAPIView.as_view(), name="reservation-list"),
+    path('inventory/reservations/<int:pk>/', views.StockReservationDetailAPIView.as_view(), name="reservation-detail"),
+    path(
+        'inventory/reservations/<int:pk>/confirm/',
+        views.StockReservationConfirmAPIView.as_view(),
+        name="reservation-confirm"
+    ),
+    path(
+        'inventory/reservations/<int:pk>/release/',
+        views.StockReservationReleaseAPIView.as_view(),
+        name="reservation-release"
+    ),
+    path('changes/', views.ChangeFeedAPIView.as_view(), name="change-feed"),
+    path('analytics/stock-value/', views.StockValueTrendAPIView.as_view(), name="analytics-stock-value"),
+    path('analytics/turnover/', views.TurnoverAPIView.as_view(), name="analytics-turnover"),
+    path('replenishment/', views.ReplenishmentAPIView.as_view(), name="replenishment"),
     path('products/upload-csv/', views.ProductCSVUploadView.as_view(), name='product-upload-csv'),
     path('inventory-report/', views.InventoryReportView.as_view(), name='inventory-report'),
     path('suppliers/<int:pk>/products/', views.SupplierProductInventoryAPIView.as_view(), name='supplier-products'),
+
+    # Async read endpoints, intended to be served through the ASGI entry point
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('async/inventory/<int:pk>/', async_views.inventory_detail, name='async-inventory-detail'),
+    path('async/suppliers/<int:pk>/products/', async_views.supplier_products, name='async-supplier-products'),
 ]
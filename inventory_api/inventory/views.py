@@ -2,8 +2,10 @@ from time import sleep
 from decimal import Decimal
 import os
 import logging
-import pandas as pd
+import redis
 from rest_framework.generics import (
+    ListAPIView,
+    RetrieveAPIView,
     ListCreateAPIView,
     RetrieveUpdateDestroyAPIView,
     GenericAPIView
@@ -13,19 +15,53 @@ from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from django.utils.dateparse import parse_datetime
 from django.db import transaction
-from drf_spectacular.utils import extend_schema
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from celery.result import AsyncResult
 from django.conf import settings
 
-from .tasks import generate_inventory_report, generate_inventory_report_pdf
-from .models import Product, Inventory, Supplier
+from inventory_api import metrics
+from .tasks import generate_inventory_report, generate_inventory_report_pdf, delete_supplier
+from . import hot_stock
+from .search import ProductSearch
+from .models import (
+    Product,
+    Inventory,
+    Supplier,
+    StockMovement,
+    StockReservation,
+    Change,
+    ReplenishmentForecast,
+    Location,
+    default_location,
+    InsufficientStockError,
+    HotInventoryError,
+    ReservationError,
+    VersionConflictError,
+)
 from .serializers import (
     ProductSerializer,
     InventorySerializer,
+    InventoryAdjustSerializer,
+    InventoryBatchAdjustSerializer,
+    StockMovementSerializer,
+    StockReservationSerializer,
     SupplierSerializer,
     ProductCSVUploadSerializer,
     ProductCSVResponseSerializer,
+    BatchRetrieveSerializer,
+    ChangeFeedQuerySerializer,
+    AnalyticsQuerySerializer,
+    ProductSearchQuerySerializer,
+    ReplenishmentForecastSerializer,
+    ReplenishmentQuerySerializer,
+    LocationSerializer,
+    ProductStockSerializer,
+    BulkVersionConflictError,
+    serializer_field_paths,
 )
 
 
@@ -44,8 +80,147 @@ class CustomPagination(PageNumberPagination):
     max_page_size = 50  # Maximum page size to prevent large responses
 
 
+class SparseFieldsetMixin:
+    """
+    Adds `?fields=` and `?exclude=` support to GET requests.
+
+    The serializer output is trimmed to the requested fields and the queryset
+    only loads the columns (and joins) those fields need.
+    """
+    sparse_fieldset_methods = ('GET',)
+    sparse_fieldset_always_load = ()  # Columns loaded even when not requested
+
+    def get_sparse_fieldset(self):
+        """
+        Parse the comma-separated `fields` and `exclude` query parameters.
+        """
+        if self.request is None or self.request.method not in self.sparse_fieldset_methods:
+            return None, None
+
+        def parse(param):
+            value = self.request.query_params.get(param)
+            if value is None:
+                return None
+            return [name.strip() for name in value.split(',') if name.strip()]
+
+        return parse('fields'), parse('exclude')
+
+    def get_serializer(self, *args, **kwargs):
+        fields, exclude = self.get_sparse_fieldset()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        if exclude is not None:
+            kwargs.setdefault('exclude', exclude)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields, exclude = self.get_sparse_fieldset()
+        if fields is None and exclude is None:
+            return queryset
+
+        # Build the column list from the trimmed serializer so only the
+        # requested data is fetched; excluded columns end up deferred
+        serializer = self.get_serializer_class()(fields=fields, exclude=exclude)
+        relations, columns = serializer_field_paths(serializer)
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns, *self.sparse_fieldset_always_load)
+
+
+class HotStockMixin:
+    """
+    Adds the pending Redis deltas of hot SKUs to the inventory quantities
+    returned by read requests, so they match what adjustments see.
+    """
+
+    def get_queryset(self):
+        return hot_stock.annotate_hot_state(super().get_queryset())
+
+    def get_serializer(self, *args, **kwargs):
+        if args and 'data' not in kwargs:
+            instances = args[0]
+            if kwargs.get('many'):
+                instances = list(instances)
+                args = (instances, *args[1:])
+            else:
+                instances = [instances]
+            hot_stock.merge_pending_quantities(instances)
+        return super().get_serializer(*args, **kwargs)
+
+
+def parse_if_match(header):
+    """
+    Parse an If-Match header into a set of versions, or None for `*`.
+    Weak tags are accepted because compression marks ETags as weak.
+    """
+    versions = set()
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return None
+        tag = tag.removeprefix('W/').strip('"')
+        if tag.isdigit():
+            versions.add(int(tag))
+    return versions
+
+
+IF_MATCH_PARAMETER = OpenApiParameter(
+    'If-Match', str, OpenApiParameter.HEADER, required=True,
+    description="ETag of the version being updated, as returned by GET",
+)
+
+
+class ConditionalUpdateMixin:
+    """
+    Optimistic concurrency control for detail views of versioned models.
+
+    GET and successful PUT/PATCH responses carry the object's version as an
+    ETag. PUT and PATCH must send it back in `If-Match` (428 otherwise) and
+    fail with 412 Precondition Failed if the object has changed since. The
+    version is checked by the UPDATE itself, so no rows are locked.
+    """
+    sparse_fieldset_always_load = ('version',)
+
+    def get_object(self):
+        self.versioned_object = super().get_object()
+        return self.versioned_object
+
+    @extend_schema(parameters=[IF_MATCH_PARAMETER])
+    def put(self, request, *args, **kwargs):
+        return super().put(request, *args, **kwargs)
+
+    @extend_schema(parameters=[IF_MATCH_PARAMETER])
+    def patch(self, request, *args, **kwargs):
+        return super().patch(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        if_match = request.headers.get('If-Match')
+        if not if_match:
+            return Response({"error": "If-Match header required"}, status=status.HTTP_428_PRECONDITION_REQUIRED)
+        self.if_match_versions = parse_if_match(if_match)
+        try:
+            return super().update(request, *args, **kwargs)
+        except VersionConflictError:
+            self.versioned_object = None
+            return Response({"error": "Version mismatch"}, status=status.HTTP_412_PRECONDITION_FAILED)
+
+    def perform_update(self, serializer):
+        # Fail early on a stale version; the UPDATE catches any race after this
+        if self.if_match_versions is not None and serializer.instance.version not in self.if_match_versions:
+            raise VersionConflictError()
+        super().perform_update(serializer)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        obj = getattr(self, 'versioned_object', None)
+        if obj is not None and request.method != 'DELETE' and status.is_success(response.status_code):
+            response['ETag'] = f'"{obj.version}"'
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
 # Generic Detail View for reuse
-class GenericDetailAPIView(RetrieveUpdateDestroyAPIView):
+class GenericDetailAPIView(SparseFieldsetMixin, RetrieveUpdateDestroyAPIView):
     """
     A reusable base class for handling GET, PUT, PATCH, 
     and DELETE requests on a single object.
@@ -53,8 +228,20 @@ class GenericDetailAPIView(RetrieveUpdateDestroyAPIView):
     pass
 
 
+def schedule_supplier_deletion(supplier_ids):
+    """
+    Hide the suppliers right away and queue a `delete_supplier` task for
+    each. Returns `{supplier_id: task_id}`.
+    """
+    with transaction.atomic():
+        Supplier.all_objects.filter(pk__in=supplier_ids).update(deleting=True)
+        # The suppliers are gone as far as readers can tell
+        Change.objects.record(Supplier, supplier_ids, Change.Action.DELETED)
+    return {supplier_id: delete_supplier.delay(supplier_id).id for supplier_id in supplier_ids}
+
+
 # Supplier Views
-class SupplierAPIView(ListCreateAPIView):
+class SupplierAPIView(SparseFieldsetMixin, ListCreateAPIView):
     """
     Handles GET and POST requests for Supplier objects.
 
@@ -71,22 +258,44 @@ class SupplierDetailAPIView(GenericDetailAPIView):
 
     - GET: Retrieve a single supplier by its ID.
     - PUT/PATCH: Update an existing supplier's details.
-    - DELETE: Remove a supplier from the database.
+    - DELETE: Hide the supplier right away and delete it, with its products
+      and their inventory, in a background task. Responds 202 with the id
+      of the task, whose progress is at `suppliers/deletions/<task_id>/`.
     """
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
 
+    def destroy(self, request, *args, **kwargs):
+        supplier = self.get_object()
+        task_ids = schedule_supplier_deletion([supplier.pk])
+        return Response({"task_id": task_ids[supplier.pk]}, status=status.HTTP_202_ACCEPTED)
+
+
+class SupplierDeletionStatusAPIView(APIView):
+    """
+    Reports the progress of a background supplier deletion.
+    """
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request, task_id):
+        result = AsyncResult(task_id)
+        response_data = {"task_id": task_id, "status": result.state}
+        if isinstance(result.info, dict):
+            response_data.update(result.info)
+        return Response(response_data, status=status.HTTP_200_OK)
+
 
 # Product Views
-class ProductListCreateAPIView(ListCreateAPIView):
+class ProductListCreateAPIView(SparseFieldsetMixin, ListCreateAPIView):
     """
     Handles GET and POST requests for Product objects.
 
     - GET: Retrieve a paginated list of products.
-           Supports filtering by 'name', 'price', and 'supplier__name'.
+           Supports filtering by 'name', 'price', and 'supplier__name',
+           and sparse fieldsets via `?fields=` / `?exclude=`.
     - POST: Create a new product.
     """
-    queryset = Product.objects.select_related('supplier').order_by("name")
+    queryset = Product.objects.filter(supplier__deleting=False).select_related('supplier').order_by("name")
     serializer_class = ProductSerializer
 
     def get(self, request, *args, **kwargs):
@@ -107,73 +316,535 @@ class ProductListCreateAPIView(ListCreateAPIView):
         return super().post(request, *args, **kwargs)
 
 
-class ProductDetailAPIView(GenericDetailAPIView):
+class ProductStockAPIView(GenericAPIView):
+    """
+    Retrieves the stock of a product across every location.
+
+    - GET: Quantity, reserved and available units summed over all locations,
+      with the figures of each location. Pending hot-SKU deltas are included.
+    """
+    serializer_class = ProductStockSerializer
+
+    def get(self, request, pk):
+        if not Product.objects.filter(pk=pk, supplier__deleting=False).exists():
+            return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        inventories = list(hot_stock.annotate_hot_state(
+            Inventory.objects.filter(product_id=pk).order_by('location_id')
+        ))
+        hot_stock.merge_pending_quantities(inventories)
+
+        locations = [
+            {
+                'location': inventory.location_id,
+                'quantity': inventory.quantity,
+                'reserved': inventory.reserved,
+                'available': inventory.available,
+            }
+            for inventory in inventories
+        ]
+        serializer = self.get_serializer({
+            'product_id': pk,
+            'quantity': sum(item['quantity'] for item in locations),
+            'reserved': sum(item['reserved'] for item in locations),
+            'available': sum(item['available'] for item in locations),
+            'locations': locations,
+        })
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class ProductSearchAPIView(GenericAPIView):
+    """
+    Full-text search over product names and descriptions.
+
+    - GET: `?q=usb cab` returns a paginated list of the products matching
+      every word, best match first; name matches rank above description
+      matches and the last word also matches as a prefix. Products of
+      suppliers being deleted are left out.
+    """
+    serializer_class = ProductSerializer
+    pagination_class = CustomPagination
+
+    @extend_schema(parameters=[ProductSearchQuerySerializer])
+    def get(self, request, *args, **kwargs):
+        query = ProductSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        page = self.paginate_queryset(ProductSearch(query.validated_data['q']))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class ProductDetailAPIView(ConditionalUpdateMixin, GenericDetailAPIView):
     """
     Handles GET, PUT, PATCH, and DELETE requests for a specific product.
 
-    - GET: Retrieve a single product by its ID.
-    - PUT/PATCH: Update an existing product's details.
+    - GET: Retrieve a single product by its ID, with its version as an ETag.
+    - PUT/PATCH: Update an existing product's details. Requires `If-Match`.
     - DELETE: Remove a product from the database.
     """
-    queryset = Product.objects.select_related('supplier')
+    queryset = Product.objects.filter(supplier__deleting=False).select_related('supplier')
     serializer_class = ProductSerializer
 
 
+# Location Views
+class LocationAPIView(ListCreateAPIView):
+    """
+    Handles GET and POST requests for Location objects.
+
+    - GET: Retrieve a list of all locations.
+    - POST: Create a new location.
+    """
+    queryset = Location.objects.order_by('code')
+    serializer_class = LocationSerializer
+
+
 # Inventory Views
-class InventoryAPIView(ListCreateAPIView):
+class InventoryAPIView(HotStockMixin, SparseFieldsetMixin, ListCreateAPIView):
     """
     Handles GET and POST requests for Inventory objects.
 
-    - GET: Retrieve a list of inventory levels for all products.
+    - GET: Retrieve a list of inventory levels for all products, one per
+      location. Supports `?product=` and `?location=` filters.
     - POST: Create or update inventory levels for a specific product.
     """
-    queryset = Inventory.objects.select_related('product')  # Optimize query
+    queryset = Inventory.objects.filter(product__supplier__deleting=False) \
+        .select_related('product__supplier')  # Optimize query
     serializer_class = InventorySerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ('product', 'location')
 
 
-class InventoryDetailAPIView(GenericDetailAPIView):
+class InventoryDetailAPIView(HotStockMixin, ConditionalUpdateMixin, GenericDetailAPIView):
     """
     Handles GET, PUT, PATCH, and DELETE requests for a specific inventory.
 
-    - GET: Retrieve inventory details for a specific product.
-    - PUT/PATCH: Update the inventory level for a product.
+    - GET: Retrieve inventory details for a specific product, with its version as an ETag.
+    - PUT/PATCH: Update the inventory level for a product. Requires `If-Match`.
+      The quantity can't go below the reserved quantity, and the quantity of
+      a hot SKU can only be changed through `adjust/` (409 otherwise).
+      Turning `is_hot` off fails with 409 until its pending deltas are flushed.
     - DELETE: Remove inventory details for a product.
     """
-    queryset = Inventory.objects.select_related('product')
+    queryset = Inventory.objects.filter(product__supplier__deleting=False).select_related('product__supplier')
+    serializer_class = InventorySerializer
+
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except HotInventoryError:
+            self.versioned_object = None
+            return Response({"error": "Inventory is in hot-SKU mode"}, status=status.HTTP_409_CONFLICT)
+        except hot_stock.PendingDeltasError:
+            self.versioned_object = None
+            return Response(
+                {"error": "Hot SKU has pending changes; retry after the next flush"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except InsufficientStockError:
+            self.versioned_object = None
+            return Response({"error": "Insufficient stock"}, status=status.HTTP_409_CONFLICT)
+        except redis.RedisError:
+            self.versioned_object = None
+            logger.exception("Could not check the pending hot SKU deltas of inventory %s.", kwargs.get('pk'))
+            return Response({"error": "Stock service unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def perform_update(self, serializer):
+        if not (serializer.instance.is_hot and serializer.validated_data.get('is_hot') is False):
+            return super().perform_update(serializer)
+        # Once the row isn't hot, writes go to the database directly, so its
+        # quantity must already include every delta held in Redis. Checked
+        # after the UPDATE, whose row lock holds off flushes of this row.
+        with transaction.atomic():
+            super().perform_update(serializer)
+            instance = serializer.instance
+            if hot_stock.has_pending_deltas(instance.location_id, instance.product_id):
+                raise hot_stock.PendingDeltasError()
+
+
+class InventoryAdjustAPIView(GenericAPIView):
+    """
+    Applies a signed stock movement to an inventory level.
+
+    - POST: `{"delta": -3}` removes three units, `{"delta": 5}` adds five.
+
+    The change is a single conditional UPDATE, so concurrent adjustments
+    never overwrite each other. Adjustments that would take the quantity
+    below the reserved quantity, i.e. more than the available stock, are
+    rejected with 409 Conflict. Inventory in hot-SKU mode is
+    adjusted in Redis instead (see `inventory.hot_stock`).
+    """
+    serializer_class = InventoryAdjustSerializer
+
+    def post(self, request, pk):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            quantity = hot_stock.adjust_quantity(serializer.validated_data['delta'], pk=pk)
+        except Inventory.DoesNotExist:
+            return Response({"error": "Inventory not found"}, status=status.HTTP_404_NOT_FOUND)
+        except InsufficientStockError:
+            return Response({"error": "Insufficient stock"}, status=status.HTTP_409_CONFLICT)
+        except redis.RedisError:
+            logger.exception("Hot SKU adjustment of inventory %s failed.", pk)
+            return Response({"error": "Stock service unavailable"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return Response({"id": pk, "quantity": quantity}, status=status.HTTP_200_OK)
+
+
+class StockReservationAPIView(GenericAPIView):
+    """
+    Holds stock for a limited time, e.g. during checkout.
+
+    - POST: `{"product_id": 1, "quantity": 2, "ttl": 900}` reserves two units
+      for 15 minutes at the default location, or at `"location"`. Reserved units don't count as available until the
+      hold is confirmed, released or expires. Returns 409 if fewer units
+      are available, or if the inventory is in hot-SKU mode.
+    """
+    serializer_class = StockReservationSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        try:
+            reservation_id = StockReservation.objects.reserve(
+                data['product_id'], data['quantity'], ttl=data.get('ttl'),
+                location_id=data['location'].pk if data.get('location') else None,
+            )
+        except Inventory.DoesNotExist:
+            return Response({"error": "Inventory not found"}, status=status.HTTP_404_NOT_FOUND)
+        except InsufficientStockError:
+            return Response({"error": "Insufficient stock"}, status=status.HTTP_409_CONFLICT)
+        except HotInventoryError:
+            return Response({"error": "Inventory is in hot-SKU mode"}, status=status.HTTP_409_CONFLICT)
+
+        reservation = StockReservation.objects.get(pk=reservation_id)
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_201_CREATED)
+
+
+class StockReservationDetailAPIView(RetrieveAPIView):
+    """
+    Retrieves a stock reservation and its status.
+    """
+    queryset = StockReservation.objects.all()
+    serializer_class = StockReservationSerializer
+
+
+class StockReservationTransitionAPIView(GenericAPIView):
+    """
+    A reusable base class for finishing an active reservation with
+    `StockReservation.objects.<transition>()`. Returns 409 if the
+    reservation was already confirmed, released or has expired.
+    """
+    transition = None
+    serializer_class = StockReservationSerializer
+
+    def post(self, request, pk):
+        try:
+            getattr(StockReservation.objects, self.transition)(pk)
+        except StockReservation.DoesNotExist:
+            return Response({"error": "Reservation not found"}, status=status.HTTP_404_NOT_FOUND)
+        except ReservationError:
+            return Response({"error": "Reservation is not active"}, status=status.HTTP_409_CONFLICT)
+
+        reservation = StockReservation.objects.get(pk=pk)
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_200_OK)
+
+
+class StockReservationConfirmAPIView(StockReservationTransitionAPIView):
+    """
+    Confirms a reservation: the held units are sold and leave the inventory.
+    """
+    transition = 'confirm'
+
+
+class StockReservationReleaseAPIView(StockReservationTransitionAPIView):
+    """
+    Releases a reservation: the held units become available again.
+    """
+    transition = 'release'
+
+
+class StockMovementListAPIView(ListAPIView):
+    """
+    Lists the stock movement ledger of a product, newest first.
+
+    - GET: Supports `?since=` and `?until=` ISO 8601 timestamps.
+    """
+    serializer_class = StockMovementSerializer
+    pagination_class = CustomPagination
+
+    def get_queryset(self):
+        queryset = StockMovement.objects.filter(product_id=self.kwargs['pk']).order_by('-created_at', '-id')
+        for param, lookup in (('since', 'created_at__gte'), ('until', 'created_at__lte')):
+            value = self.request.query_params.get(param)
+            if value:
+                timestamp = parse_datetime(value)
+                if timestamp is None:
+                    raise ValidationError({param: "Enter a valid ISO 8601 timestamp."})
+                queryset = queryset.filter(**{lookup: timestamp})
+        return queryset
+
+
+class InventoryBatchAdjustAPIView(GenericAPIView):
+    """
+    Applies many stock movements in one request and one transaction.
+
+    - POST: `{"mode": "atomic" | "partial", "location": "main", "adjustments": [{"product_id": 1, "delta": -3}, ...]}`
+
+    Movements for the same product are netted, and every 500 products are
+    applied with a single conditional UPDATE. Hot SKUs are rejected, since
+    their adjustments go through Redis (use `inventory/<id>/adjust/`). In `atomic` mode (the default)
+    one rejected movement rolls back the whole batch and the response is 409.
+    In `partial` mode the valid movements are kept. Either way the response
+    lists the outcome of every movement in request order.
+    """
+    serializer_class = InventoryBatchAdjustSerializer
+    max_batch_size = 5000  # Maximum number of movements per request
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['max_batch_size'] = self.max_batch_size
+        return context
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        adjustments = serializer.validated_data['adjustments']
+        atomic = serializer.validated_data['mode'] == InventoryBatchAdjustSerializer.MODE_ATOMIC
+
+        # Net the deltas per product so each row is updated once
+        deltas = {}
+        for item in adjustments:
+            deltas[item['product_id']] = deltas.get(item['product_id'], 0) + item['delta']
+
+        location = serializer.validated_data.get('location')
+        quantities, errors = Inventory.objects.bulk_adjust_quantity(
+            deltas, atomic=atomic, location_id=location.pk if location else None, exclude_hot=True
+        )
+
+        results = []
+        for item in adjustments:
+            product_id = item['product_id']
+            if product_id in errors:
+                results.append({**item, "status": "error", "error": errors[product_id]})
+            elif product_id in quantities:
+                results.append({**item, "status": "ok", "quantity": quantities[product_id]})
+            else:
+                results.append({**item, "status": "rolled_back"})
+
+        response_data = {
+            "success_count": sum(1 for result in results if result["status"] == "ok"),
+            "error_count": sum(1 for result in results if result["status"] == "error"),
+            "results": results,
+        }
+        response_status = status.HTTP_409_CONFLICT if atomic and errors else status.HTTP_200_OK
+        return Response(response_data, status=response_status)
+
+
+class BatchRetrieveAPIView(SparseFieldsetMixin, GenericAPIView):
+    """
+    A reusable base class for fetching many objects by id in one request.
+
+    - GET: Pass the ids as a comma-separated `?ids=1,2,3` query parameter.
+    - POST: Pass the ids in the request body as `{"ids": [1, 2, 3]}`.
+
+    All ids are resolved with a single query and the results are returned
+    in request order. Ids that do not exist are returned as
+    `{"id": <id>, "error": "Not found"}`.
+    """
+    max_batch_size = 500  # Maximum number of ids per request
+    sparse_fieldset_methods = ('GET', 'POST')
+
+    def get_batch_ids(self, data):
+        serializer = BatchRetrieveSerializer(
+            data=data,
+            context={'max_batch_size': self.max_batch_size}
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['ids']
+
+    def batch_response(self, ids):
+        # One query for every requested id, joined with its relations
+        found = self.get_queryset().in_bulk(ids)
+
+        objects = list(found.values())
+        serialized = dict(zip(
+            (obj.pk for obj in objects),
+            self.get_serializer(objects, many=True).data
+        ))
+
+        results = [
+            serialized[pk] if pk in serialized else {"id": pk, "error": "Not found"}
+            for pk in ids
+        ]
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    @extend_schema(parameters=[
+        OpenApiParameter('ids', str, description="Comma-separated list of ids", required=True),
+    ])
+    def get(self, request, *args, **kwargs):
+        raw_ids = request.query_params.get('ids', '')
+        ids = self.get_batch_ids({'ids': [pk for pk in raw_ids.split(',') if pk.strip()]})
+        return self.batch_response(ids)
+
+    @extend_schema(request=BatchRetrieveSerializer)
+    def post(self, request, *args, **kwargs):
+        ids = self.get_batch_ids(request.data)
+        return self.batch_response(ids)
+
+
+class BulkAPIView(GenericAPIView):
+    """
+    A reusable base class for bulk writes with list payloads.
+
+    - POST: Create every object in a list, with one bulk INSERT.
+    - PATCH: Update a list of objects identified by `id`, with one bulk UPDATE.
+      Items of versioned models may send the `version` they were read at; if
+      any of them changed since, nothing is written and the response is 412
+      with a `version` error for each conflicting item.
+    - DELETE: Delete the objects in `{"ids": [1, 2, 3]}` with set-based DELETEs.
+
+    Requests are all-or-nothing: if any item is invalid nothing is written
+    and the response lists the errors of each item in request order.
+    """
+    max_batch_size = 1000  # Maximum number of items per request
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data, many=True, max_length=self.max_batch_size)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def patch(self, request, *args, **kwargs):
+        # Load every object being updated with one query
+        ids = []
+        for item in request.data[:self.max_batch_size] if isinstance(request.data, list) else []:
+            try:
+                ids.append(int(item['id']))
+            except (KeyError, TypeError, ValueError):
+                pass
+        instances = list(self.get_queryset().in_bulk(ids).values())
+
+        serializer = self.get_serializer(
+            instances, data=request.data, many=True, partial=True, max_length=self.max_batch_size
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except BulkVersionConflictError as error:
+            return Response(error.errors, status=status.HTTP_412_PRECONDITION_FAILED)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        ids_serializer = BatchRetrieveSerializer(
+            data=request.data, context={'max_batch_size': self.max_batch_size}
+        )
+        ids_serializer.is_valid(raise_exception=True)
+
+        queryset = self.get_queryset().filter(pk__in=ids_serializer.validated_data['ids'])
+        return Response({"deleted": self.perform_bulk_delete(queryset)}, status=status.HTTP_200_OK)
+
+    def perform_bulk_delete(self, queryset):
+        """
+        Delete the objects in `queryset` and return how many were deleted.
+        """
+        with transaction.atomic():
+            Change.objects.record_deletion(queryset)
+            _, deleted = queryset.delete()
+        return deleted.get(queryset.model._meta.label, 0)
+
+
+class ProductBulkAPIView(BulkAPIView):
+    """
+    Creates, updates and deletes products in bulk. Products of suppliers
+    being deleted are left to the background deletion.
+    """
+    queryset = Product.objects.filter(supplier__deleting=False).select_related('supplier')
+    serializer_class = ProductSerializer
+
+    def perform_bulk_delete(self, queryset):
+        # Set-based, like the background supplier deletion: the delete
+        # collector would load every product and its inventory first
+        return queryset.bulk_delete()
+
+
+class SupplierBulkAPIView(BulkAPIView):
+    """
+    Creates, updates and deletes suppliers in bulk.
+
+    DELETE hides the suppliers right away and deletes each one, with its
+    products and their inventory, in a background task, as the detail view
+    does. Responds 202 with `{"tasks": [{"id": 1, "task_id": "..."}, ...]}`.
+    """
+    queryset = Supplier.objects.all()
+    serializer_class = SupplierSerializer
+
+    def delete(self, request, *args, **kwargs):
+        ids_serializer = BatchRetrieveSerializer(
+            data=request.data, context={'max_batch_size': self.max_batch_size}
+        )
+        ids_serializer.is_valid(raise_exception=True)
+
+        supplier_ids = list(
+            self.get_queryset().filter(pk__in=ids_serializer.validated_data['ids'])
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        task_ids = schedule_supplier_deletion(supplier_ids)
+        return Response(
+            {"tasks": [{"id": supplier_id, "task_id": task_ids[supplier_id]} for supplier_id in supplier_ids]},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class ProductBatchAPIView(BatchRetrieveAPIView):
+    """
+    Retrieves many products by id in a single request.
+    """
+    queryset = Product.objects.filter(supplier__deleting=False).select_related('supplier')
+    serializer_class = ProductSerializer
+
+
+class InventoryBatchAPIView(HotStockMixin, BatchRetrieveAPIView):
+    """
+    Retrieves many inventory levels by id in a single request.
+    """
+    queryset = Inventory.objects.filter(product__supplier__deleting=False).select_related('product__supplier')
     serializer_class = InventorySerializer
 
 
 class SupplierProductInventoryAPIView(GenericAPIView):
     """
     Retrieves all products and their quantities for a given supplier.
+
+    - GET: Quantities and the total inventory value are summed over every
+      location, or cover `?location=<code>` only.
     """
     def get(self, request, pk):
         try:
             # Get the supplier
             supplier = Supplier.objects.get(id=pk)
+            location = request.query_params.get('location') or None
 
             # Retrieve all products related to the supplier
             products = Product.objects.filter(supplier=supplier)
             
             # Retrieve the total product value
-            total_inventory_value = "{:,.2f}".format(supplier.total_inventory_value())
-
-            # Retrieve inventory for each product
-            inventory_data = []
-            for product in products:
-                inventory = Inventory.objects.filter(product=product).first()
-                if inventory:
-                    # Serialize the product but remove supplier details
-                    product_data = ProductSerializer(product).data
-                    
-                    # Remove the supplier data from the product dictionary
-                    if 'supplier' in product_data:
-                        del product_data['supplier']
-                    
-                    inventory_data.append({
-                        'product': product_data,
-                        'quantity': inventory.quantity
-                    })
+            total_inventory_value = "{:,.2f}".format(supplier.total_inventory_value(location))
+
+            # Retrieve the products that have inventory with their summed
+            # quantities in one query, without the supplier details
+            stocked = products.with_quantity(location).order_by('pk')
+            product_data = ProductSerializer(stocked, many=True, exclude=['supplier']).data
+            inventory_data = [
+                {'product': data, 'quantity': product.quantity}
+                for product, data in zip(stocked, product_data)
+            ]
 
             # Prepare the response with supplier name, total products, and total value at the top level
             response_data = {
@@ -189,6 +860,154 @@ class SupplierProductInventoryAPIView(GenericAPIView):
             return Response({"error": "Supplier not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
+class ChangeFeedAPIView(GenericAPIView):
+    """
+    Pulls the changes to products, inventory levels and suppliers made
+    after a cursor, in the order they were committed.
+
+    - GET: `?since=<cursor>&limit=<n>` returns
+      `{"results": [{"sequence": 8, "type": "product", "id": 3, "action": "saved"}, ...],
+      "next_cursor": 8, "has_more": false}`. Start with `since=0` and pass
+      `next_cursor` back to get only what changed since.
+
+    Returns 410 Gone when changes after the cursor have already been pruned
+    (see CHANGE_FEED_RETENTION_DAYS), with the `latest_cursor` to continue
+    from once the consumer has resynced.
+
+    Changes are listed once the `sequence_change_feed` task has numbered
+    them, within CHANGE_FEED_SEQUENCE_INTERVAL seconds of their commit. The
+    view only reads, so it can be served from a replica.
+    """
+    serializer_class = ChangeFeedQuerySerializer
+
+    @extend_schema(parameters=[ChangeFeedQuerySerializer], responses=OpenApiTypes.OBJECT)
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        since, limit = serializer.validated_data['since'], serializer.validated_data['limit']
+
+        sequenced = Change.objects.filter(sequence__isnull=False).values_list('sequence', flat=True)
+        first = sequenced.order_by('sequence').first()
+        if first is not None and first > since + 1:
+            # Resync, then continue from the cursor the feed had before resyncing
+            return Response({
+                "error": "Cursor has expired, resync required",
+                "latest_cursor": sequenced.order_by('-sequence').first(),
+            }, status=status.HTTP_410_GONE)
+
+        changes = list(
+            Change.objects.filter(sequence__gt=since).order_by('sequence')
+            .values_list('sequence', 'object_type', 'object_id', 'action')[:limit + 1]
+        )
+        results = [
+            {
+                "sequence": sequence,
+                "type": Change.ObjectType(object_type).name.lower(),
+                "id": object_id,
+                "action": Change.Action(action).name.lower(),
+            }
+            for sequence, object_type, object_id, action in changes[:limit]
+        ]
+        return Response({
+            "results": results,
+            "next_cursor": results[-1]["sequence"] if results else since,
+            "has_more": len(changes) > limit,
+        }, status=status.HTTP_200_OK)
+
+
+class AnalyticsAPIView(GenericAPIView):
+    """
+    Base view for the analytics endpoints, which compute over the nightly
+    columnar snapshots (see inventory.analytics) instead of the database.
+    Subclasses name the `inventory.analytics` function that computes their
+    result in `analytics_function`.
+    """
+    serializer_class = AnalyticsQuerySerializer
+    analytics_function = None
+
+    @extend_schema(parameters=[AnalyticsQuerySerializer], responses=OpenApiTypes.OBJECT)
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        # Imported here so only the workers serving analytics load NumPy
+        from . import analytics
+
+        compute = getattr(analytics, self.analytics_function)
+        result = compute(data['start'], data['end'], data.get('supplier'))
+        names = dict(
+            Supplier.objects.filter(pk__in=[item['supplier_id'] for item in result['suppliers']])
+            .values_list('id', 'name')
+        )
+        for item in result['suppliers']:
+            item['supplier_name'] = names.get(item['supplier_id'])
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class StockValueTrendAPIView(AnalyticsAPIView):
+    """
+    Daily closing stock value per supplier.
+
+    - GET: `?start=2024-01-01&end=2024-12-31&supplier=1&supplier=2` returns
+      `{"dates": [...], "total_stock_value": [...], "suppliers":
+      [{"supplier_id": 1, "supplier_name": "...", "stock_value": [...], "units": [...]}, ...]}`,
+      one value per date. Defaults to the last year and every supplier.
+    """
+    analytics_function = 'stock_value_trend'
+
+
+class TurnoverAPIView(AnalyticsAPIView):
+    """
+    Stock turnover and days of cover per supplier over a date range.
+
+    - GET: `?start=2024-01-01&end=2024-12-31&supplier=1` returns
+      `{"start": ..., "end": ..., "days": 366, "suppliers": [{"supplier_id": 1,
+      "supplier_name": "...", "average_stock_value": ..., "outflow_value": ...,
+      "outflow_units": ..., "turnover": 4.2, "days_of_cover": 18.5}, ...]}`.
+
+    Turnover is the value that left stock (sales, adjustments and confirmed
+    reservations, not manual corrections) over the average closing stock
+    value. Days of cover is how long the last closing stock lasts at the
+    average daily outflow; null when nothing went out.
+    """
+    analytics_function = 'turnover'
+
+
+class ReplenishmentAPIView(ListAPIView):
+    """
+    Suggested reorders from the nightly replenishment forecast (see
+    inventory.replenishment).
+
+    - GET: a paginated list of `{"product_id": 1, "product_name": "...",
+      "supplier_id": 2, "as_of": "2024-06-30", "quantity": 40,
+      "consumption_rate": 6.5, "days_of_cover": 6.2, "reorder_point": 58,
+      "reorder_quantity": 120}`, most urgent (fewest days of cover) first.
+      `?ordering=reorder_quantity` or `consumption_rate` sorts by those,
+      largest first; `?supplier=<id>` and `?reorder=true` (only products at
+      or below their reorder point) filter.
+    """
+    serializer_class = ReplenishmentForecastSerializer
+    pagination_class = CustomPagination
+
+    def get_queryset(self):
+        query = ReplenishmentQuerySerializer(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        data = query.validated_data
+
+        queryset = ReplenishmentForecast.objects.filter(product__supplier__deleting=False) \
+            .select_related('product').order_by(*ReplenishmentQuerySerializer.ORDERINGS[data['ordering']])
+        if 'supplier' in data:
+            queryset = queryset.filter(product__supplier_id=data['supplier'])
+        if data.get('reorder'):
+            queryset = queryset.filter(reorder_quantity__gt=0)
+        return queryset
+
+    @extend_schema(parameters=[ReplenishmentQuerySerializer])
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
 class ProductCSVUploadView(GenericAPIView):
     """
     API view to handle uploading and processing of a CSV file 
@@ -240,6 +1059,10 @@ class ProductCSVUploadView(GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        # Imported here rather than at module level, so workers only load
+        # pandas once a CSV is uploaded
+        import pandas as pd
+
         try:
             # Read the CSV file into a pandas DataFrame
             data = pd.read_csv(file)
@@ -253,6 +1076,11 @@ class ProductCSVUploadView(GenericAPIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
+            # An optional `location` column stocks rows at that location
+            # rather than the default one
+            locations = set(Location.objects.values_list('code', flat=True))
+            has_location = "location" in data.columns
+
             success_count = 0
             errors = []
 
@@ -272,6 +1100,11 @@ class ProductCSVUploadView(GenericAPIView):
                         if quantity < 0:
                             raise ValueError("Quantity must be a positive integer.")
 
+                        location = row["location"] if has_location and not pd.isna(row["location"]) else None
+                        location = str(location).strip() if location is not None else default_location()
+                        if location not in locations:
+                            raise ValueError(f"Location '{location}' not found.")
+
                         product, created = Product.objects.update_or_create(
                             name=row["name"],
                             defaults={
@@ -281,15 +1114,20 @@ class ProductCSVUploadView(GenericAPIView):
                             }
                         )
 
-                        # Update inventory quantity
-                        inventory, _ = Inventory.objects.get_or_create(product=product)
-                        inventory.quantity += quantity
-                        inventory.save()
+                        # Update inventory quantity in the database rather than in Python
+                        Inventory.objects.get_or_create(product=product, location_id=location)
+                        Inventory.objects.adjust_quantity(
+                            quantity, reason=StockMovement.Reason.IMPORT,
+                            product_id=product.pk, location_id=location,
+                        )
 
                         success_count += 1
                     except Exception as e:
                         errors.append({"row": row.to_dict(), "error": str(e)})
 
+            metrics.CSV_IMPORT_ROWS.labels('imported').inc(success_count)
+            metrics.CSV_IMPORT_ROWS.labels('failed').inc(len(errors))
+
             response_data = {
                 "message": "File processed successfully",
                 "success_count": success_count,
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
 from decouple import config
 
 # Set the default Django settings module for the 'celery' program.
@@ -19,6 +20,20 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Autodiscover tasks from all installed apps.
 app.autodiscover_tasks()
 
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    # Serves the task metrics of every pool process, see inventory_api.metrics
+    from inventory_api import metrics
+    metrics.start_worker_server()
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    from inventory_api import metrics
+    metrics.mark_process_dead(pid)
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
@@ -0,0 +1,169 @@
+"""
+Response compression with Brotli and gzip.
+
+Responses are compressed only when the client accepts it, the content type
+is compressible and the body is at least `COMPRESSION_MIN_SIZE` bytes.
+Streaming responses are buffered up to that threshold to decide, then
+compressed chunk by chunk so they keep streaming.
+"""
+import zlib
+from itertools import chain
+
+import brotli
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+
+COMPRESSIBLE_CONTENT_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/vnd.oai.openapi',
+    'image/svg+xml',
+)
+
+
+def _accepted_encodings(header):
+    """
+    Parse an Accept-Encoding header into a {coding: q-value} dict.
+    """
+    encodings = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encodings[coding] = quality
+    return encodings
+
+
+def choose_encoding(header):
+    """
+    Pick the content coding to use for a request, preferring Brotli.
+    """
+    encodings = _accepted_encodings(header)
+    for coding in ('br', 'gzip'):
+        if encodings.get(coding, encodings.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+class _Compressor:
+    """
+    Incremental compressor with the same interface for both codings.
+    """
+    def __init__(self, coding):
+        if coding == 'br':
+            self._compressor = brotli.Compressor(
+                quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+            )
+        else:
+            # wbits=31 produces a gzip container rather than raw zlib
+            self._compressor = zlib.compressobj(
+                getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6), zlib.DEFLATED, 31
+            )
+        self.coding = coding
+
+    def compress(self, data):
+        if self.coding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.coding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def compress_bytes(data, coding):
+    compressor = _Compressor(coding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def compress_chunks(chunks, coding):
+    compressor = _Compressor(coding)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_chunks(chunks, coding):
+    compressor = _Compressor(coding)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with Brotli or gzip, depending on Accept-Encoding,
+    when they are larger than `COMPRESSION_MIN_SIZE` bytes.
+    """
+
+    def process_response(self, request, response):
+        # Respect responses that are already encoded or must not be transformed
+        if response.has_header('Content-Encoding'):
+            return response
+        if 'no-transform' in response.get('Cache-Control', ''):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_CONTENT_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        coding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+
+        if response.streaming:
+            if response.is_async:
+                # Async iterators can't be peeked at here, so always compress
+                response.streaming_content = acompress_chunks(response.streaming_content, coding)
+            else:
+                # Buffer up to the threshold to find out if the body is small
+                chunks = iter(response.streaming_content)
+                head, size = [], 0
+                for chunk in chunks:
+                    head.append(chunk)
+                    size += len(chunk)
+                    if size >= min_size:
+                        break
+                else:
+                    response.streaming_content = head
+                    return response
+                response.streaming_content = compress_chunks(chain(head, chunks), coding)
+            # The compressed length isn't known up front
+            del response['Content-Length']
+        else:
+            if len(response.content) < min_size:
+                return response
+            compressed = compress_bytes(response.content, coding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # The compressed body is no longer byte-for-byte the tagged representation
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = coding
+
+        return response
@@ -0,0 +1,147 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the `default` (primary) database. Reads go to one of the
+aliases in `settings.DATABASE_REPLICAS` only when the current code path has
+opted in:
+
+- `ReplicaRoutingMiddleware` opts in GET/HEAD/OPTIONS requests, unless the
+  client wrote something within the last `REPLICA_STICKY_SECONDS` (tracked
+  with a cookie) so it always reads its own writes.
+- Background work such as report generation opts in with `use_replica()`.
+
+Once anything is written in a routed block, the rest of the block reads from
+the primary as well.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+PIN_COOKIE_NAME = 'primary_pin'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class _RoutingState:
+    """
+    Mutable per-request (or per-task) routing state. A mutable object is used
+    so writes made in a thread spawned by sync_to_async are seen by the caller.
+    """
+    def __init__(self, replica_allowed):
+        self.replica_allowed = replica_allowed
+        self.wrote = False
+
+
+_routing_state = ContextVar('db_routing_state', default=None)
+
+
+@contextmanager
+def use_replica():
+    """
+    Route reads inside the block to a replica until something is written.
+    """
+    token = _routing_state.set(_RoutingState(replica_allowed=True))
+    try:
+        yield
+    finally:
+        _routing_state.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """
+    Force every read inside the block onto the primary.
+    """
+    token = _routing_state.set(_RoutingState(replica_allowed=False))
+    try:
+        yield
+    finally:
+        _routing_state.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends writes to the primary and opted-in reads to a random replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if replicas and state is not None and state.replica_allowed and not state.wrote:
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are kept up to date by the database's own replication
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe requests read from replicas and pins a client to the primary
+    for `REPLICA_STICKY_SECONDS` after any request that wrote to the database.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = self._request_state(request)
+        token = _routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+        return self._process_response(request, state, response)
+
+    async def __acall__(self, request):
+        state = self._request_state(request)
+        token = _routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing_state.reset(token)
+        return self._process_response(request, state, response)
+
+    def _request_state(self, request):
+        pinned_until = request.COOKIES.get(PIN_COOKIE_NAME)
+        try:
+            pinned = pinned_until is not None and float(pinned_until) > time.time()
+        except ValueError:
+            pinned = False
+        return _RoutingState(replica_allowed=request.method in SAFE_METHODS and not pinned)
+
+    def _process_response(self, request, state, response):
+        if state.wrote or request.method not in SAFE_METHODS:
+            sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+            response.set_cookie(
+                PIN_COOKIE_NAME,
+                str(time.time() + sticky_seconds),
+                max_age=sticky_seconds,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,213 @@
+"""
+Idempotency keys for write requests.
+
+A POST, PUT or PATCH that carries an `Idempotency-Key` header is handled
+once: its response is stored in the `idempotency` cache (Redis in
+deployments) for `IDEMPOTENCY_TTL` seconds, and retries with the same key
+get the stored response back without running the view again.
+
+While the first request is still running, a duplicate waits for it for up
+to `IDEMPOTENCY_WAIT_TIMEOUT` seconds and then replays its response. A key
+reused with a different method, path or body is rejected with 422. Server
+errors are not stored, so the request can be retried.
+
+The first request's claim on the key expires after `IDEMPOTENCY_LOCK_TIMEOUT`
+seconds, so a worker that dies mid-request doesn't block the key for long.
+It is extended every third of that while the request runs, however long a
+write such as a CSV import takes.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+IDEMPOTENT_METHODS = ('POST', 'PUT', 'PATCH')
+
+# Response headers kept with the stored response
+REPLAYED_RESPONSE_HEADERS = ('Content-Type', 'ETag', 'Location')
+
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+
+
+def _cache():
+    return caches[getattr(settings, 'IDEMPOTENCY_CACHE_ALIAS', 'idempotency')]
+
+
+def _lock_timeout():
+    return getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60)
+
+
+def idempotency_cache_key(key, owner=''):
+    """
+    Cache key of an Idempotency-Key, scoped to the user sending it.
+    """
+    return 'idempotency:' + hashlib.sha256(f'{owner}:{key}'.encode()).hexdigest()
+
+
+def request_fingerprint(request):
+    """
+    Hash of the method, path and content of a request. Multipart forms are
+    hashed by their fields and file contents, since the raw body includes a
+    boundary that clients pick at random for every attempt.
+    """
+    fingerprint = hashlib.sha256(f'{request.method} {request.get_full_path()}\n'.encode())
+    if request.method == 'POST' and request.content_type == 'multipart/form-data':
+        for name, values in sorted(request.POST.lists()):
+            fingerprint.update(repr((name, values)).encode())
+        for name, uploads in sorted(request.FILES.lists()):
+            for upload in uploads:
+                fingerprint.update(repr((name, upload.name)).encode())
+                for chunk in upload.chunks():
+                    fingerprint.update(chunk)
+                upload.seek(0)
+        return fingerprint.hexdigest()
+
+    content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    if settings.DATA_UPLOAD_MAX_MEMORY_SIZE is None or content_length <= settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+        fingerprint.update(request.body)
+    else:
+        # Large bodies are streamed to the view, so only their size is compared
+        fingerprint.update(str(content_length).encode())
+    return fingerprint.hexdigest()
+
+
+class IdempotencyMiddleware:
+    """
+    Replays the stored response of a write request retried with the same
+    `Idempotency-Key`, and makes concurrent duplicates wait for the first.
+    Under ASGI the waiting and the claim extension don't block the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        cache_key = self._cache_key(request)
+        if cache_key is None:
+            return self.get_response(request)
+        fingerprint = request_fingerprint(request)
+
+        cache = _cache()
+        deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+        # Claim the key; add() only succeeds for the first request
+        while not cache.add(cache_key, {'state': IN_FLIGHT, 'fingerprint': fingerprint}, _lock_timeout()):
+            response = self._earlier_response(cache.get(cache_key), fingerprint, deadline)
+            if response is not None:
+                return response
+            time.sleep(getattr(settings, 'IDEMPOTENCY_POLL_INTERVAL', 0.05))
+
+        stop = threading.Event()
+        extender = threading.Thread(target=self._extend_claim, args=(cache, cache_key, stop), daemon=True)
+        extender.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stop.set()
+            extender.join()
+        return self._store_response(cache, cache_key, fingerprint, response)
+
+    async def __acall__(self, request):
+        cache_key = self._cache_key(request)
+        if cache_key is None:
+            return await self.get_response(request)
+        # Parsing and hashing uploads is blocking work
+        fingerprint = await sync_to_async(request_fingerprint)(request)
+
+        cache = _cache()
+        deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_TIMEOUT', 10)
+        while not await cache.aadd(cache_key, {'state': IN_FLIGHT, 'fingerprint': fingerprint}, _lock_timeout()):
+            response = self._earlier_response(await cache.aget(cache_key), fingerprint, deadline)
+            if response is not None:
+                return response
+            await asyncio.sleep(getattr(settings, 'IDEMPOTENCY_POLL_INTERVAL', 0.05))
+
+        extender = asyncio.ensure_future(self._aextend_claim(cache, cache_key))
+        try:
+            response = await self.get_response(request)
+        finally:
+            extender.cancel()
+            try:
+                await extender
+            except asyncio.CancelledError:
+                pass
+        return await sync_to_async(self._store_response)(cache, cache_key, fingerprint, response)
+
+    def _cache_key(self, request):
+        """
+        The cache key of the request's Idempotency-Key, or None if the
+        request isn't deduplicated.
+        """
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or request.method not in IDEMPOTENT_METHODS:
+            return None
+        if not request.path.startswith(tuple(getattr(settings, 'IDEMPOTENCY_PATH_PREFIXES', ('/api/',)))):
+            return None
+        user = getattr(request, 'user', None)
+        owner = user.pk if user is not None and user.is_authenticated else ''
+        return idempotency_cache_key(key, owner)
+
+    def _earlier_response(self, entry, fingerprint, deadline):
+        """
+        The response for a duplicate of a claimed key, or None to keep
+        waiting for the first request.
+        """
+        if entry is not None:
+            if entry['fingerprint'] != fingerprint:
+                return JsonResponse(
+                    {"error": "Idempotency-Key was already used for a different request"}, status=422
+                )
+            if entry['state'] == DONE:
+                return self._replay(entry)
+        if time.monotonic() >= deadline:
+            return JsonResponse(
+                {"error": "A request with this Idempotency-Key is still in progress"}, status=409
+            )
+        return None
+
+    def _extend_claim(self, cache, cache_key, stop):
+        while not stop.wait(_lock_timeout() / 3):
+            cache.touch(cache_key, _lock_timeout())
+
+    async def _aextend_claim(self, cache, cache_key):
+        while True:
+            await asyncio.sleep(_lock_timeout() / 3)
+            await cache.atouch(cache_key, _lock_timeout())
+
+    def _store_response(self, cache, cache_key, fingerprint, response):
+        if response.status_code >= 500 or response.streaming:
+            # Let the client retry instead of replaying a failure
+            cache.delete(cache_key)
+            return response
+
+        cache.set(cache_key, {
+            'state': DONE,
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'headers': {name: response[name] for name in REPLAYED_RESPONSE_HEADERS if response.has_header(name)},
+            'content': response.content,
+        }, getattr(settings, 'IDEMPOTENCY_TTL', 86400))
+        return response
+
+    def _replay(self, entry):
+        response = HttpResponse(entry['content'], status=entry['status'])
+        for name, value in entry['headers'].items():
+            response[name] = value
+        response[REPLAYED_HEADER] = 'true'
+        return response
@@ -0,0 +1,239 @@
+"""
+Opt-in query and timing instrumentation.
+
+With `INSTRUMENTATION_ENABLED`, every request and Celery task records its
+query count, total database time, the time spent producing serializer data
+and its slowest SQL statements. Requests report them in a `Server-Timing`
+header, and requests and tasks both log them as one JSON line on the
+`inventory_api.instrumentation` logger. Anything slower than
+`INSTRUMENTATION_SLOW_REQUEST_MS` (or `INSTRUMENTATION_SLOW_TASK_MS`) is
+logged as a warning with every statement it ran.
+
+`repeated_queries` counts statements that ran more than once with the same
+SQL, which is how N+1 query patterns show up. SQL is recorded without its
+parameters.
+
+When disabled nothing is installed: the middleware removes itself and no
+database or serializer hooks are added.
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('instrumentation_measurement', default=None)
+_task_tokens = {}  # Celery task id -> context token of its measurement
+_installed = False
+
+
+class Measurement:
+    """
+    Queries and timings of one request or task. A mutable object, so work
+    done in threads spawned by sync_to_async is counted too.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.in_serializer = False
+        self.queries = []  # (seconds, sql), up to INSTRUMENTATION_MAX_QUERIES
+
+    def add_query(self, sql, duration):
+        self.query_count += 1
+        self.db_time += duration
+        if len(self.queries) < getattr(settings, 'INSTRUMENTATION_MAX_QUERIES', 1000):
+            self.queries.append((duration, sql))
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self, **fields):
+        statements = [sql for _, sql in self.queries]
+        slowest = sorted(self.queries, key=lambda query: query[0], reverse=True)
+        return {
+            **fields,
+            'duration_ms': _ms(self.elapsed),
+            'queries': self.query_count,
+            'repeated_queries': len(statements) - len(set(statements)),
+            'db_ms': _ms(self.db_time),
+            'serializer_ms': _ms(self.serializer_time),
+            'slowest_queries': [
+                {'ms': _ms(duration), 'sql': sql}
+                for duration, sql in slowest[:getattr(settings, 'INSTRUMENTATION_SLOWEST_QUERIES', 3)]
+            ],
+        }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def current_measurement():
+    """
+    The measurement of the running request or task, or None.
+    """
+    return _current.get()
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    measurement = _current.get()
+    if measurement is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        measurement.add_query(sql, time.perf_counter() - started)
+
+
+def _add_execute_wrapper(connection, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+def _timed_data(data_property):
+    """
+    Wrap a serializer's `data` property so the time spent in the outermost
+    serializer is added to the current measurement, including any queries
+    it triggers.
+    """
+    getter = data_property.fget
+
+    def data(self):
+        measurement = _current.get()
+        if measurement is None or measurement.in_serializer:
+            return getter(self)
+        measurement.in_serializer = True
+        started = time.perf_counter()
+        try:
+            return getter(self)
+        finally:
+            measurement.in_serializer = False
+            measurement.serializer_time += time.perf_counter() - started
+
+    return property(data)
+
+
+def _task_prerun(task_id=None, **kwargs):
+    _task_tokens[task_id] = _current.set(Measurement())
+
+
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    token = _task_tokens.pop(task_id, None)
+    if token is None:
+        return
+    measurement = _current.get()
+    _current.reset(token)
+    report(measurement, getattr(settings, 'INSTRUMENTATION_SLOW_TASK_MS', 10000),
+           task=task.name, task_id=task_id, state=state)
+
+
+def install():
+    """
+    Add the database, serializer and Celery task hooks, once, if
+    `INSTRUMENTATION_ENABLED` is set. Called when the app is ready.
+    """
+    global _installed
+    if _installed or not getattr(settings, 'INSTRUMENTATION_ENABLED', False):
+        return
+    _installed = True
+
+    from celery.signals import task_prerun, task_postrun
+    from rest_framework import serializers
+
+    connection_created.connect(_add_execute_wrapper, dispatch_uid='instrumentation')
+    for connection in connections.all(initialized_only=True):
+        _add_execute_wrapper(connection)
+
+    serializers.Serializer.data = _timed_data(serializers.Serializer.data)
+    serializers.ListSerializer.data = _timed_data(serializers.ListSerializer.data)
+
+    task_prerun.connect(_task_prerun, dispatch_uid='instrumentation')
+    task_postrun.connect(_task_postrun, dispatch_uid='instrumentation')
+
+
+def report(measurement, slow_ms, **fields):
+    """
+    Log the summary of a measurement, as a warning with every query when it
+    took at least `slow_ms` milliseconds. Returns the summary.
+    """
+    summary = measurement.summary(**fields)
+    if summary['duration_ms'] >= slow_ms:
+        summary['all_queries'] = [{'ms': _ms(duration), 'sql': sql} for duration, sql in measurement.queries]
+        logger.warning(json.dumps(summary), extra={'instrumentation': summary})
+    else:
+        logger.info(json.dumps(summary), extra={'instrumentation': summary})
+    return summary
+
+
+def server_timing(summary):
+    """
+    Format a summary as a Server-Timing header value.
+    """
+    return (
+        f'db;dur={summary["db_ms"]};desc="{summary["queries"]} queries, {summary["repeated_queries"]} repeated", '
+        f'serializer;dur={summary["serializer_ms"]}, '
+        f'total;dur={summary["duration_ms"]}'
+    )
+
+
+class InstrumentationMiddleware:
+    """
+    Measures each request and adds a `Server-Timing` header. Removes itself
+    unless `INSTRUMENTATION_ENABLED` is set.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTATION_ENABLED', False):
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        measurement = Measurement()
+        token = _current.set(measurement)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, measurement)
+
+    async def __acall__(self, request):
+        measurement = Measurement()
+        token = _current.set(measurement)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, measurement)
+
+    def _finish(self, request, response, measurement):
+        match = request.resolver_match
+        summary = report(
+            measurement,
+            getattr(settings, 'INSTRUMENTATION_SLOW_REQUEST_MS', 500),
+            method=request.method,
+            path=request.path,
+            route=match.view_name if match else None,
+            status=response.status_code,
+        )
+        response['Server-Timing'] = server_timing(summary)
+        return response
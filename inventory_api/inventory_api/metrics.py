@@ -0,0 +1,217 @@
+"""
+Prometheus metrics.
+
+Request latency by route name, Celery task runtime and queue wait, CSV
+import row counts, open database connections and connection pool usage, in
+the Prometheus text format at `/metrics`.
+
+Each process records its own metrics. When the `PROMETHEUS_MULTIPROC_DIR`
+environment variable points at a writable directory, every process writes
+them to files there and `/metrics` adds them up, so one scrape covers all
+gunicorn workers (see `gunicorn.conf.py`). Celery workers serve the metrics
+of their pool processes on `METRICS_WORKER_PORT` the same way; give them
+their own directory.
+"""
+import os
+import shutil
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+    multiprocess, start_http_server,
+)
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time spent handling a request.', ['route', 'method', 'status'],
+)
+TASK_RUNTIME = Histogram(
+    'celery_task_runtime_seconds', 'Time spent running a Celery task.', ['task', 'state'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, float('inf')),
+)
+TASK_QUEUE_WAIT = Histogram(
+    'celery_task_queue_wait_seconds', 'Time a Celery task waited between being sent and starting.', ['task'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, float('inf')),
+)
+CSV_IMPORT_ROWS = Counter(
+    'csv_import_rows', 'Rows processed by product CSV uploads.', ['outcome'],
+)
+DB_CONNECTIONS_OPEN = Gauge(
+    'db_connections_open', 'Open database connections, summed over live processes.', ['alias'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_AVAILABLE = Gauge(
+    'db_pool_available', 'Idle connections in the connection pools of live processes.', ['alias'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_WAITING = Gauge(
+    'db_pool_requests_waiting', 'Requests waiting for a pooled connection, over live processes.', ['alias'],
+    multiprocess_mode='livesum',
+)
+DB_POOL_CHECKOUTS = Counter(
+    'db_pool_checkouts', 'Connections handed out by the connection pool.', ['alias'],
+)
+DB_POOL_WAIT = Counter(
+    'db_pool_wait_seconds', 'Time spent waiting for a pooled connection.', ['alias'],
+)
+DB_POOL_TIMEOUTS = Counter(
+    'db_pool_timeouts', 'Requests that gave up waiting for a pooled connection.', ['alias'],
+)
+DB_POOL_CONNECTIONS_LOST = Counter(
+    'db_pool_connections_lost', 'Pooled connections found broken by a health check.', ['alias'],
+)
+
+PUBLISHED_AT_HEADER = 'published_at'
+HTTP_METHODS = {'GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'}
+
+_task_started = {}  # Celery task id -> perf_counter() at start
+_installed = False
+
+
+def multiprocess_dir():
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+def _registry():
+    if not multiprocess_dir():
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """
+    Serve the metrics of this process, or of every process sharing the
+    multiprocess directory.
+    """
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def record_connections(**kwargs):
+    """
+    Update the connection and pool metrics of this process. Runs after
+    Django has closed the connections that outlived CONN_MAX_AGE, or
+    returned them to the pool.
+    """
+    for alias in connections:
+        connection = connections[alias]
+        pool = getattr(connection, 'pool', None)
+        if pool is None or pool.closed:
+            DB_CONNECTIONS_OPEN.labels(alias).set(1 if connection.connection is not None else 0)
+            continue
+        # Counters in the pool's stats are reset by each pop_stats() call
+        stats = pool.pop_stats()
+        DB_CONNECTIONS_OPEN.labels(alias).set(stats.get('pool_size', 0))
+        DB_POOL_AVAILABLE.labels(alias).set(stats.get('pool_available', 0))
+        DB_POOL_WAITING.labels(alias).set(stats.get('requests_waiting', 0))
+        DB_POOL_CHECKOUTS.labels(alias).inc(stats.get('requests_num', 0))
+        DB_POOL_WAIT.labels(alias).inc(stats.get('requests_wait_ms', 0) / 1000)
+        DB_POOL_TIMEOUTS.labels(alias).inc(stats.get('requests_errors', 0))
+        DB_POOL_CONNECTIONS_LOST.labels(alias).inc(stats.get('connections_lost', 0))
+
+
+def _before_task_publish(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault(PUBLISHED_AT_HEADER, time.time())
+
+
+def _task_prerun(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+    published_at = getattr(task.request, PUBLISHED_AT_HEADER, None)
+    if published_at is not None:
+        TASK_QUEUE_WAIT.labels(task.name).observe(max(0.0, time.time() - float(published_at)))
+
+
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_RUNTIME.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+    record_connections()
+
+
+def install():
+    """
+    Connect the Celery and connection hooks, once. Called when the app is ready.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from celery.signals import before_task_publish, task_prerun, task_postrun
+
+    before_task_publish.connect(_before_task_publish, dispatch_uid='metrics')
+    task_prerun.connect(_task_prerun, dispatch_uid='metrics')
+    task_postrun.connect(_task_postrun, dispatch_uid='metrics')
+    request_finished.connect(record_connections, dispatch_uid='metrics')
+
+
+def clear_multiprocess_dir():
+    """
+    Empty the multiprocess directory, so metrics of an earlier run don't
+    linger. Call once before the worker processes start.
+    """
+    path = multiprocess_dir()
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def mark_process_dead(pid):
+    """
+    Drop the live gauges of a process that has exited.
+    """
+    if multiprocess_dir():
+        multiprocess.mark_process_dead(pid)
+
+
+def start_worker_server():
+    """
+    Serve the metrics of a Celery worker and its pool processes on
+    `METRICS_WORKER_PORT` (disabled when 0).
+    """
+    port = getattr(settings, 'METRICS_WORKER_PORT', 0)
+    if port:
+        clear_multiprocess_dir()
+        start_http_server(port, registry=_registry())
+
+
+class MetricsMiddleware:
+    """
+    Times each request, labelled with the name of the route it matched.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, started)
+        return response
+
+    def _observe(self, request, response, started):
+        match = request.resolver_match
+        # Unmatched paths share one label so scanners can't blow up cardinality
+        route = match.view_name if match and match.view_name else 'unmatched'
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        REQUEST_LATENCY.labels(route, method, response.status_code) \
+            .observe(time.perf_counter() - started)
@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from decouple import config
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -50,7 +51,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'inventory_api.metrics.MetricsMiddleware',
+    'inventory_api.instrumentation.InstrumentationMiddleware',  # Removes itself unless enabled
     'django.middleware.security.SecurityMiddleware',
+    'inventory_api.compression.CompressionMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +62,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'inventory_api.db_router.ReplicaRoutingMiddleware',
+    'inventory_api.idempotency.IdempotencyMiddleware',
 ]
 
 ROOT_URLCONF = 'inventory_api.urls'
@@ -91,6 +97,14 @@ WSGI_APPLICATION = 'inventory_api.wsgi.application'
 #     }
 # }
 
+# Read replicas: aliases in DATABASES that safe reads may be routed to.
+# Empty means every query goes to 'default'.
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['inventory_api.db_router.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after a write
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -149,6 +163,11 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
 }
 
+# Response compression: bodies smaller than this many bytes are sent as-is
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSION_GZIP_LEVEL = 6
+
 REPORTS_DIR = os.path.join(BASE_DIR, 'generated_reports')
 
 # Celery config
@@ -156,3 +175,135 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_EXPIRES = 3600  # Task results will expire after 1 hour
 
+# Reports and PDFs get queues of their own, so a long report can't hold up
+# short tasks. Each queue is consumed by its own worker (see
+# docker/docker-compose.yml), which sets its concurrency and prefetch.
+CELERY_TASK_DEFAULT_QUEUE = 'celery'
+CELERY_TASK_ROUTES = {
+    'inventory.tasks.generate_inventory_report': {'queue': 'reports'},
+    'inventory.tasks.generate_inventory_report_pdf': {'queue': 'pdf'},
+}
+# Tasks reserved per worker process; keep at 1 for workers running long tasks
+CELERY_WORKER_PREFETCH_MULTIPLIER = config('CELERY_WORKER_PREFETCH_MULTIPLIER', default=4, cast=int)
+
+# Periodic tasks, run by `celery -A inventory_api beat`
+CELERY_BEAT_SCHEDULE = {
+    'snapshot-stock-levels': {
+        'task': 'inventory.tasks.snapshot_stock_levels',
+        'schedule': crontab(minute=0),  # Hourly
+    },
+    'compact-stock-movements': {
+        'task': 'inventory.tasks.compact_stock_movements',
+        'schedule': crontab(hour=3, minute=30),  # Daily
+    },
+    'release-expired-reservations': {
+        'task': 'inventory.tasks.release_expired_reservations',
+        'schedule': 60.0,  # Seconds
+    },
+    'sequence-change-feed': {
+        'task': 'inventory.tasks.sequence_change_feed',
+        'schedule': config('CHANGE_FEED_SEQUENCE_INTERVAL', default=2, cast=float),  # Seconds
+    },
+    'prune-change-feed': {
+        'task': 'inventory.tasks.prune_change_feed',
+        'schedule': crontab(hour=4, minute=0),  # Daily
+    },
+    'prune-report-artifacts': {
+        'task': 'inventory.tasks.prune_report_artifacts',
+        'schedule': crontab(minute=15),  # Hourly
+    },
+    'snapshot-inventory-analytics': {
+        'task': 'inventory.tasks.snapshot_inventory_analytics',
+        'schedule': crontab(hour=0, minute=5),  # Daily, for the day that just ended
+    },
+    'forecast-replenishment': {
+        'task': 'inventory.tasks.forecast_replenishment',
+        'schedule': crontab(hour=0, minute=30),  # Daily, after the analytics snapshot
+    },
+    'prune-analytics-snapshots': {
+        'task': 'inventory.tasks.prune_analytics_snapshots',
+        'schedule': crontab(hour=4, minute=30),  # Daily
+    },
+    'flush-hot-sku-deltas': {
+        'task': 'inventory.tasks.flush_hot_sku_deltas',
+        'schedule': config('HOT_SKU_FLUSH_INTERVAL', default=5, cast=float),  # Seconds
+    },
+}
+
+# Seconds report data artifacts are kept; they outlive the task results referencing them
+REPORT_ARTIFACT_TTL = config('REPORT_ARTIFACT_TTL', default=2 * CELERY_RESULT_EXPIRES, cast=int)
+
+# Columnar daily snapshots for /api/analytics/: per-SKU columns are kept for
+# ANALYTICS_RAW_RETENTION_DAYS, supplier rollups for ANALYTICS_RETENTION_DAYS
+ANALYTICS_SNAPSHOT_DIR = config('ANALYTICS_SNAPSHOT_DIR', default=os.path.join(MEDIA_ROOT, 'analytics'))
+ANALYTICS_RAW_RETENTION_DAYS = config('ANALYTICS_RAW_RETENTION_DAYS', default=35, cast=int)
+ANALYTICS_RETENTION_DAYS = config('ANALYTICS_RETENTION_DAYS', default=800, cast=int)
+
+# Replenishment forecast: consumption is averaged over the last
+# REPLENISHMENT_WINDOW_DAYS analytics snapshots (at most ANALYTICS_RAW_RETENTION_DAYS
+# are kept); orders cover the lead time plus the review period, and the safety
+# stock is REPLENISHMENT_SAFETY_FACTOR standard deviations of lead time demand
+REPLENISHMENT_WINDOW_DAYS = config('REPLENISHMENT_WINDOW_DAYS', default=28, cast=int)
+REPLENISHMENT_LEAD_TIME_DAYS = config('REPLENISHMENT_LEAD_TIME_DAYS', default=7, cast=int)
+REPLENISHMENT_REVIEW_DAYS = config('REPLENISHMENT_REVIEW_DAYS', default=14, cast=int)
+REPLENISHMENT_SAFETY_FACTOR = config('REPLENISHMENT_SAFETY_FACTOR', default=1.65, cast=float)
+
+# Ledger rows older than this are compacted to one row per product, reason and day
+STOCK_LEDGER_RETENTION_DAYS = config('STOCK_LEDGER_RETENTION_DAYS', default=90, cast=int)
+
+
+# Location whose stock is read and written when a request doesn't name one;
+# set it per deployment when each site runs its own
+INVENTORY_LOCATION = config('INVENTORY_LOCATION', default='main')
+
+# Stock reservations: default hold time and holds expired per sweep statement
+RESERVATION_TTL_SECONDS = config('RESERVATION_TTL_SECONDS', default=900, cast=int)
+RESERVATION_SWEEP_BATCH_SIZE = config('RESERVATION_SWEEP_BATCH_SIZE', default=1000, cast=int)
+
+# Change feed entries older than this are pruned; consumers further behind must resync
+CHANGE_FEED_RETENTION_DAYS = config('CHANGE_FEED_RETENTION_DAYS', default=7, cast=int)
+
+# Products removed per DELETE statement when a supplier is deleted in the background
+SUPPLIER_DELETE_BATCH_SIZE = config('SUPPLIER_DELETE_BATCH_SIZE', default=1000, cast=int)
+
+# Hot-SKU mode: pending stock deltas live in this Redis (the broker by default)
+HOT_SKU_REDIS_URL = config('HOT_SKU_REDIS_URL', default=config('CELERY_BROKER_URL', default='redis://localhost:6379/0'))
+HOT_SKU_FLUSH_INTERVAL = CELERY_BEAT_SCHEDULE['flush-hot-sku-deltas']['schedule']
+# Seconds a flushed batch stays in Redis for readers that loaded older quantities
+HOT_SKU_FLUSH_RETENTION = config('HOT_SKU_FLUSH_RETENTION', default=300, cast=int)
+# Flushes a rejected delta is retried with before it is parked for review
+HOT_SKU_MAX_RETRIES = config('HOT_SKU_MAX_RETRIES', default=10, cast=int)
+
+# Idempotency keys: responses to keyed writes are kept in the `idempotency` cache
+IDEMPOTENCY_CACHE_URL = config('IDEMPOTENCY_CACHE_URL', default=HOT_SKU_REDIS_URL)
+IDEMPOTENCY_TTL = config('IDEMPOTENCY_TTL', default=86400, cast=int)  # Seconds a response is replayed for
+IDEMPOTENCY_WAIT_TIMEOUT = 10  # Seconds a duplicate waits for the first request
+# Seconds before the key of a request whose worker died can be claimed again;
+# extended every third of that while the request is still running
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+IDEMPOTENCY_PATH_PREFIXES = ('/api/',)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared by every worker when backed by Redis; in-process with the in-memory broker
+    'idempotency': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': IDEMPOTENCY_CACHE_URL,
+    } if IDEMPOTENCY_CACHE_URL.startswith(('redis://', 'rediss://')) else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'idempotency',
+    },
+}
+
+# Per-request and per-task query and timing instrumentation (Server-Timing headers and JSON logs)
+INSTRUMENTATION_ENABLED = config('INSTRUMENTATION_ENABLED', default=False, cast=bool)
+# Requests and tasks at least this slow are logged as warnings with every query they ran
+INSTRUMENTATION_SLOW_REQUEST_MS = config('INSTRUMENTATION_SLOW_REQUEST_MS', default=500, cast=int)
+INSTRUMENTATION_SLOW_TASK_MS = config('INSTRUMENTATION_SLOW_TASK_MS', default=10000, cast=int)
+INSTRUMENTATION_SLOWEST_QUERIES = 3  # Statements listed in every log line
+INSTRUMENTATION_MAX_QUERIES = 1000  # Statements kept per request or task
+
+# Prometheus metrics are served at /metrics; Celery workers serve theirs on this port (0 disables)
+METRICS_WORKER_PORT = config('METRICS_WORKER_PORT', default=9540, cast=int)
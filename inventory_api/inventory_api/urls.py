@@ -7,9 +7,12 @@ from drf_spectacular.views import (
 from django.conf.urls.static import static
 from django.conf import settings
 
+from inventory_api.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('inventory.urls', namespace='inventory')),
+    path('metrics', metrics_view, name='metrics'),
 ] 
 
 if settings.DEBUG: